@@ -6,6 +6,7 @@ Usa los servicios Azure OpenAI existentes sin CrewAI
 import asyncio
 import logging
 import json
+import time
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -18,12 +19,20 @@ load_dotenv()
 # Import existing Azure OpenAI services
 from .infrastructure_agents.services.azure_openai_service_enhanced import OpenAIRequest
 from .infrastructure_agents.config.azure_config import AzureOpenAIConfig
+from .infrastructure_agents.services.evaluation_write_behind import get_evaluation_write_behind
+from .infrastructure_agents.services.storage_backend import (
+    AgentResult,
+    EvaluationBundle,
+    RiskEvaluation,
+    ScoringDetail,
+)
 
 # Import security agents
 from .infrastructure.security.input_validator import validate_company_data, CompanyDataValidationResult
 from .infrastructure.security.supervisor import run_security_supervision, SupervisionReport
 from .infrastructure.security.output_sanitizer import sanitize_output, SanitizationResult
 from .infrastructure.security.audit_logger import AuditLogger, create_audit_logger
+from .infrastructure.security.anomaly_detector import get_anomaly_detector
 
 
 class EvaluationPhase(Enum):
@@ -31,9 +40,11 @@ class EvaluationPhase(Enum):
     PENDING = "pending"
     SECURITY_VALIDATION = "security_validation"
     BUSINESS_ANALYSIS = "business_analysis"
+    OUTPUT_SANITIZATION = "output_sanitization"
     SCORING_CONSOLIDATION = "scoring_consolidation"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 @dataclass
@@ -66,6 +77,58 @@ class EvaluationResult:
     errors: List[str] = field(default_factory=list)
 
 
+class EvaluationHandle:
+    """
+    Handle de una evaluación en curso
+    
+    Permite esperar el resultado o cancelar la evaluación; la cancelación se propaga
+    a las llamadas LLM pendientes, esperas de retry y sanitización
+    """
+    
+    def __init__(self, orchestrator: "AzureOrchestrator", evaluation_id: str,
+                 company_data: CompanyData, task: asyncio.Task):
+        self.orchestrator = orchestrator
+        self.evaluation_id = evaluation_id
+        self.company_data = company_data
+        self.company_id = company_data.company_id
+        self.started_at = datetime.now()
+        self.cancel_reason: Optional[str] = None
+        self._task = task
+    
+    def cancel(self, reason: str = "cancelled_by_user") -> bool:
+        """Solicita la cancelación. Devuelve False si la evaluación ya terminó"""
+        if self._task.done():
+            return False
+        self.cancel_reason = reason
+        return self._task.cancel(msg=reason)
+    
+    def done(self) -> bool:
+        """Indica si la evaluación terminó (completada, fallida o cancelada)"""
+        return self._task.done()
+    
+    def cancelled(self) -> bool:
+        """Indica si la evaluación fue cancelada"""
+        return self._task.cancelled()
+    
+    async def result(self) -> EvaluationResult:
+        """
+        Espera el resultado de la evaluación
+        
+        Si la evaluación fue cancelada devuelve un resultado con risk_level CANCELLED.
+        Si se cancela a quien espera, la cancelación se propaga a la evaluación.
+        """
+        try:
+            return await self._task
+        except asyncio.CancelledError:
+            current_task = asyncio.current_task()
+            if current_task is not None and current_task.cancelling():
+                raise
+            return self.orchestrator._create_cancelled_result(
+                self.evaluation_id, self.company_data, self.started_at,
+                self.cancel_reason or "cancelled"
+            )
+
+
 class AzureOrchestrator:
     """
     Orquestador usando Azure OpenAI Service
@@ -83,11 +146,26 @@ class AzureOrchestrator:
         # Audit Logger
         self.audit_logger = create_audit_logger()
         
+        # Detector local de anomalías: decide si la supervisión necesita al LLM.
+        # Compartido por proceso: se siembra desde el log una sola vez, no por orquestador
+        self.anomaly_detector = get_anomaly_detector(self.audit_logger)
+        
+        # In-flight evaluations started with start_evaluation
+        self.active_evaluations: Dict[str, EvaluationHandle] = {}
+        
+        # Persistencia write-behind (EVALUATION_WRITE_BEHIND): la respuesta no espera a la base
+        try:
+            self.write_behind = get_evaluation_write_behind()
+        except Exception as e:
+            self.logger.error(f"Evaluation persistence disabled: {e}")
+            self.write_behind = None
+        
         # Statistics
         self.stats = {
             "total_evaluations": 0,
             "successful_evaluations": 0,
             "failed_evaluations": 0,
+            "cancelled_evaluations": 0,
             "average_processing_time": 0.0,
             "total_tokens_used": 0
         }
@@ -143,20 +221,66 @@ class AzureOrchestrator:
         except Exception as e:
             raise Exception(f"Azure OpenAI connection test failed: {e}")
     
-    async def evaluate_company_risk(self, company_data: CompanyData) -> EvaluationResult:
+    def _generate_evaluation_id(self, company_id: str) -> str:
+        """Genera el ID de una evaluación"""
+        return f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{company_id}"
+    
+    def start_evaluation(self, company_data: CompanyData, supersede: bool = True) -> EvaluationHandle:
+        """
+        Lanza una evaluación en segundo plano y devuelve un handle cancelable
+        
+        Con supersede=True un reenvío cancela las evaluaciones en curso de la misma empresa,
+        para que las evaluaciones abandonadas no consuman el rate limit de las activas.
+        Debe llamarse dentro de un event loop en ejecución.
+        """
+        if supersede:
+            for active_handle in list(self.active_evaluations.values()):
+                if active_handle.company_id == company_data.company_id:
+                    active_handle.cancel("superseded_by_resubmission")
+        
+        evaluation_id = self._generate_evaluation_id(company_data.company_id)
+        task = asyncio.create_task(self.evaluate_company_risk(company_data, evaluation_id=evaluation_id))
+        handle = EvaluationHandle(self, evaluation_id, company_data, task)
+        self.active_evaluations[evaluation_id] = handle
+        
+        def _forget_handle(_task: asyncio.Task):
+            if self.active_evaluations.get(evaluation_id) is handle:
+                del self.active_evaluations[evaluation_id]
+        
+        task.add_done_callback(_forget_handle)
+        return handle
+    
+    def cancel_evaluation(self, evaluation_id: str, reason: str = "cancelled_by_user") -> bool:
+        """Cancela una evaluación en curso por su ID"""
+        handle = self.active_evaluations.get(evaluation_id)
+        if not handle:
+            return False
+        return handle.cancel(reason)
+    
+    def cancel_all_evaluations(self, reason: str = "shutdown") -> int:
+        """Cancela todas las evaluaciones en curso y devuelve cuántas se cancelaron"""
+        return sum(1 for handle in list(self.active_evaluations.values()) if handle.cancel(reason))
+    
+    async def evaluate_company_risk(self, company_data: CompanyData,
+                                    evaluation_id: Optional[str] = None) -> EvaluationResult:
         """
         Evalúa el riesgo de una empresa usando Azure OpenAI siguiendo el flujo de seguridad completo
         
         Flujo: SecuritySupervisor → InputValidator → BusinessAgents → OutputSanitizer → ScoringAgent → AuditLogger
+        
+        Es cancelable: la cancelación se registra en auditoría y se propaga (asyncio.CancelledError).
         """
-        evaluation_id = f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{company_data.company_id}"
+        evaluation_id = evaluation_id or self._generate_evaluation_id(company_data.company_id)
         start_time = datetime.now()
+        phase = EvaluationPhase.PENDING
+        agent_timings: Dict[str, int] = {}
         
         self.logger.info(f"Starting risk evaluation: {evaluation_id} for company: {company_data.company_name}")
         self.stats["total_evaluations"] += 1
         
         try:
             # Phase 0: Security Supervision
+            phase = EvaluationPhase.SECURITY_VALIDATION
             self.logger.info(f"Phase 0: Security supervision for {evaluation_id}")
             security_status = await self._execute_security_supervision(evaluation_id, company_data.company_id)
             if security_status.get("critical_alert", False):
@@ -193,16 +317,21 @@ class AzureOrchestrator:
                 )
             
             # Phase 2: Business Analysis (parallel execution)
+            phase = EvaluationPhase.BUSINESS_ANALYSIS
             self.logger.info(f"Phase 2: Business analysis for {evaluation_id}")
-            financial_result, reputational_result, behavioral_result = await self._execute_business_analysis(company_data)
+            financial_result, reputational_result, behavioral_result = await self._execute_business_analysis(
+                company_data, evaluation_id, agent_timings
+            )
             
             # Phase 3: Output Sanitization
+            phase = EvaluationPhase.OUTPUT_SANITIZATION
             self.logger.info(f"Phase 3: Output sanitization for {evaluation_id}")
             sanitized_results = await self._execute_output_sanitization(
                 financial_result, reputational_result, behavioral_result, evaluation_id
             )
             
             # Phase 4: Scoring Consolidation
+            phase = EvaluationPhase.SCORING_CONSOLIDATION
             self.logger.info(f"Phase 4: Scoring consolidation for {evaluation_id}")
             consolidated_report = await self._consolidate_scoring(
                 sanitized_results["financial"], sanitized_results["reputational"], 
@@ -210,6 +339,7 @@ class AzureOrchestrator:
             )
             
             # Phase 5: Final Output Sanitization
+            phase = EvaluationPhase.OUTPUT_SANITIZATION
             self.logger.info(f"Phase 5: Final output sanitization for {evaluation_id}")
             final_sanitized_report = await self._sanitize_final_output(consolidated_report, evaluation_id)
             
@@ -217,7 +347,7 @@ class AzureOrchestrator:
             processing_time = (datetime.now() - start_time).total_seconds()
             
             # Phase 6: Audit Logging
-            await self._log_evaluation_completion(evaluation_id, final_sanitized_report, processing_time)
+            await self._log_evaluation_completion(evaluation_id, company_data.company_id, final_sanitized_report, processing_time)
             
             # Create final result
             result = EvaluationResult(
@@ -237,10 +367,21 @@ class AzureOrchestrator:
             
             self.stats["successful_evaluations"] += 1
             self._update_average_processing_time(processing_time)
+            self._enqueue_persistence(result, company_data, start_time, agent_timings)
             
             self.logger.info(f"Risk evaluation completed: {evaluation_id} in {processing_time:.2f}s")
             return result
             
+        except asyncio.CancelledError as e:
+            reason = str(e) or "cancelled"
+            processing_time = (datetime.now() - start_time).total_seconds()
+            self.stats["cancelled_evaluations"] += 1
+            self.logger.info(f"Risk evaluation cancelled: {evaluation_id} during {phase.value} ({reason})")
+            self.audit_logger.log_evaluation_cancelled(
+                evaluation_id, company_data.company_id, reason, phase.value, processing_time
+            )
+            raise
+            
         except Exception as e:
             self.logger.error(f"Risk evaluation failed: {evaluation_id} - {e}")
             self.stats["failed_evaluations"] += 1
@@ -248,7 +389,7 @@ class AzureOrchestrator:
             processing_time = (datetime.now() - start_time).total_seconds()
             
             # Log the failure
-            await self._log_evaluation_failure(evaluation_id, str(e), processing_time)
+            await self._log_evaluation_failure(evaluation_id, company_data.company_id, str(e), phase.value, processing_time)
             
             return EvaluationResult(
                 evaluation_id=evaluation_id,
@@ -274,8 +415,13 @@ class AzureOrchestrator:
             return False
         return True
     
-    async def _execute_business_analysis(self, company_data: CompanyData) -> tuple:
-        """Ejecuta análisis de negocio usando los agentes especializados"""
+    async def _execute_business_analysis(self, company_data: CompanyData, evaluation_id: Optional[str] = None,
+                                         agent_timings: Optional[Dict[str, int]] = None) -> tuple:
+        """
+        Ejecuta análisis de negocio usando los agentes especializados
+        
+        Si se pasa agent_timings, se completa con la duración (ms) de cada agente.
+        """
         
         # Import business agents
         from .business_agents.financial_agent import analyze_financial_document
@@ -288,9 +434,13 @@ class AzureOrchestrator:
         self.logger.info("🎯 Executing BehavioralAgent...")
         
         tasks = [
-            analyze_financial_document(self.azure_service, company_data.financial_statements),
-            analyze_reputation(self.azure_service, company_data.social_media_data),
-            analyze_behavior(self.azure_service, f"{company_data.commercial_references}\n{company_data.payment_history}")
+            self._timed("financial", analyze_financial_document(self.azure_service, company_data.financial_statements),
+                        agent_timings),
+            self._timed("reputational", analyze_reputation(self.azure_service, company_data.social_media_data),
+                        agent_timings),
+            self._timed("behavioral", analyze_behavior(
+                self.azure_service, f"{company_data.commercial_references}\n{company_data.payment_history}"
+            ), agent_timings)
         ]
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -310,8 +460,8 @@ class AzureOrchestrator:
         if hasattr(behavioral_result, 'dict'):
             behavioral_result = behavioral_result.dict()
         
-        # Log business analysis results to audit trail
-        evaluation_id = f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{company_data.company_id}"
+        # Log business analysis results to audit trail (same evaluation_id as the rest of the trail)
+        evaluation_id = evaluation_id or self._generate_evaluation_id(company_data.company_id)
         
         # Log each business agent execution
         if financial_result.get("success", True):
@@ -334,6 +484,16 @@ class AzureOrchestrator:
         
         return financial_result, reputational_result, behavioral_result
     
+    @staticmethod
+    async def _timed(name: str, coro, timings: Optional[Dict[str, int]]):
+        """Espera coro y registra su duración en ms en timings[name]"""
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            if timings is not None:
+                timings[name] = int((time.perf_counter() - started) * 1000)
+    
     # Métodos de análisis de negocio removidos - ahora se usan los agentes especializados
     
     async def _consolidate_scoring(self, financial_result: Dict[str, Any], 
@@ -469,44 +629,8 @@ class AzureOrchestrator:
         """Calcula un score base usando lógica simple"""
         try:
             base_score = 600  # Score neutral inicial
-            
-            # Análisis financiero (peso: 50%)
-            if financial_result.get("success", False):
-                # Si hay análisis financiero exitoso, ajustar score
-                if "solvencia" in str(financial_result).lower():
-                    if any(word in str(financial_result).lower() for word in ["buena", "alta", "positiva", "estable"]):
-                        base_score += 100
-                    elif any(word in str(financial_result).lower() for word in ["mala", "baja", "negativa", "crítica"]):
-                        base_score -= 150
-                
-                if "liquidez" in str(financial_result).lower():
-                    if any(word in str(financial_result).lower() for word in ["buena", "alta", "suficiente"]):
-                        base_score += 50
-                    elif any(word in str(financial_result).lower() for word in ["mala", "baja", "insuficiente"]):
-                        base_score -= 100
-            else:
-                # Penalizar si no hay análisis financiero
-                base_score -= 50
-            
-            # Análisis reputacional (peso: 25%)
-            if reputational_result.get("success", False):
-                sentiment_score = reputational_result.get("puntaje_sentimiento", 0)
-                if sentiment_score > 0.3:
-                    base_score += 75
-                elif sentiment_score < -0.3:
-                    base_score -= 75
-            
-            # Análisis comportamental (peso: 25%)
-            if behavioral_result.get("success", False):
-                if "puntual" in str(behavioral_result).lower():
-                    base_score += 50
-                elif "impuntual" in str(behavioral_result).lower() or "retraso" in str(behavioral_result).lower():
-                    base_score -= 100
-                
-                if "alta" in str(behavioral_result.get("fiabilidad_referencias", "")).lower():
-                    base_score += 25
-                elif "baja" in str(behavioral_result.get("fiabilidad_referencias", "")).lower():
-                    base_score -= 50
+            base_score += sum(self._score_adjustments(financial_result, reputational_result,
+                                                      behavioral_result).values())
             
             # Asegurar que el score esté en el rango válido
             base_score = max(0, min(1000, base_score))
@@ -517,6 +641,102 @@ class AzureOrchestrator:
             self.logger.warning(f"Error calculating base score: {e}")
             return 500  # Score neutral por defecto
     
+    def _score_adjustments(self, financial_result: Dict[str, Any],
+                           reputational_result: Dict[str, Any],
+                           behavioral_result: Dict[str, Any]) -> Dict[str, int]:
+        """Ajuste sobre el score neutral aportado por cada análisis"""
+        adjustments = {"financial": 0, "reputational": 0, "behavioral": 0}
+        
+        # Análisis financiero (peso: 50%)
+        ratios = (financial_result.get("indicadores") or {}).get("ratios") or []
+        if financial_result.get("success", False) and ratios:
+            # Ratios calculados localmente a partir de las partidas SCVS (determinista)
+            adjustments["financial"] += self._ratio_score_adjustment(ratios[0])
+        elif financial_result.get("success", False):
+            # Si hay análisis financiero exitoso, ajustar score
+            if "solvencia" in str(financial_result).lower():
+                if any(word in str(financial_result).lower() for word in ["buena", "alta", "positiva", "estable"]):
+                    adjustments["financial"] += 100
+                elif any(word in str(financial_result).lower() for word in ["mala", "baja", "negativa", "crítica"]):
+                    adjustments["financial"] -= 150
+            
+            if "liquidez" in str(financial_result).lower():
+                if any(word in str(financial_result).lower() for word in ["buena", "alta", "suficiente"]):
+                    adjustments["financial"] += 50
+                elif any(word in str(financial_result).lower() for word in ["mala", "baja", "insuficiente"]):
+                    adjustments["financial"] -= 100
+        else:
+            # Penalizar si no hay análisis financiero
+            adjustments["financial"] -= 50
+        
+        # Análisis reputacional (peso: 25%)
+        if reputational_result.get("success", False):
+            sentiment_score = reputational_result.get("puntaje_sentimiento", 0)
+            if sentiment_score > 0.3:
+                adjustments["reputational"] += 75
+            elif sentiment_score < -0.3:
+                adjustments["reputational"] -= 75
+        
+        # Análisis comportamental (peso: 25%)
+        if behavioral_result.get("success", False):
+            if "puntual" in str(behavioral_result).lower():
+                adjustments["behavioral"] += 50
+            elif "impuntual" in str(behavioral_result).lower() or "retraso" in str(behavioral_result).lower():
+                adjustments["behavioral"] -= 100
+            
+            if "alta" in str(behavioral_result.get("fiabilidad_referencias", "")).lower():
+                adjustments["behavioral"] += 25
+            elif "baja" in str(behavioral_result.get("fiabilidad_referencias", "")).lower():
+                adjustments["behavioral"] -= 50
+        
+        return adjustments
+    
+    def _ratio_score_adjustment(self, ratios: Dict[str, Any]) -> int:
+        """Ajuste del score base según los indicadores del periodo más reciente (±250 como máximo)"""
+        adjustment = 0
+
+        # Liquidez
+        razon_corriente = ratios.get("razon_corriente")
+        if razon_corriente is not None:
+            if razon_corriente >= 1.5:
+                adjustment += 50
+            elif razon_corriente >= 1.0:
+                adjustment += 20
+            else:
+                adjustment -= 100
+
+        # Solvencia (patrimonio negativo -> deuda/patrimonio negativa)
+        deuda_patrimonio = ratios.get("deuda_patrimonio")
+        if deuda_patrimonio is not None:
+            if deuda_patrimonio < 0:
+                adjustment -= 150
+            elif deuda_patrimonio <= 1.0:
+                adjustment += 100
+            elif deuda_patrimonio <= 2.0:
+                adjustment += 25
+            elif deuda_patrimonio > 3.0:
+                adjustment -= 100
+
+        # Rentabilidad
+        margen_neto = ratios.get("margen_neto")
+        if margen_neto is not None:
+            if margen_neto >= 0.05:
+                adjustment += 50
+            elif margen_neto >= 0:
+                adjustment += 10
+            else:
+                adjustment -= 75
+
+        # Tendencia de ventas
+        crecimiento_ventas = ratios.get("crecimiento_ventas")
+        if crecimiento_ventas is not None:
+            if crecimiento_ventas >= 0.05:
+                adjustment += 25
+            elif crecimiento_ventas <= -0.10:
+                adjustment -= 50
+
+        return max(-250, min(250, adjustment))
+
     def _determine_risk_level(self, score: int) -> str:
         """Determina el nivel de riesgo basado en el score"""
         if score >= 750:
@@ -535,13 +755,94 @@ class AzureOrchestrator:
             count = self.stats["successful_evaluations"]
             self.stats["average_processing_time"] = ((current_avg * (count - 1)) + processing_time) / count
     
+    # ===== PERSISTENCE =====
+    
+    def _enqueue_persistence(self, result: EvaluationResult, company_data: CompanyData,
+                             start_time: datetime, agent_timings: Dict[str, int]):
+        """Encola la evaluación completada en el write-behind (no espera a la base de datos)"""
+        if self.write_behind is None:
+            return
+        try:
+            bundle = self._build_evaluation_bundle(result, company_data, start_time, agent_timings)
+            if not self.write_behind.enqueue(bundle):
+                self.logger.error(f"Evaluation {result.evaluation_id} could not be queued for persistence")
+        except Exception as e:
+            self.logger.error(f"Failed to queue evaluation {result.evaluation_id} for persistence: {e}")
+    
+    def _build_evaluation_bundle(self, result: EvaluationResult, company_data: CompanyData,
+                                 start_time: datetime, agent_timings: Dict[str, int]) -> EvaluationBundle:
+        """Convierte un EvaluationResult en las filas de RiskEvaluations, AgentResults y ScoringDetails"""
+        report = result.consolidated_report
+        confidence = float(report.get("confidence", 0.0) or 0.0)
+        analyses = {
+            "financial": result.financial_analysis,
+            "reputational": result.reputational_analysis,
+            "behavioral": result.behavioral_analysis
+        }
+        
+        evaluation = RiskEvaluation(
+            evaluation_id=result.evaluation_id,
+            company_id=result.company_id,
+            company_name=result.company_name,
+            status="completed",
+            final_score=float(result.final_score),
+            risk_level=str(result.risk_level).lower(),
+            confidence_score=confidence,
+            created_date=start_time,
+            completed_date=result.timestamp,
+            metadata=json.dumps({**company_data.metadata, "processing_time": result.processing_time,
+                                 "agent_timings_ms": agent_timings}, ensure_ascii=False, default=str)
+        )
+        
+        agent_results = [
+            AgentResult(
+                result_id=f"{result.evaluation_id}_{name}",
+                evaluation_id=result.evaluation_id,
+                agent_name=f"{name}_agent",
+                agent_type="business",
+                result_data=json.dumps(analysis, ensure_ascii=False, default=str),
+                confidence_score=confidence if analysis.get("success", True) else 0.0,
+                processing_time_ms=agent_timings.get(name, 0),
+                created_date=result.timestamp,
+                error_message=analysis.get("error")
+            )
+            for name, analysis in analyses.items()
+        ]
+        
+        # Puntaje de cada dimensión en la escala del score final (neutral 600)
+        adjustments = self._score_adjustments(analyses["financial"], analyses["reputational"],
+                                              analyses["behavioral"])
+        dimension_scores = {name: float(max(0, min(1000, 600 + value))) for name, value in adjustments.items()}
+        
+        scoring = ScoringDetail(
+            scoring_id=f"{result.evaluation_id}_scoring",
+            evaluation_id=result.evaluation_id,
+            financial_score=dimension_scores["financial"],
+            reputational_score=dimension_scores["reputational"],
+            behavioral_score=dimension_scores["behavioral"],
+            final_score=float(result.final_score),
+            explanation=str(report.get("justification", "")),
+            contributing_factors=json.dumps(report.get("contributing_factors", []), ensure_ascii=False),
+            credit_recommendation=json.dumps(report.get("credit_recommendation"), ensure_ascii=False),
+            created_date=result.timestamp
+        )
+        
+        return EvaluationBundle(evaluation, agent_results, scoring)
+    
     # ===== SECURITY METHODS =====
     
     async def _execute_security_supervision(self, evaluation_id: str, company_id: str = "unknown") -> Dict[str, Any]:
         """Ejecuta supervisión de seguridad usando SecuritySupervisor"""
         start_time = datetime.now()
         try:
-            supervision_result = await run_security_supervision(self.azure_service)
+            # Local streaming verdict first; the LLM supervisor only runs when a signal trips
+            local_verdict = self.anomaly_detector.get_verdict()
+            if local_verdict.anomaly_detected:
+                # The supervisor reads the log file: make buffered events visible first
+                await self.audit_logger.aflush()
+            supervision_result = await run_security_supervision(
+                self.azure_service, self.audit_logger.log_file_path, local_verdict
+            )
 
             # Ajustar para bloquear solo patrones maliciosos explícitos
             critical_alert = supervision_result.critical_alert and supervision_result.confidence_score > 0.9
@@ -552,6 +853,8 @@ class AzureOrchestrator:
                 "summary": supervision_result.summary,
                 "recommended_action": supervision_result.recommended_action,
                 "critical_alert": critical_alert,
+                "supervision_source": supervision_result.source,
+                "signals": supervision_result.signals,
                 "success": True
             }
 
@@ -731,47 +1034,31 @@ class AzureOrchestrator:
             self.logger.error(f"Final output sanitization failed for {evaluation_id}: {e}")
             return consolidated_report  # Return original if sanitization fails
     
-    async def _log_evaluation_completion(self, evaluation_id: str, final_report: Dict[str, Any], processing_time: float):
+    async def _log_evaluation_completion(self, evaluation_id: str, company_id: str,
+                                         final_report: Dict[str, Any], processing_time: float):
         """Registra la finalización exitosa de una evaluación"""
         try:
             # Verificar si final_report es válido
             if not final_report:
                 self.logger.warning(f"Final report is None for evaluation {evaluation_id}. Using default values.")
                 final_report = {"final_score": 0, "risk_level": "error"}
-
-            audit_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "evaluation_id": evaluation_id,
-                "event": "EVALUATION_COMPLETED",
-                "final_score": final_report.get("final_score", 0),
-                "risk_level": final_report.get("risk_level", "unknown"),
-                "processing_time": processing_time,
-                "tokens_used": self.stats["total_tokens_used"],
-                "success": True
-            }
             
-            # Write to audit log
-            with open("audit.log", "a", encoding="utf-8") as f:
-                f.write(json.dumps(audit_entry, ensure_ascii=False) + "\n")
+            # Write to audit log (buffered writer, off the critical path)
+            self.audit_logger.log_evaluation_completion(
+                evaluation_id, company_id, final_report, processing_time, self.stats["total_tokens_used"]
+            )
                 
         except Exception as e:
             self.logger.error(f"Failed to log evaluation completion for {evaluation_id}: {e}")
     
-    async def _log_evaluation_failure(self, evaluation_id: str, error_message: str, processing_time: float):
+    async def _log_evaluation_failure(self, evaluation_id: str, company_id: str, error_message: str,
+                                      failure_stage: str, processing_time: float):
         """Registra el fallo de una evaluación"""
         try:
-            audit_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "evaluation_id": evaluation_id,
-                "event": "EVALUATION_FAILED",
-                "error": error_message,
-                "processing_time": processing_time,
-                "success": False
-            }
-            
-            # Write to audit log
-            with open("audit.log", "a", encoding="utf-8") as f:
-                f.write(json.dumps(audit_entry, ensure_ascii=False) + "\n")
+            # Write to audit log (buffered writer, off the critical path)
+            self.audit_logger.log_evaluation_failure(
+                evaluation_id, company_id, error_message, failure_stage, processing_time
+            )
                 
         except Exception as e:
             self.logger.error(f"Failed to log evaluation failure for {evaluation_id}: {e}")
@@ -824,6 +1111,27 @@ class AzureOrchestrator:
             errors=[f"Validation failed for fields: {', '.join(blocked_fields)}"]
         )
     
+    def _create_cancelled_result(self, evaluation_id: str, company_data: CompanyData,
+                                 start_time: datetime, reason: str) -> EvaluationResult:
+        """Crea un resultado cuando la evaluación fue cancelada"""
+        processing_time = (datetime.now() - start_time).total_seconds()
+        
+        return EvaluationResult(
+            evaluation_id=evaluation_id,
+            company_id=company_data.company_id,
+            company_name=company_data.company_name,
+            final_score=0.0,
+            risk_level="CANCELLED",
+            financial_analysis={"error": "Evaluation cancelled", "success": False},
+            reputational_analysis={"error": "Evaluation cancelled", "success": False},
+            behavioral_analysis={"error": "Evaluation cancelled", "success": False},
+            consolidated_report={"error": f"Evaluation cancelled: {reason}", "success": False},
+            processing_time=processing_time,
+            timestamp=datetime.now(),
+            success=False,
+            errors=[f"Evaluation cancelled: {reason}"]
+        )
+    
     def get_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas del orquestador"""
         return self.stats.copy()
@@ -836,6 +1144,14 @@ class AzureOrchestrator:
         """Obtiene los eventos de auditoría más recientes"""
         return self.audit_logger.get_recent_events(limit)
     
+    async def aget_audit_trail(self, evaluation_id: str) -> List[Dict[str, Any]]:
+        """Versión awaitable de get_audit_trail (no bloquea el event loop)"""
+        return await self.audit_logger.aget_evaluation_audit_trail(evaluation_id)
+    
+    async def aget_recent_audit_events(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Versión awaitable de get_recent_audit_events (no bloquea el event loop)"""
+        return await self.audit_logger.aget_recent_events(limit)
+    
     def _create_validation_failed_result(self, evaluation_id: str, company_data: CompanyData, 
                                        start_time: datetime, validation_result: Dict[str, Any]) -> EvaluationResult:
         """Crea un resultado cuando la validación de entrada falla"""
@@ -875,7 +1191,9 @@ class AzureOrchestrator:
             "using_azure": True,
             "azure_endpoint": self.config.endpoint if self.config else None,
             "gpt4o_model": self.config.deployment_name if self.config else None,
-            "o3mini_model": self.config.deployment_name_mini if self.config else None
+            "o3mini_model": self.config.deployment_name_mini if self.config else None,
+            "anomaly_detector": self.anomaly_detector.get_stats(),
+            "persistence": self.write_behind.get_stats() if self.write_behind else {"enabled": False}
         }
     
     async def evaluate_company_risk_from_pdfs(self, pdf_paths: List[str], company_name: str, user_id: str = "web_user") -> EvaluationResult:
@@ -883,9 +1201,10 @@ class AzureOrchestrator:
         - Extrae texto/tablas con pdf_ingestion_service
         - Construye CompanyData y llama evaluate_company_risk
         """
-        from .infrastructure_agents.services.pdf_ingestion_service import parse_financial_pdfs, build_financial_text_from_parsed
-        # Parse PDFs
-        parsed = await parse_financial_pdfs(pdf_paths)
+        from .infrastructure_agents.services.pdf_ingestion_service import parse_financial_pdfs_cached, build_financial_text_from_parsed
+        # Parse PDFs (caché por contenido: re-subir el mismo archivo no lo vuelve a parsear;
+        # misma normalización que la interfaz, así que ambos comparten la extracción)
+        parsed = await parse_financial_pdfs_cached(pdf_paths, normalize=True)
         consolidated_text = build_financial_text_from_parsed(parsed)
         # Fallback si no hay texto
         if not consolidated_text.strip():
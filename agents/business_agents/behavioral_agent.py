@@ -6,6 +6,7 @@ from pydantic import BaseModel, Field
 
 # Import Azure OpenAI Service
 from ..infrastructure_agents.services.azure_openai_service_enhanced import OpenAIRequest
+from ..infrastructure_agents.services.context_packer import get_token_budget, pack_text
 
 class BehavioralAnalysisResult(BaseModel):
     """
@@ -33,6 +34,9 @@ async def analyze_behavior(azure_service, behavioral_data_text: str) -> Behavior
                 tokens_used=0
             )
 
+        # Presupuesto de tokens del agente (se conserva el orden, corte en límites de sección)
+        behavioral_data_text = pack_text(behavioral_data_text, get_token_budget("behavioral_agent"), relevance=False).text
+
         prompt = f"""
         Eres un Analista de Crédito especializado en la evaluación de riesgos no financieros y comportamentales.
         Tu tarea es analizar el siguiente texto, que contiene referencias comerciales y un historial de pagos simulado para una PYME.
@@ -2,10 +2,16 @@
 
 import json
 from datetime import datetime
+from typing import Any, Dict
 from pydantic import BaseModel, Field
 
 # Import Azure OpenAI Service
 from ..infrastructure_agents.services.azure_openai_service_enhanced import OpenAIRequest
+from ..infrastructure_agents.services.context_packer import get_token_budget, pack_text
+from ..infrastructure_agents.services.financial_statement_parser import (
+    extract_structured_financials,
+    format_ratio_table,
+)
 
 class FinancialAnalysisResult(BaseModel):
     """
@@ -18,6 +24,7 @@ class FinancialAnalysisResult(BaseModel):
     resumen_ejecutivo: str = Field(description="Un párrafo final que resume la salud financiera general de la PYME.")
     success: bool = Field(description="Indica si el análisis fue exitoso", default=True)
     tokens_used: int = Field(description="Tokens utilizados en el análisis", default=0)
+    indicadores: Dict[str, Any] = Field(description="Cifras y ratios calculados localmente a partir de las partidas SCVS ({'periodos': [...], 'ratios': [...]})", default_factory=dict)
 
 async def analyze_financial_document(azure_service, document_text: str) -> FinancialAnalysisResult:
     """
@@ -45,15 +52,35 @@ async def analyze_financial_document(azure_service, document_text: str) -> Finan
                 tokens_used=0
             )
 
+        # Partidas SCVS -> cifras y ratios calculados localmente; si se reconocen, el
+        # prompt recibe la tabla compacta en lugar del texto completo del documento
+        financials = extract_structured_financials(document_text)
+        indicadores: Dict[str, Any] = {}
+        if financials.has_core_figures():
+            indicadores = {
+                "periodos": [p.model_dump(exclude_none=True) for p in financials.periods],
+                "ratios": [r.model_dump(exclude_none=True) for r in financials.ratios],
+            }
+            document_section = (
+                "**CIFRAS E INDICADORES (calculados a partir de las partidas del estado financiero):**\n"
+                + format_ratio_table(financials)
+            )
+            print(f"📐 Partidas reconocidas: {len(financials.line_items)} - se envía la tabla de indicadores")
+        else:
+            # Sin partidas reconocibles: secciones más relevantes dentro del presupuesto del agente
+            packed = pack_text(document_text, get_token_budget("financial_agent"))
+            document_section = f"**TEXTO DEL DOCUMENTO FINANCIERO:**\n{packed.text}"
+            estimate = "" if packed.exact else " (estimación sin tiktoken)"
+            print(f"📦 Contexto empaquetado: {packed.tokens}/{packed.budget} tokens{estimate}, {packed.omitted} secciones omitidas")
+
         prompt = f"""
         Eres un Analista Financiero Contable experto en Normas Internacionales de Información Financiera (NIIF) para PYMEs en Ecuador.
-        Tu tarea es analizar el siguiente texto, extraído de un estado financiero del portal de la Superintendencia de Compañías (SCVS).
+        Tu tarea es analizar la siguiente información, extraída de un estado financiero del portal de la Superintendencia de Compañías (SCVS).
 
-        **TEXTO DEL DOCUMENTO FINANCIERO:**
-        {document_text}
+        {document_section}
 
         **TU ANÁLISIS:**
-        Basándote únicamente en el texto proporcionado, realiza un análisis conciso de los siguientes puntos:
+        Basándote únicamente en la información proporcionada, realiza un análisis conciso de los siguientes puntos:
         1. **Solvencia:** Evalúa la capacidad de la empresa para cumplir con sus obligaciones a largo plazo.
         2. **Liquidez:** Evalúa la capacidad de la empresa para cubrir sus deudas a corto plazo.
         3. **Rentabilidad:** Evalúa la eficiencia de la empresa para generar beneficios.
@@ -148,7 +175,8 @@ async def analyze_financial_document(azure_service, document_text: str) -> Finan
                 tendencia_ventas=result_data.get("tendencia_ventas", "Análisis no disponible"),
                 resumen_ejecutivo=result_data.get("resumen_ejecutivo", "Resumen no disponible"),
                 success=True,
-                tokens_used=response.tokens_used
+                tokens_used=response.tokens_used,
+                indicadores=indicadores
             )
         except json.JSONDecodeError as e:
             print(f"🚨 JSON DECODE ERROR: {str(e)}")
@@ -167,7 +195,8 @@ async def analyze_financial_document(azure_service, document_text: str) -> Finan
                     tendencia_ventas=raw_response[:200] + "...",
                     resumen_ejecutivo=raw_response[:300] + "...",
                     success=True,
-                    tokens_used=response.tokens_used
+                    tokens_used=response.tokens_used,
+                    indicadores=indicadores
                 )
             else:
                 # Si no hay información útil, devuelve error claro
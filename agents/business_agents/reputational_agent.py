@@ -7,6 +7,7 @@ from typing import List
 
 # Import Azure OpenAI Service
 from ..infrastructure_agents.services.azure_openai_service_enhanced import OpenAIRequest
+from ..infrastructure_agents.services.context_packer import get_token_budget, pack_text
 
 class ReputationAnalysisResult(BaseModel):
     """
@@ -36,6 +37,9 @@ async def analyze_reputation(azure_service, social_media_text: str) -> Reputatio
                 tokens_used=0
             )
 
+        # Presupuesto de tokens del agente (se conserva el orden, corte en límites de sección)
+        social_media_text = pack_text(social_media_text, get_token_budget("reputational_agent"), relevance=False).text
+
         prompt = f"""
         Eres un especialista en Marketing Digital y Reputación Online (ORM). Tu tarea es analizar un conjunto de comentarios y reseñas sobre una PYME.
 
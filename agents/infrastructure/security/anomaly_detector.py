@@ -0,0 +1,334 @@
+# security/anomaly_detector.py
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .audit_logger import AuditEvent, AuditLogger
+from .supervisor import SupervisionReport
+
+# Eventos que cuentan como error aunque success sea True
+ERROR_EVENT_TYPES = {"EVALUATION_FAILED", "SECURITY_ALERT", "AUDIT_ERROR"}
+CRITICAL_EVENT_TYPES = {"SECURITY_ALERT"}
+# Eventos con success=False que no son errores: cancelaciones del usuario o por reenvío
+NON_ERROR_EVENT_TYPES = {"EVALUATION_CANCELLED"}
+# Un INPUT_VALIDATION por evaluación: es la señal de "envío" para detectar ráfagas
+DEFAULT_BURST_EVENT_TYPES = ("INPUT_VALIDATION",)
+
+
+class _SlidingWindowCounter:
+    """Contador sobre una ventana deslizante de buckets fijos (ring buffer)"""
+
+    __slots__ = ("bucket_seconds", "counts", "current_bucket", "total")
+
+    def __init__(self, window_seconds: float, buckets: int):
+        self.bucket_seconds = window_seconds / buckets
+        self.counts = [0] * buckets
+        self.current_bucket: Optional[int] = None
+        self.total = 0
+
+    def _advance(self, ts: float) -> None:
+        bucket = int(ts // self.bucket_seconds)
+        if self.current_bucket is None:
+            self.current_bucket = bucket
+            return
+        if bucket <= self.current_bucket:
+            # Eventos fuera de orden se cuentan en el bucket actual
+            return
+        size = len(self.counts)
+        for step in range(1, min(bucket - self.current_bucket, size) + 1):
+            position = (self.current_bucket + step) % size
+            self.total -= self.counts[position]
+            self.counts[position] = 0
+        self.current_bucket = bucket
+
+    def add(self, ts: float, amount: int = 1) -> None:
+        self._advance(ts)
+        self.counts[self.current_bucket % len(self.counts)] += amount
+        self.total += amount
+
+    def value(self, ts: float) -> int:
+        self._advance(ts)
+        return self.total
+
+
+class _DecayingCounter:
+    """Conteo con decaimiento exponencial: value ≈ eventos en los últimos `tau` segundos"""
+
+    __slots__ = ("tau", "value", "last_ts")
+
+    def __init__(self, tau: float):
+        self.tau = tau
+        self.value = 0.0
+        self.last_ts: Optional[float] = None
+
+    def _decay(self, ts: float) -> None:
+        if self.last_ts is not None and ts > self.last_ts:
+            self.value *= math.exp(-(ts - self.last_ts) / self.tau)
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+    def add(self, ts: float, amount: float = 1.0) -> float:
+        self._decay(ts)
+        self.value += amount
+        return self.value
+
+    def rate(self, ts: float) -> float:
+        """Tasa EWMA en eventos por segundo"""
+        self._decay(ts)
+        return self.value / self.tau
+
+
+class _KeyState:
+    """Estado por empresa/usuario: ráfaga con decaimiento y racha de validaciones fallidas"""
+
+    __slots__ = ("burst", "validation_streak")
+
+    def __init__(self, tau: float):
+        self.burst = _DecayingCounter(tau)
+        self.validation_streak = 0
+
+
+class StreamingAnomalyDetector:
+    """
+    Detector estadístico de anomalías sobre el flujo de eventos de auditoría
+
+    Se alimenta con cada AuditEvent (AuditLogger.add_listener) y mantiene, con coste
+    O(1) en memoria y tiempo por evento:
+    - contadores de ventana deslizante de eventos, errores y validaciones fallidas
+    - tasas EWMA de errores a corto y largo plazo (picos respecto a la línea base)
+    - ráfagas por empresa y por usuario (LRU acotado de `max_tracked_keys` claves)
+    - rachas de validaciones fallidas, globales y por empresa
+
+    get_verdict() publica un SupervisionReport; el supervisor LLM solo se invoca
+    cuando alguna señal supera su umbral.
+    """
+
+    def __init__(self, window_seconds: float = 300.0, window_buckets: int = 60,
+                 min_events_for_rates: int = 20, error_ratio_threshold: float = 0.3,
+                 error_spike_factor: float = 3.0, short_tau_seconds: float = 60.0,
+                 long_tau_seconds: float = 3600.0, burst_tau_seconds: float = 60.0,
+                 company_burst_threshold: float = 10.0, user_burst_threshold: float = 30.0,
+                 validation_streak_threshold: int = 3, critical_validation_streak: int = 10,
+                 window_validation_failures_threshold: int = 10, max_tracked_keys: int = 10000,
+                 burst_event_types: Tuple[str, ...] = DEFAULT_BURST_EVENT_TYPES):
+        self.window_seconds = window_seconds
+        self.min_events_for_rates = min_events_for_rates
+        self.error_ratio_threshold = error_ratio_threshold
+        self.error_spike_factor = error_spike_factor
+        self.burst_tau_seconds = burst_tau_seconds
+        self.company_burst_threshold = company_burst_threshold
+        self.user_burst_threshold = user_burst_threshold
+        self.validation_streak_threshold = validation_streak_threshold
+        self.critical_validation_streak = critical_validation_streak
+        self.window_validation_failures_threshold = window_validation_failures_threshold
+        self.max_tracked_keys = max_tracked_keys
+        self.burst_event_types = set(burst_event_types)
+
+        self._lock = threading.Lock()
+        self._events = _SlidingWindowCounter(window_seconds, window_buckets)
+        self._errors = _SlidingWindowCounter(window_seconds, window_buckets)
+        self._validation_failures = _SlidingWindowCounter(window_seconds, window_buckets)
+        self._critical_events = _SlidingWindowCounter(window_seconds, window_buckets)
+        self._short_error_rate = _DecayingCounter(short_tau_seconds)
+        self._long_error_rate = _DecayingCounter(long_tau_seconds)
+        self._keys: "OrderedDict[Tuple[str, str], _KeyState]" = OrderedDict()
+        self._validation_streak = 0
+        # Última alerta de ráfaga/racha por clave (acotadas): clave -> (ts, descripción)
+        self._alerts: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._last_ts: Optional[float] = None
+
+        self.stats = {
+            "events_observed": 0,
+            "verdicts": 0,
+            "escalations": 0
+        }
+
+    # Ingesta
+
+    def observe(self, event: Union[AuditEvent, Dict[str, Any]]) -> None:
+        """Procesa un evento de auditoría (AuditEvent o dict con sus campos)"""
+        data = dict(event) if isinstance(event, AuditEvent) else event
+        ts = self._timestamp(data.get("timestamp"))
+        event_type = data.get("event_type") or data.get("event") or ""
+        success = data.get("success", True)
+        details = data.get("details") or {}
+        is_error = event_type not in NON_ERROR_EVENT_TYPES and (success is False or event_type in ERROR_EVENT_TYPES)
+        is_validation = event_type == "INPUT_VALIDATION"
+        validation_failed = is_validation and (success is False or details.get("all_safe") is False)
+
+        with self._lock:
+            self.stats["events_observed"] += 1
+            self._last_ts = ts if self._last_ts is None else max(self._last_ts, ts)
+
+            self._events.add(ts)
+            if is_error:
+                self._errors.add(ts)
+                self._short_error_rate.add(ts)
+                self._long_error_rate.add(ts)
+            if event_type in CRITICAL_EVENT_TYPES:
+                self._critical_events.add(ts)
+
+            company_id = data.get("company_id")
+            company_state = self._key_state("company", company_id) if company_id else None
+
+            if is_validation:
+                if validation_failed:
+                    self._validation_failures.add(ts)
+                    self._validation_streak += 1
+                    if company_state is not None:
+                        company_state.validation_streak += 1
+                        if company_state.validation_streak == self.validation_streak_threshold:
+                            self._record_alert(("streak", company_id), ts,
+                                               f"Racha de {company_state.validation_streak} "
+                                               f"validaciones fallidas de la empresa {company_id}")
+                else:
+                    self._validation_streak = 0
+                    if company_state is not None:
+                        company_state.validation_streak = 0
+
+            if event_type in self.burst_event_types:
+                if company_state is not None:
+                    count = company_state.burst.add(ts)
+                    if count - 1 < self.company_burst_threshold <= count:
+                        self._record_alert(("company", company_id), ts,
+                                           f"Ráfaga de {count:.0f} evaluaciones de la empresa {company_id}")
+                user_id = data.get("user_id")
+                if user_id and user_id != "system":
+                    count = self._key_state("user", user_id).burst.add(ts)
+                    if count - 1 < self.user_burst_threshold <= count:
+                        self._record_alert(("user", user_id), ts,
+                                           f"Ráfaga de {count:.0f} evaluaciones del usuario {user_id}")
+
+    def observe_many(self, events: List[Dict[str, Any]]) -> None:
+        """Procesa un histórico de eventos (p. ej. los recientes del log al arrancar)"""
+        for event in events:
+            self.observe(event)
+
+    def _record_alert(self, key: Tuple[str, str], ts: float, description: str) -> None:
+        self._alerts[key] = (ts, description)
+        self._alerts.move_to_end(key)
+        if len(self._alerts) > 100:
+            self._alerts.popitem(last=False)
+
+    def _key_state(self, kind: str, key: str) -> _KeyState:
+        """Estado de una clave en el LRU acotado (O(1))"""
+        lru_key = (kind, key)
+        state = self._keys.get(lru_key)
+        if state is None:
+            state = _KeyState(self.burst_tau_seconds)
+            self._keys[lru_key] = state
+            if len(self._keys) > self.max_tracked_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(lru_key)
+        return state
+
+    @staticmethod
+    def _timestamp(value: Any) -> float:
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value).timestamp()
+            except ValueError:
+                pass
+        return time.time()
+
+    # Veredicto
+
+    def get_signals(self, now: Optional[float] = None) -> List[Tuple[str, float, bool]]:
+        """Señales activas como (descripción, confianza, crítica)"""
+        with self._lock:
+            now = now if now is not None else max(time.time(), self._last_ts or 0.0)
+            signals = []
+
+            events = self._events.value(now)
+            errors = self._errors.value(now)
+            if events >= self.min_events_for_rates and errors / events >= self.error_ratio_threshold:
+                signals.append((f"Tasa de errores {errors}/{events} en los últimos "
+                                f"{self.window_seconds:.0f}s", min(1.0, 0.5 + errors / events / 2), False))
+
+            short_rate = self._short_error_rate.rate(now)
+            long_rate = self._long_error_rate.rate(now)
+            if errors >= self.min_events_for_rates / 2 and short_rate > self.error_spike_factor * max(long_rate, 1e-9):
+                signals.append((f"Pico de errores: {short_rate * 60:.1f}/min frente a una línea base "
+                                f"de {long_rate * 60:.1f}/min", 0.7, False))
+
+            validation_failures = self._validation_failures.value(now)
+            if validation_failures >= self.window_validation_failures_threshold:
+                signals.append((f"{validation_failures} validaciones fallidas en los últimos "
+                                f"{self.window_seconds:.0f}s", 0.8, False))
+
+            if self._validation_streak >= self.validation_streak_threshold:
+                critical = self._validation_streak >= self.critical_validation_streak
+                signals.append((f"Racha global de {self._validation_streak} validaciones fallidas consecutivas",
+                                0.95 if critical else 0.75, critical))
+
+            critical_events = self._critical_events.value(now)
+            if critical_events:
+                signals.append((f"{critical_events} alertas de seguridad en los últimos "
+                                f"{self.window_seconds:.0f}s", 0.95, True))
+
+            cutoff = now - self.window_seconds
+            for ts, description in self._alerts.values():
+                if ts >= cutoff:
+                    signals.append((description, 0.8, False))
+
+            return signals
+
+    def get_verdict(self, now: Optional[float] = None) -> SupervisionReport:
+        """Veredicto local compatible con el informe del supervisor"""
+        signals = self.get_signals(now)
+        self.stats["verdicts"] += 1
+        if not signals:
+            return SupervisionReport(
+                anomaly_detected=False,
+                confidence_score=0.0,
+                summary="Detector local: ninguna señal supera sus umbrales.",
+                recommended_action="Ninguna",
+                critical_alert=False,
+                source="local_detector"
+            )
+
+        self.stats["escalations"] += 1
+        critical = any(is_critical for _, _, is_critical in signals)
+        return SupervisionReport(
+            anomaly_detected=True,
+            confidence_score=max(confidence for _, confidence, _ in signals),
+            summary="Detector local: " + "; ".join(description for description, _, _ in signals),
+            recommended_action="Alerta de Seguridad Crítica" if critical else "Revisión Manual Requerida",
+            critical_alert=critical,
+            signals=[description for description, _, _ in signals],
+            source="local_detector"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas del detector"""
+        with self._lock:
+            return {**self.stats, "tracked_keys": len(self._keys)}
+
+
+# Un detector por archivo de auditoría, compartido por todos los orquestadores del proceso
+_detectors: Dict[str, StreamingAnomalyDetector] = {}
+_detectors_lock = threading.Lock()
+
+
+def get_anomaly_detector(audit_logger: AuditLogger, seed_events: int = 1000) -> StreamingAnomalyDetector:
+    """
+    Obtiene (o crea) el detector compartido del log de audit_logger y lo suscribe a sus eventos
+
+    El detector se siembra una sola vez por proceso con los eventos recientes ya
+    escritos en el log, sin esperar al escritor de auditoría.
+    """
+    key = os.path.abspath(audit_logger.log_file_path)
+    with _detectors_lock:
+        detector = _detectors.get(key)
+        if detector is None:
+            detector = StreamingAnomalyDetector()
+            detector.observe_many(audit_logger.get_recent_events(seed_events, flush=False))
+            _detectors[key] = detector
+    audit_logger.add_listener(detector.observe)
+    return detector
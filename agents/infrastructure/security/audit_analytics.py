@@ -0,0 +1,318 @@
+# security/audit_analytics.py
+
+import glob
+import json
+import logging
+import os
+from datetime import datetime
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.acero as acero
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: solo lo necesita la analítica
+    pa = None
+
+from .audit_segments import load_manifest, open_segment
+
+# Columna de partición (hive: event_date=YYYY-MM-DD)
+PARTITION_COLUMN = "event_date"
+ACTIVE_PART_NAME = "active.parquet"
+STATE_FILE_NAME = "_export_state.json"
+
+# Agregaciones soportadas por aggregate(): percentiles (t-digest) y funciones hash de Acero
+_PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+_SIMPLE_AGGREGATIONS = {
+    "count": "hash_count",
+    "sum": "hash_sum",
+    "mean": "hash_mean",
+    "min": "hash_min",
+    "max": "hash_max"
+}
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is required for audit analytics: pip install pyarrow")
+
+
+def audit_event_schema() -> "pa.Schema":
+    """Esquema columnar de AuditEvent (details se guarda como JSON)"""
+    _require_pyarrow()
+    return pa.schema([
+        ("timestamp", pa.timestamp("us")),
+        ("evaluation_id", pa.string()),
+        ("event_type", pa.string()),
+        ("agent_id", pa.string()),
+        ("user_id", pa.string()),
+        ("company_id", pa.string()),
+        ("success", pa.bool_()),
+        ("processing_time", pa.float64()),
+        ("tokens_used", pa.int64()),
+        ("risk_level", pa.string()),
+        ("details", pa.string())
+    ])
+
+
+def _row_from_line(line: bytes) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Convierte una línea del log en (event_date, fila); None si no es un evento válido"""
+    try:
+        data = json.loads(line)
+        timestamp = datetime.fromisoformat(data["timestamp"])
+    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    tokens_used = data.get("tokens_used")
+    processing_time = data.get("processing_time")
+    return timestamp.date().isoformat(), {
+        "timestamp": timestamp,
+        "evaluation_id": data.get("evaluation_id"),
+        "event_type": data.get("event_type") or data.get("event"),
+        "agent_id": data.get("agent_id"),
+        "user_id": data.get("user_id"),
+        "company_id": data.get("company_id"),
+        "success": data.get("success"),
+        "processing_time": float(processing_time) if isinstance(processing_time, (int, float)) else None,
+        "tokens_used": int(tokens_used) if isinstance(tokens_used, (int, float)) else None,
+        "risk_level": data.get("risk_level"),
+        "details": json.dumps(data.get("details"), ensure_ascii=False) if data.get("details") is not None else None
+    }
+
+
+class AuditParquetExporter:
+    """
+    Exporta el log de auditoría a Parquet particionado por día
+
+    Cada segmento sellado se exporta una sola vez (es inmutable) a
+    event_date=<día>/<segmento>.parquet; el archivo activo se reexporta en cada
+    llamada a event_date=<día>/active.parquet. La conversión se hace en lotes de
+    `batch_rows` eventos, por lo que la memoria no depende del tamaño del log.
+    """
+
+    def __init__(self, log_file_path: str = "audit.log", output_dir: str = "audit_parquet",
+                 batch_rows: int = 50000):
+        _require_pyarrow()
+        self.log_file_path = log_file_path
+        self.output_dir = output_dir
+        self.batch_rows = max(1, batch_rows)
+        self.schema = audit_event_schema()
+        self.logger = logging.getLogger(__name__)
+        self.state_path = os.path.join(output_dir, STATE_FILE_NAME)
+
+    def export(self) -> Dict[str, Any]:
+        """Exporta los segmentos pendientes y el archivo activo; devuelve un resumen"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        state = self._load_state()
+        exported = set(state["segments"])
+        summary = {"segments_exported": 0, "events_exported": 0}
+
+        for segment in load_manifest(self.log_file_path)["segments"]:
+            if segment["segment"] in exported:
+                continue
+            try:
+                with open_segment(self.log_file_path, segment) as f:
+                    summary["events_exported"] += self._export_stream(f, f"{segment['segment']}.parquet")
+            except FileNotFoundError:
+                continue
+            exported.add(segment["segment"])
+            summary["segments_exported"] += 1
+            # El estado se guarda por segmento: una exportación interrumpida se reanuda
+            self._save_state({"segments": sorted(exported)})
+
+        for path in glob.glob(os.path.join(self.output_dir, f"{PARTITION_COLUMN}=*", ACTIVE_PART_NAME)):
+            os.remove(path)
+        try:
+            with open(self.log_file_path, "rb") as f:
+                summary["events_exported"] += self._export_stream(f, ACTIVE_PART_NAME)
+        except FileNotFoundError:
+            pass
+
+        return summary
+
+    def _export_stream(self, f: IO[bytes], part_name: str) -> int:
+        """Convierte un log JSONL en archivos Parquet por día, en lotes acotados"""
+        writers: Dict[str, "pq.ParquetWriter"] = {}
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        pending_rows = 0
+        total = 0
+
+        def write_pending():
+            for event_date, rows in pending.items():
+                if not rows:
+                    continue
+                writer = writers.get(event_date)
+                if writer is None:
+                    partition_dir = os.path.join(self.output_dir, f"{PARTITION_COLUMN}={event_date}")
+                    os.makedirs(partition_dir, exist_ok=True)
+                    writer = pq.ParquetWriter(os.path.join(partition_dir, part_name), self.schema,
+                                              compression="zstd")
+                    writers[event_date] = writer
+                writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+            pending.clear()
+
+        try:
+            for line in f:
+                parsed = _row_from_line(line)
+                if parsed is None:
+                    continue
+                event_date, row = parsed
+                pending.setdefault(event_date, []).append(row)
+                pending_rows += 1
+                total += 1
+                if pending_rows >= self.batch_rows:
+                    write_pending()
+                    pending_rows = 0
+            write_pending()
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return total
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"segments": []}
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+
+class AuditAnalytics:
+    """
+    Consultas de agregación sobre la exportación Parquet del log de auditoría
+
+    Las consultas se ejecutan en streaming con Acero: solo se leen las columnas
+    necesarias, los filtros por día podan particiones completas y la memoria depende
+    del número de grupos, no del número de eventos. Los percentiles son aproximados
+    (t-digest).
+    """
+
+    def __init__(self, output_dir: str = "audit_parquet"):
+        _require_pyarrow()
+        self.output_dir = output_dir
+
+    def _dataset(self) -> "ds.Dataset":
+        schema = audit_event_schema().append(pa.field(PARTITION_COLUMN, pa.string()))
+        return ds.dataset(
+            self.output_dir, format="parquet", schema=schema,
+            partitioning=ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive"),
+            exclude_invalid_files=True, ignore_prefixes=["_", "."]
+        )
+
+    def aggregate(self, group_by: Sequence[str], metrics: Sequence[Tuple[str, str]],
+                  event_type: Optional[str] = None, agent_id: Optional[str] = None,
+                  start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Agrega métricas por grupo
+
+        metrics es una lista de (columna, agregación) con agregación en count, sum,
+        mean, min, max, p50, p90, p95 o p99; sobre `success` la media es la tasa de
+        éxito. Cada resultado se devuelve como "<columna>_<agregación>".
+        Ejemplo: aggregate(["agent_id"], [("processing_time", "p95")], start=...)
+        """
+        group_by = list(group_by)
+        metric_columns = sorted({column for column, _ in metrics})
+        columns = sorted(set(group_by) | set(metric_columns) | {"timestamp"})
+
+        filter_expr = self._filter_expression(event_type, agent_id, start, end)
+        projections = [pc.field(column) for column in group_by]
+        names = list(group_by)
+        for column in metric_columns:
+            field = pc.field(column)
+            # success se agrega como 0/1 para obtener tasas
+            projections.append(field.cast(pa.float64()) if column == "success" else field)
+            names.append(column)
+
+        aggregates = []
+        for column, aggregation in metrics:
+            output_name = f"{column}_{aggregation}"
+            if aggregation in _PERCENTILES:
+                options = pc.TDigestOptions(q=_PERCENTILES[aggregation])
+                aggregates.append((column, "hash_tdigest" if group_by else "tdigest", options, output_name))
+            elif aggregation in _SIMPLE_AGGREGATIONS:
+                function = _SIMPLE_AGGREGATIONS[aggregation]
+                aggregates.append((column, function if group_by else function[len("hash_"):], None, output_name))
+            else:
+                raise ValueError(f"Unsupported aggregation: {aggregation}")
+
+        dataset = self._dataset()
+        plan = acero.Declaration.from_sequence([
+            acero.Declaration("scan", acero.ScanNodeOptions(dataset, columns=columns, filter=filter_expr)),
+            acero.Declaration("filter", acero.FilterNodeOptions(filter_expr)),
+            acero.Declaration("project", acero.ProjectNodeOptions(projections, names)),
+            acero.Declaration("aggregate", acero.AggregateNodeOptions(aggregates, keys=group_by))
+        ])
+        table = plan.to_table(use_threads=True)
+
+        rows = table.to_pylist()
+        for row in rows:
+            for key, value in row.items():
+                # tdigest devuelve una lista con un valor por cuantil
+                if isinstance(value, list):
+                    row[key] = value[0] if value else None
+        return sorted(rows, key=lambda row: tuple(str(row.get(column)) for column in group_by))
+
+    def _filter_expression(self, event_type: Optional[str], agent_id: Optional[str],
+                           start: Optional[datetime], end: Optional[datetime]) -> "pc.Expression":
+        expression = pc.scalar(True)
+        if event_type is not None:
+            expression &= pc.field("event_type") == event_type
+        if agent_id is not None:
+            expression &= pc.field("agent_id") == agent_id
+        if start is not None:
+            # La condición sobre event_date poda particiones sin abrirlas
+            expression &= pc.field(PARTITION_COLUMN) >= start.date().isoformat()
+            expression &= pc.field("timestamp") >= pa.scalar(start, type=pa.timestamp("us"))
+        if end is not None:
+            expression &= pc.field(PARTITION_COLUMN) <= end.date().isoformat()
+            expression &= pc.field("timestamp") <= pa.scalar(end, type=pa.timestamp("us"))
+        return expression
+
+    # Consultas frecuentes
+
+    def latency_percentiles(self, agent_id: Optional[str] = None, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """p50/p95/p99 de processing_time por agente"""
+        return self.aggregate(
+            ["agent_id"],
+            [("processing_time", "count"), ("processing_time", "p50"),
+             ("processing_time", "p95"), ("processing_time", "p99")],
+            agent_id=agent_id, start=start, end=end
+        )
+
+    def risk_level_distribution_by_day(self, start: Optional[datetime] = None,
+                                       end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Número de evaluaciones completadas por día y nivel de riesgo"""
+        return self.aggregate(
+            [PARTITION_COLUMN, "risk_level"], [("evaluation_id", "count")],
+            event_type="EVALUATION_COMPLETED", start=start, end=end
+        )
+
+    def token_usage_by_agent(self, start: Optional[datetime] = None,
+                             end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Tokens totales y medios por agente"""
+        return self.aggregate(
+            ["agent_id"], [("tokens_used", "sum"), ("tokens_used", "mean")], start=start, end=end
+        )
+
+    def success_rate_by_event_type(self, start: Optional[datetime] = None,
+                                   end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Tasa de éxito por tipo de evento"""
+        return self.aggregate(
+            ["event_type"], [("success", "count"), ("success", "mean")], start=start, end=end
+        )
+
+
+def export_audit_log(log_file_path: str = "audit.log", output_dir: str = "audit_parquet") -> Dict[str, Any]:
+    """Exporta el log de auditoría (y sus segmentos) a Parquet"""
+    return AuditParquetExporter(log_file_path, output_dir).export()
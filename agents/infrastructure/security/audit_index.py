@@ -0,0 +1,339 @@
+# security/audit_index.py
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .audit_segments import AuditSegmentManager
+
+# (evaluation_id, company_id, event_type) de una línea del log
+IndexKeys = Tuple[Optional[str], Optional[str], Optional[str]]
+
+# Identificador de segmento del archivo activo
+ACTIVE_SEGMENT = ""
+
+
+class AuditIndex:
+    """
+    Índice sidecar (SQLite) del log de auditoría
+
+    Mapea evaluation_id, company_id y event_type a offsets de bytes del log, de modo
+    que un trail se obtiene con seeks en lugar de leer y parsear todo el archivo.
+    El escritor de auditoría lo mantiene al añadir cada lote; las líneas escritas por
+    otros medios se indexan al sincronizar. Si el índice se pierde o no corresponde
+    al log, se reconstruye a partir del log.
+
+    Con rotación, cada entrada guarda el segmento al que pertenece (ACTIVE_SEGMENT
+    para el archivo activo) y su offset dentro del segmento sin comprimir.
+    """
+
+    def __init__(self, log_file_path: str, index_path: Optional[str] = None,
+                 segments: Optional[AuditSegmentManager] = None):
+        self.log_file_path = log_file_path
+        self.index_path = index_path or f"{log_file_path}.idx"
+        self.segments = segments
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._conn = self._open()
+        self._index_missing_segments()
+
+    def _open(self) -> sqlite3.Connection:
+        """Abre el índice; si está corrupto lo descarta para reconstruirlo"""
+        try:
+            conn = self._connect()
+            conn.execute("SELECT COUNT(*) FROM meta").fetchone()
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            if "segment" not in columns:
+                # Índice anterior a la rotación: se descarta y se reconstruye
+                conn.executescript("DROP TABLE entries; DELETE FROM meta;")
+                conn.close()
+                return self._connect()
+            return conn
+        except sqlite3.DatabaseError as e:
+            self.logger.warning(f"Audit index {self.index_path} unreadable ({e}), rebuilding")
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.index_path + suffix)
+                except FileNotFoundError:
+                    pass
+            return self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # El índice es reconstruible: no hace falta fsync por transacción
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                segment TEXT NOT NULL DEFAULT '',
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                evaluation_id TEXT,
+                company_id TEXT,
+                event_type TEXT,
+                PRIMARY KEY (segment, offset)
+            );
+            CREATE INDEX IF NOT EXISTS ix_entries_evaluation_id ON entries(evaluation_id);
+            CREATE INDEX IF NOT EXISTS ix_entries_company_id ON entries(company_id);
+            CREATE INDEX IF NOT EXISTS ix_entries_event_type ON entries(event_type);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        return conn
+
+    # Estado
+
+    def _get_indexed_size(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'indexed_size'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _set_indexed_size(self, size: int) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed_size', ?)", (str(size),)
+        )
+
+    def _log_size(self) -> int:
+        try:
+            return os.path.getsize(self.log_file_path)
+        except FileNotFoundError:
+            return 0
+
+    # Mantenimiento
+
+    def record_batch(self, start_offset: int, lines: List[bytes], keys: List[Optional[IndexKeys]]) -> None:
+        """Indexa un lote recién añadido al log a partir de start_offset"""
+        with self._lock:
+            try:
+                indexed_size = self._get_indexed_size()
+                if start_offset < indexed_size:
+                    # El log fue truncado o reemplazado
+                    self._reset()
+                    indexed_size = 0
+                if start_offset > indexed_size:
+                    # Líneas escritas por otros medios entre el último lote y este
+                    self._scan(indexed_size, start_offset)
+
+                rows = []
+                offset = start_offset
+                for line, line_keys in zip(lines, keys):
+                    if line_keys is None:
+                        line_keys = self._keys_from_line(line)
+                    rows.append((ACTIVE_SEGMENT, offset, len(line)) + tuple(line_keys))
+                    offset += len(line)
+
+                self._insert_rows(rows)
+                self._set_indexed_size(offset)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                self.logger.error(f"Failed to update audit index {self.index_path}: {e}")
+
+    def sync(self) -> None:
+        """Indexa lo que se haya añadido al log desde la última actualización"""
+        with self._lock:
+            try:
+                log_size = self._log_size()
+                indexed_size = self._get_indexed_size()
+                if log_size < indexed_size:
+                    self._reset()
+                    indexed_size = 0
+                if log_size > indexed_size:
+                    self._scan(indexed_size, log_size)
+                    self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                self.logger.error(f"Failed to sync audit index {self.index_path}: {e}")
+
+    def rebuild(self) -> None:
+        """Reconstruye el índice completo a partir del log y sus segmentos"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._set_indexed_size(0)
+            self._conn.commit()
+            self._index_missing_segments()
+            self.sync()
+
+    def _reset(self) -> None:
+        """Descarta las entradas del archivo activo"""
+        self._conn.execute("DELETE FROM entries WHERE segment = ?", (ACTIVE_SEGMENT,))
+        self._set_indexed_size(0)
+
+    def seal_active(self, rotate: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        Sella el archivo activo como segmento
+
+        rotate() renombra el archivo activo y devuelve el id del nuevo segmento (o
+        None). Se ejecuta bajo el lock del índice para que ninguna lectura resuelva
+        offsets del archivo activo contra el archivo ya renombrado.
+        """
+        with self._lock:
+            self.sync()
+            segment_id = rotate()
+            if segment_id is None:
+                return None
+            try:
+                self._conn.execute(
+                    "UPDATE entries SET segment = ? WHERE segment = ?", (segment_id, ACTIVE_SEGMENT)
+                )
+                self._set_indexed_size(0)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                self.logger.error(f"Failed to seal audit index segment {segment_id}: {e}")
+            return segment_id
+
+    def drop_segments(self, segment_ids: List[str]) -> None:
+        """Elimina del índice los segmentos borrados por la retención"""
+        if not segment_ids:
+            return
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "DELETE FROM entries WHERE segment = ?", [(segment_id,) for segment_id in segment_ids]
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                self.logger.error(f"Failed to drop audit index segments: {e}")
+
+    def _index_missing_segments(self) -> None:
+        """Indexa los segmentos sellados que no estén en el índice (p. ej. tras reconstruir)"""
+        if self.segments is None:
+            return
+        with self._lock:
+            for segment in self.segments.get_segments():
+                segment_id = segment["segment"]
+                if self._conn.execute(
+                    "SELECT 1 FROM entries WHERE segment = ? LIMIT 1", (segment_id,)
+                ).fetchone():
+                    continue
+                try:
+                    with self.segments.open_segment(segment_id) as f:
+                        self._scan_stream(f, segment_id)
+                    self._conn.commit()
+                except (OSError, sqlite3.Error) as e:
+                    self._conn.rollback()
+                    self.logger.error(f"Failed to index audit segment {segment_id}: {e}")
+
+    def _scan_stream(self, f, segment_id: str) -> None:
+        rows = []
+        position = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            rows.append((segment_id, position, len(line)) + tuple(self._keys_from_line(line)))
+            position += len(line)
+            if len(rows) >= 10000:
+                self._insert_rows(rows)
+                rows = []
+        self._insert_rows(rows)
+
+    def _scan(self, start: int, end: int) -> None:
+        """Indexa las líneas completas del log en [start, end)"""
+        rows = []
+        position = start
+        try:
+            with open(self.log_file_path, "rb") as f:
+                f.seek(start)
+                while position < end:
+                    line = f.readline()
+                    if not line or not line.endswith(b"\n"):
+                        # Línea parcial: se indexará cuando esté completa
+                        break
+                    rows.append((ACTIVE_SEGMENT, position, len(line)) + tuple(self._keys_from_line(line)))
+                    position += len(line)
+                    if len(rows) >= 10000:
+                        self._insert_rows(rows)
+                        rows = []
+        except FileNotFoundError:
+            pass
+        self._insert_rows(rows)
+        self._set_indexed_size(position)
+
+    def _insert_rows(self, rows: List[tuple]) -> None:
+        if rows:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (segment, offset, length, evaluation_id, company_id, event_type) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    @staticmethod
+    def _keys_from_line(line: bytes) -> IndexKeys:
+        try:
+            data = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return (None, None, None)
+        if not isinstance(data, dict):
+            return (None, None, None)
+        return (data.get("evaluation_id"), data.get("company_id"), data.get("event_type") or data.get("event"))
+
+    # Consultas
+
+    def lookup(self, evaluation_id: Optional[str] = None, company_id: Optional[str] = None,
+               event_type: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """Devuelve los (segment, offset, length) que cumplen los filtros, en orden del log"""
+        conditions = []
+        params: List[Any] = []
+        for column, value in (("evaluation_id", evaluation_id), ("company_id", company_id),
+                              ("event_type", event_type)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if not conditions:
+            raise ValueError("At least one filter is required")
+
+        sql = f"SELECT segment, offset, length FROM entries WHERE {' AND '.join(conditions)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        # Orden cronológico: segmentos en el orden del manifest y el archivo activo al final
+        order = {ACTIVE_SEGMENT: float("inf")}
+        if self.segments is not None:
+            order.update((segment["segment"], i) for i, segment in enumerate(self.segments.get_segments()))
+        rows.sort(key=lambda row: (order.get(row[0], -1), row[1]))
+        return rows
+
+    def read_events(self, evaluation_id: Optional[str] = None, company_id: Optional[str] = None,
+                    event_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Lee del log y sus segmentos, con seeks, los eventos que cumplen los filtros"""
+        with self._lock:
+            self.sync()
+            events: List[Dict[str, Any]] = []
+            ranges = self.lookup(evaluation_id, company_id, event_type)
+            # Se abre cada segmento relevante una sola vez
+            start = 0
+            while start < len(ranges):
+                segment_id = ranges[start][0]
+                end = start
+                while end < len(ranges) and ranges[end][0] == segment_id:
+                    end += 1
+                events.extend(self._read_ranges(segment_id, [r[1:] for r in ranges[start:end]]))
+                start = end
+            return events
+
+    def _read_ranges(self, segment_id: str, ranges: List[Tuple[int, int]]) -> Iterable[Dict[str, Any]]:
+        try:
+            if segment_id == ACTIVE_SEGMENT:
+                f = open(self.log_file_path, "rb")
+            elif self.segments is not None:
+                # En segmentos comprimidos los seeks (hacia delante) descomprimen en streaming
+                f = self.segments.open_segment(segment_id)
+            else:
+                return
+        except FileNotFoundError:
+            return
+        with f:
+            for offset, length in ranges:
+                f.seek(offset)
+                try:
+                    yield json.loads(f.read(length))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,300 @@
+# security/audit_integrity.py
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from .audit_segments import load_manifest, open_segment
+from .audit_tail import read_last_lines
+
+GENESIS_HASH = "0" * 64
+
+# Prefijos de dominio para hojas y nodos internos (evita colisiones hoja/nodo)
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+
+def merkle_root(lines: List[bytes]) -> str:
+    """Raíz Merkle (SHA-256) de las líneas de un lote; un nodo sin pareja sube tal cual"""
+    if not lines:
+        return hashlib.sha256(b"").hexdigest()
+    level = [hashlib.sha256(_LEAF_PREFIX + line).digest() for line in lines]
+    while len(level) > 1:
+        next_level = [
+            hashlib.sha256(_NODE_PREFIX + level[i] + level[i + 1]).digest()
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0].hex()
+
+
+def chain_hash(previous: str, root: str, offset: int, length: int, count: int) -> str:
+    """Encadena la raíz de un lote con el hash del lote anterior y su posición en el log"""
+    payload = f"{previous}:{root}:{offset}:{length}:{count}".encode("ascii")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def split_lines(data: bytes) -> List[bytes]:
+    """Divide un lote en líneas conservando el salto de línea (como se escribieron)"""
+    parts = data.split(b"\n")
+    lines = [part + b"\n" for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+class AuditChain:
+    """
+    Cadena de integridad del log de auditoría (sidecar audit.log.chain)
+
+    Por cada lote escrito se calcula la raíz Merkle de sus líneas y se encadena con
+    el hash del lote anterior, de modo que modificar, insertar o borrar una línea (o
+    un lote completo) rompe la verificación. El coste por evento es un SHA-256 de la
+    línea, sin re-serializar el JSON.
+
+    El archivo es JSONL de solo anexado con tres tipos de registro:
+    - batch: lote escrito en el archivo activo (offset, length, count, root, prev, hash)
+    - seal: el archivo activo se selló como el segmento indicado
+    - drop: la retención eliminó el segmento indicado
+    """
+
+    def __init__(self, log_file_path: str, chain_path: Optional[str] = None):
+        self.log_file_path = log_file_path
+        self.chain_path = chain_path or f"{log_file_path}.chain"
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._last_hash, self._seq = self._load_tail()
+
+    def _load_tail(self) -> Tuple[str, int]:
+        """
+        Recupera el último hash y número de secuencia de la cadena existente
+
+        Tras el último lote puede haber cualquier número de registros seal/drop: la
+        ventana leída desde el final crece hasta encontrar un lote o cubrir el archivo.
+        """
+        try:
+            limit = 64
+            while True:
+                lines = read_last_lines(self.chain_path, limit)
+                for line in reversed(lines):
+                    record = json.loads(line)
+                    if record.get("type") == "batch":
+                        return record["hash"], record["seq"]
+                if len(lines) < limit:
+                    break
+                limit *= 4
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, KeyError) as e:
+            self.logger.error(f"Audit chain {self.chain_path} tail unreadable: {e}")
+        return GENESIS_HASH, 0
+
+    def append_batch(self, offset: int, lines: List[bytes]) -> None:
+        """Registra un lote recién escrito en el archivo activo a partir de offset"""
+        length = sum(len(line) for line in lines)
+        root = merkle_root(lines)
+        with self._lock:
+            seq = self._seq + 1
+            digest = chain_hash(self._last_hash, root, offset, length, len(lines))
+            self._append({
+                "type": "batch", "seq": seq, "offset": offset, "length": length,
+                "count": len(lines), "root": root, "prev": self._last_hash, "hash": digest
+            })
+            self._seq = seq
+            self._last_hash = digest
+
+    def record_seal(self, segment_id: str) -> None:
+        """Marca que los lotes anteriores pertenecen al segmento sellado"""
+        with self._lock:
+            self._append({"type": "seal", "segment": segment_id, "after_seq": self._seq})
+
+    def record_drop(self, segment_ids: List[str]) -> None:
+        """Marca segmentos eliminados por la retención (su contenido ya no es verificable)"""
+        if not segment_ids:
+            return
+        with self._lock:
+            for segment_id in segment_ids:
+                self._append({"type": "drop", "segment": segment_id})
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with open(self.chain_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class IntegrityReport(BaseModel):
+    """
+    Resultado de la verificación de integridad de un log de auditoría
+    """
+    valid: bool = Field(description="True si la cadena y todas las raíces verificables son correctas")
+    batches_checked: int = Field(description="Lotes cuyo contenido se verificó", default=0)
+    events_checked: int = Field(description="Eventos cubiertos por los lotes verificados", default=0)
+    chain_breaks: List[str] = Field(description="Registros cuya cadena de hashes no es consistente", default_factory=list)
+    root_mismatches: List[str] = Field(description="Lotes cuyo contenido no coincide con su raíz Merkle", default_factory=list)
+    unchained_ranges: List[str] = Field(description="Rangos de bytes no cubiertos por ningún lote", default_factory=list)
+    dropped_segments: List[str] = Field(description="Segmentos eliminados por retención (no verificables)", default_factory=list)
+    missing_segments: List[str] = Field(description="Segmentos esperados que no se encontraron", default_factory=list)
+
+
+def _verify_batches(log_file_path: str, segment: Optional[Dict[str, Any]],
+                    batches: List[Dict[str, Any]]) -> Tuple[List[str], int, Optional[int]]:
+    """
+    Verifica las raíces Merkle de un grupo de lotes de un mismo archivo (en un worker)
+
+    Devuelve (desajustes, eventos verificados, tamaño del archivo sin comprimir o None).
+    """
+    mismatches = []
+    events = 0
+    if segment is None:
+        f = open(log_file_path, "rb")
+        size = os.fstat(f.fileno()).st_size
+        label = "active"
+    else:
+        f = open_segment(log_file_path, segment)
+        size = segment.get("size")
+        label = segment["segment"]
+
+    with f:
+        for batch in batches:
+            f.seek(batch["offset"])
+            data = f.read(batch["length"])
+            lines = split_lines(data)
+            if len(data) != batch["length"] or len(lines) != batch["count"] or merkle_root(lines) != batch["root"]:
+                mismatches.append(f"{label} seq={batch['seq']} offset={batch['offset']}")
+            else:
+                events += batch["count"]
+    return mismatches, events, size
+
+
+def _load_chain(chain_path: str) -> List[Dict[str, Any]]:
+    records = []
+    with open(chain_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def verify_audit_log(log_file_path: str = "audit.log", workers: Optional[int] = None,
+                     chunk_batches: int = 2000) -> IntegrityReport:
+    """
+    Verifica la integridad de un log de auditoría y sus segmentos
+
+    La cadena de hashes se comprueba secuencialmente (solo lee el sidecar); las
+    raíces Merkle, que requieren leer el log, se verifican en paralelo en un pool
+    de procesos: un trabajo por segmento comprimido y trozos de `chunk_batches`
+    lotes para el archivo activo.
+    """
+    report = IntegrityReport(valid=True)
+    records = _load_chain(f"{log_file_path}.chain")
+    manifest_segments = {s["segment"]: s for s in load_manifest(log_file_path)["segments"]}
+
+    # 1. Cadena de hashes y agrupación de lotes por archivo
+    groups: List[Tuple[Optional[str], List[Dict[str, Any]]]] = []
+    current: List[Dict[str, Any]] = []
+    dropped = set()
+    previous = GENESIS_HASH
+    expected_seq = None
+    for record in records:
+        record_type = record.get("type")
+        if record_type == "batch":
+            if expected_seq is not None and record["seq"] != expected_seq:
+                report.chain_breaks.append(f"seq {record['seq']}: expected seq {expected_seq}")
+            if record["prev"] != previous:
+                report.chain_breaks.append(f"seq {record['seq']}: prev hash does not match")
+            if chain_hash(record["prev"], record["root"], record["offset"], record["length"],
+                          record["count"]) != record["hash"]:
+                report.chain_breaks.append(f"seq {record['seq']}: hash does not match contents")
+            previous = record["hash"]
+            expected_seq = record["seq"] + 1
+            current.append(record)
+        elif record_type == "seal":
+            groups.append((record["segment"], current))
+            current = []
+        elif record_type == "drop":
+            dropped.add(record["segment"])
+    groups.append((None, current))
+
+    # 2. Trabajos de verificación de raíces
+    tasks = []
+    for segment_id, batches in groups:
+        if not batches:
+            continue
+        if segment_id is not None:
+            if segment_id in dropped:
+                report.dropped_segments.append(segment_id)
+                continue
+            segment = manifest_segments.get(segment_id)
+            if segment is None:
+                report.missing_segments.append(segment_id)
+                continue
+            tasks.append((segment, batches))
+        else:
+            if not os.path.exists(log_file_path):
+                report.missing_segments.append("active")
+                continue
+            for i in range(0, len(batches), chunk_batches):
+                tasks.append((None, batches[i:i + chunk_batches]))
+        report.unchained_ranges.extend(_coverage_gaps(segment_id or "active", batches))
+
+    if workers == 1 or len(tasks) <= 1:
+        results = [_verify_batches(log_file_path, segment, batches) for segment, batches in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_verify_batches, log_file_path, segment, batches)
+                       for segment, batches in tasks]
+            results = [future.result() for future in futures]
+
+    # 3. Resultados y bytes finales no cubiertos por la cadena
+    for (segment, batches), (mismatches, events, size) in zip(tasks, results):
+        report.root_mismatches.extend(mismatches)
+        report.batches_checked += len(batches)
+        report.events_checked += events
+        label = segment["segment"] if segment else "active"
+        last = batches[-1]
+        is_last_chunk = segment is not None or last is groups[-1][1][-1]
+        end = last["offset"] + last["length"]
+        if is_last_chunk and size is not None and size > end:
+            report.unchained_ranges.append(f"{label} [{end}, {size})")
+
+    report.valid = not (report.chain_breaks or report.root_mismatches
+                        or report.unchained_ranges or report.missing_segments)
+    return report
+
+
+def _coverage_gaps(label: str, batches: List[Dict[str, Any]]) -> List[str]:
+    """Rangos de bytes entre lotes consecutivos (o antes del primero) sin cubrir"""
+    gaps = []
+    position = 0
+    for batch in batches:
+        if batch["offset"] > position:
+            gaps.append(f"{label} [{position}, {batch['offset']})")
+        elif batch["offset"] < position:
+            gaps.append(f"{label} overlap at {batch['offset']}")
+        position = batch["offset"] + batch["length"]
+    return gaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica la integridad de un log de auditoría")
+    parser.add_argument("log_file_path", nargs="?", default="audit.log")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de verificación")
+    args = parser.parse_args()
+
+    report = verify_audit_log(args.log_file_path, args.workers)
+    print(report.model_dump_json(indent=2))
+    raise SystemExit(0 if report.valid else 1)
+
+
+if __name__ == "__main__":
+    main()
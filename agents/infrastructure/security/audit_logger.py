@@ -1,11 +1,16 @@
 # security/audit_logger.py
 
+import asyncio
 import json
 import os
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List
 from pydantic import BaseModel, Field
 
+from .audit_segments import open_segment
+from .audit_tail import read_recent_events
+from .audit_writer import AuditWriter, get_audit_writer
+
 class AuditEvent(BaseModel):
     """
     Define la estructura de un evento de auditoría
@@ -22,30 +27,75 @@ class AuditEvent(BaseModel):
     tokens_used: Optional[int] = Field(description="Tokens utilizados en la operación", default=None)
     risk_level: Optional[str] = Field(description="Nivel de riesgo detectado", default=None)
 
+def write_to_backup(log_file_path: str, lines: List[str], error: Exception) -> None:
+    """Escribe en la ubicación de respaldo los eventos de un lote fallido"""
+    # If we can't write to the audit log, we have a serious problem
+    # Try to write to a backup location
+    try:
+        backup_path = f"{log_file_path}.backup"
+        with open(backup_path, 'a', encoding='utf-8') as f:
+            for line in lines:
+                try:
+                    failed_event = json.loads(line)
+                except json.JSONDecodeError:
+                    failed_event = {"raw": line.strip()}
+                error_event = AuditEvent(
+                    timestamp=datetime.now().isoformat(),
+                    evaluation_id="audit_error",
+                    event_type="AUDIT_ERROR",
+                    agent_id="audit_logger",
+                    company_id="system",
+                    details={
+                        "original_error": str(error),
+                        "failed_event": failed_event,
+                        "backup_location": backup_path
+                    },
+                    success=False
+                )
+                f.write(error_event.model_dump_json() + "\n")
+    except:
+        # If even the backup fails, there's nothing more we can do
+        pass
+
 class AuditLogger:
     """
     Agente de auditoría que registra todos los eventos del sistema
     """
     
-    def __init__(self, log_file_path: str = "audit.log"):
+    def __init__(self, log_file_path: str = "audit.log", batch_size: int = 64,
+                 flush_interval_ms: int = 200, max_queue_size: int = 10000,
+                 max_segment_bytes: Optional[int] = 64 * 1024 * 1024, rotate_daily: bool = True,
+                 retention_days: Optional[int] = 90, max_segments: Optional[int] = None,
+                 compress_segments: bool = True):
         self.log_file_path = log_file_path
+        
+        # Sink asíncrono compartido: los eventos salen del camino crítico de la evaluación.
+        # El log rota en segmentos comprimidos según tamaño/día con retención.
+        self.writer: AuditWriter = get_audit_writer(
+            log_file_path, batch_size, flush_interval_ms, max_queue_size,
+            max_segment_bytes=max_segment_bytes, rotate_daily=rotate_daily,
+            retention_days=retention_days, max_segments=max_segments, compress=compress_segments
+        )
+        self.writer.add_error_handler(write_to_backup)
+        # Consumidores en memoria de cada evento (p. ej. el detector de anomalías)
+        self.listeners: List[Callable[[AuditEvent], None]] = []
         self._ensure_log_file_exists()
     
     def _ensure_log_file_exists(self):
         """Asegura que el archivo de log existe"""
         if not os.path.exists(self.log_file_path):
-            with open(self.log_file_path, 'w', encoding='utf-8') as f:
-                # Write initial log entry
-                initial_entry = AuditEvent(
-                    timestamp=datetime.now().isoformat(),
-                    evaluation_id="system_init",
-                    event_type="SYSTEM_INIT",
-                    agent_id="audit_logger",
-                    company_id="system",
-                    details={"message": "Audit log initialized"},
-                    success=True
-                )
-                f.write(initial_entry.model_dump_json() + "\n")
+            # Write initial log entry (a través del escritor, para que quede encadenado)
+            initial_entry = AuditEvent(
+                timestamp=datetime.now().isoformat(),
+                evaluation_id="system_init",
+                event_type="SYSTEM_INIT",
+                agent_id="audit_logger",
+                company_id="system",
+                details={"message": "Audit log initialized"},
+                success=True
+            )
+            self._write_event(initial_entry)
+            self.flush()
     
     def log_security_supervision(self, evaluation_id: str, company_id: str, 
                                supervision_result: Dict[str, Any], processing_time: float) -> None:
@@ -200,6 +250,26 @@ class AuditLogger:
         )
         self._write_event(event)
     
+    def log_evaluation_cancelled(self, evaluation_id: str, company_id: str, reason: str,
+                               cancelled_phase: str, processing_time: float) -> None:
+        """Registra la cancelación de una evaluación en curso"""
+        event = AuditEvent(
+            timestamp=datetime.now().isoformat(),
+            evaluation_id=evaluation_id,
+            event_type="EVALUATION_CANCELLED",
+            agent_id="master_orchestrator",
+            company_id=company_id,
+            details={
+                "reason": reason,
+                "cancelled_phase": cancelled_phase,
+                "processing_time": processing_time
+            },
+            success=False,
+            processing_time=processing_time,
+            risk_level="CANCELLED"
+        )
+        self._write_event(event)
+
     def log_security_alert(self, evaluation_id: str, company_id: str, alert_type: str,
                           alert_details: Dict[str, Any]) -> None:
         """Registra una alerta de seguridad crítica"""
@@ -219,78 +289,123 @@ class AuditLogger:
         )
         self._write_event(event)
     
+    def add_listener(self, listener: Callable[[AuditEvent], None]) -> None:
+        """Registra un consumidor que recibe cada evento al registrarse (una vez por consumidor)"""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+    
     def _write_event(self, event: AuditEvent) -> None:
-        """Escribe un evento al archivo de log"""
-        try:
-            with open(self.log_file_path, 'a', encoding='utf-8') as f:
-                f.write(event.model_dump_json() + "\n")
-        except Exception as e:
-            # If we can't write to the audit log, we have a serious problem
-            # Try to write to a backup location
+        """Encola un evento en el escritor de auditoría y lo notifica a los listeners"""
+        for listener in self.listeners:
             try:
-                backup_path = f"{self.log_file_path}.backup"
-                with open(backup_path, 'a', encoding='utf-8') as f:
-                    error_event = AuditEvent(
-                        timestamp=datetime.now().isoformat(),
-                        evaluation_id="audit_error",
-                        event_type="AUDIT_ERROR",
-                        agent_id="audit_logger",
-                        company_id="system",
-                        details={
-                            "original_error": str(e),
-                            "failed_event": event.dict(),
-                            "backup_location": backup_path
-                        },
-                        success=False
-                    )
-                    f.write(error_event.model_dump_json() + "\n")
-            except:
-                # If even the backup fails, there's nothing more we can do
+                listener(event)
+            except Exception:
+                # Un consumidor defectuoso nunca debe impedir la auditoría
                 pass
+        self.writer.submit(
+            event.model_dump_json() + "\n",
+            (event.evaluation_id, event.company_id, event.event_type)
+        )
+    
+    def flush(self) -> None:
+        """Espera a que los eventos encolados estén escritos en disco"""
+        self.writer.flush()
+    
+    async def aflush(self) -> None:
+        """Versión awaitable de flush() para usar desde el event loop"""
+        await self.writer.aflush()
+    
+    def close(self) -> None:
+        """Vacía los eventos pendientes y detiene el escritor"""
+        self.writer.close()
     
-    def get_recent_events(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Obtiene los eventos más recientes del log"""
+    def get_recent_events(self, limit: int = 100, flush: bool = True) -> List[Dict[str, Any]]:
+        """
+        Obtiene los eventos más recientes del log
+
+        flush=False lee lo ya escrito sin esperar al escritor (los eventos de los
+        últimos milisegundos pueden no aparecer). Desde el event loop, usar
+        aget_recent_events.
+        """
+        if flush:
+            self.flush()
         try:
-            with open(self.log_file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                recent_lines = lines[-limit:] if len(lines) > limit else lines
-                
-                events = []
-                for line in recent_lines:
-                    try:
-                        event_data = json.loads(line.strip())
-                        events.append(event_data)
-                    except json.JSONDecodeError:
-                        continue
-                
-                return events
+            # Lectura inversa por bloques desde el final; continúa en los segmentos
+            # rotados más recientes si el archivo activo no tiene suficientes eventos
+            return read_recent_events(self.log_file_path, limit)
         except FileNotFoundError:
             return []
         except Exception:
             return []
     
-    def get_evaluation_audit_trail(self, evaluation_id: str) -> List[Dict[str, Any]]:
+    def get_evaluation_audit_trail(self, evaluation_id: str, flush: bool = True) -> List[Dict[str, Any]]:
         """Obtiene el trail completo de auditoría para una evaluación específica"""
+        if flush:
+            self.flush()
         try:
-            with open(self.log_file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                
-                evaluation_events = []
-                for line in lines:
-                    try:
-                        event_data = json.loads(line.strip())
-                        if event_data.get("evaluation_id") == evaluation_id:
-                            evaluation_events.append(event_data)
-                    except json.JSONDecodeError:
-                        continue
-                
-                return evaluation_events
-        except FileNotFoundError:
+            # Lookup por índice de offsets: seeks en lugar de leer todo el archivo
+            return self.writer.index.read_events(evaluation_id=evaluation_id)
+        except Exception:
             return []
+    
+    def get_company_audit_events(self, company_id: str, event_type: Optional[str] = None,
+                                 flush: bool = True) -> List[Dict[str, Any]]:
+        """Obtiene los eventos de auditoría de una empresa, opcionalmente por tipo"""
+        if flush:
+            self.flush()
+        try:
+            return self.writer.index.read_events(company_id=company_id, event_type=event_type)
         except Exception:
             return []
 
+    # Variantes awaitables: esperan al escritor con aflush() y leen fuera del event loop
+
+    async def aget_recent_events(self, limit: int = 100) -> List[Dict[str, Any]]:
+        await self.aflush()
+        return await asyncio.to_thread(self.get_recent_events, limit, False)
+
+    async def aget_evaluation_audit_trail(self, evaluation_id: str) -> List[Dict[str, Any]]:
+        await self.aflush()
+        return await asyncio.to_thread(self.get_evaluation_audit_trail, evaluation_id, False)
+
+    async def aget_company_audit_events(self, company_id: str,
+                                        event_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        await self.aflush()
+        return await asyncio.to_thread(self.get_company_audit_events, company_id, event_type, False)
+
+    def get_events_between(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Obtiene los eventos en [start, end], abriendo solo los segmentos que se solapan"""
+        self.flush()
+        sources = [
+            open_segment(self.log_file_path, segment)
+            for segment in self.writer.segments.select_segments(start, end)
+        ]
+        if os.path.exists(self.log_file_path):
+            sources.append(open(self.log_file_path, 'rb'))
+
+        events = []
+        for source in sources:
+            with source as f:
+                for line in f:
+                    try:
+                        event_data = json.loads(line)
+                        timestamp = datetime.fromisoformat(event_data["timestamp"])
+                    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, ValueError):
+                        continue
+                    if start <= timestamp <= end:
+                        events.append(event_data)
+        return events
+
+    def export_parquet(self, output_dir: str = "audit_parquet") -> Dict[str, Any]:
+        """Exporta el log (y sus segmentos) a Parquet para analítica; requiere pyarrow"""
+        from .audit_analytics import AuditParquetExporter
+
+        self.flush()
+        return AuditParquetExporter(self.log_file_path, output_dir).export()
+
 # Factory function
-def create_audit_logger(log_file_path: str = "audit.log") -> AuditLogger:
+def create_audit_logger(log_file_path: str = "audit.log", batch_size: int = 64,
+                        flush_interval_ms: int = 200, max_queue_size: int = 10000,
+                        **rotation_options: Any) -> AuditLogger:
     """Crea una instancia del logger de auditoría"""
-    return AuditLogger(log_file_path)
\ No newline at end of file
+    return AuditLogger(log_file_path, batch_size, flush_interval_ms, max_queue_size, **rotation_options)
\ No newline at end of file
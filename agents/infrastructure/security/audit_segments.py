@@ -0,0 +1,265 @@
+# security/audit_segments.py
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import IO, Any, Dict, List, Optional
+
+
+def manifest_path_for(log_file_path: str) -> str:
+    return f"{log_file_path}.manifest.json"
+
+
+def load_manifest(log_file_path: str) -> Dict[str, Any]:
+    """Lee el manifest de segmentos del log (vacío si no existe o es ilegible)"""
+    try:
+        with open(manifest_path_for(log_file_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+    manifest.setdefault("active_started", None)
+    manifest.setdefault("next_sequence", len(manifest.get("segments", [])) + 1)
+    manifest.setdefault("segments", [])
+    return manifest
+
+
+def open_segment(log_file_path: str, segment: Dict[str, Any]) -> IO[bytes]:
+    """
+    Abre un segmento sellado en modo binario, comprimido o no
+
+    Si el segmento se comprimió entre la lectura del manifest y la apertura,
+    se relee el manifest y se abre el archivo vigente.
+    """
+    directory = os.path.dirname(os.path.abspath(log_file_path))
+    try:
+        return _open_segment_file(os.path.join(directory, segment["file"]))
+    except FileNotFoundError:
+        for current in load_manifest(log_file_path)["segments"]:
+            if current["segment"] == segment["segment"] and current["file"] != segment["file"]:
+                return _open_segment_file(os.path.join(directory, current["file"]))
+        raise
+
+
+def _open_segment_file(path: str) -> IO[bytes]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _event_timestamp(line: bytes) -> Optional[str]:
+    try:
+        data = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return data.get("timestamp") if isinstance(data, dict) else None
+
+
+class AuditSegmentManager:
+    """
+    Rotación del log de auditoría en segmentos
+
+    El archivo activo (audit.log) se sella cuando supera `max_segment_bytes` o cuando
+    cambia el día. El segmento sellado se renombra a audit.log.<inicio>.<secuencia>, se comprime
+    con gzip y se registra en audit.log.manifest.json con su rango temporal, de modo
+    que los lectores solo abren los segmentos relevantes. La retención elimina los
+    segmentos más antiguos que `retention_days` o que excedan `max_segments`.
+
+    Los identificadores de segmento son estables (no cambian al comprimir) y son los
+    que usa el índice de offsets.
+    """
+
+    def __init__(self, log_file_path: str, max_segment_bytes: Optional[int] = 64 * 1024 * 1024,
+                 rotate_daily: bool = True, retention_days: Optional[int] = 90,
+                 max_segments: Optional[int] = None, compress: bool = True):
+        self.log_file_path = log_file_path
+        self.directory = os.path.dirname(os.path.abspath(log_file_path))
+        self.max_segment_bytes = max_segment_bytes
+        self.rotate_daily = rotate_daily
+        self.retention_days = retention_days
+        self.max_segments = max_segments
+        self.compress = compress
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        self._manifest = load_manifest(log_file_path)
+        if self._manifest["active_started"] is None:
+            self._manifest["active_started"] = self._detect_active_started()
+            self._save_manifest()
+
+    # Manifest
+
+    def _save_manifest(self) -> None:
+        path = manifest_path_for(self.log_file_path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _detect_active_started(self) -> str:
+        """Inicio del archivo activo: timestamp de su primer evento, o ahora"""
+        try:
+            with open(self.log_file_path, "rb") as f:
+                timestamp = _event_timestamp(f.readline())
+            if timestamp:
+                return timestamp
+        except FileNotFoundError:
+            pass
+        return datetime.now().isoformat()
+
+    def get_segments(self) -> List[Dict[str, Any]]:
+        """Segmentos sellados, del más antiguo al más reciente"""
+        with self._lock:
+            return [dict(segment) for segment in self._manifest["segments"]]
+
+    def select_segments(self, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Segmentos sellados cuyo rango temporal se solapa con [start, end]"""
+        selected = []
+        for segment in self.get_segments():
+            if start and segment["end"] and datetime.fromisoformat(segment["end"]) < start:
+                continue
+            if end and segment["start"] and datetime.fromisoformat(segment["start"]) > end:
+                continue
+            selected.append(segment)
+        return selected
+
+    def open_segment(self, segment_id: str) -> IO[bytes]:
+        """Abre un segmento sellado por su identificador"""
+        for segment in self.get_segments():
+            if segment["segment"] == segment_id:
+                return open_segment(self.log_file_path, segment)
+        raise FileNotFoundError(f"Unknown audit segment {segment_id}")
+
+    # Rotación
+
+    def should_rotate(self, incoming_bytes: int = 0, now: Optional[datetime] = None) -> bool:
+        """Indica si el archivo activo debe sellarse antes de escribir incoming_bytes"""
+        try:
+            size = os.path.getsize(self.log_file_path)
+        except FileNotFoundError:
+            return False
+        if size == 0:
+            return False
+        if self.max_segment_bytes and size + incoming_bytes > self.max_segment_bytes:
+            return True
+        if self.rotate_daily:
+            now = now or datetime.now()
+            started = datetime.fromisoformat(self._manifest["active_started"])
+            return started.date() != now.date()
+        return False
+
+    def rotate(self, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Sella el archivo activo: lo renombra y lo registra en el manifest
+
+        Devuelve la entrada del segmento, o None si no había nada que sellar.
+        La compresión se hace aparte con compress_segment().
+        """
+        now = now or datetime.now()
+        with self._lock:
+            try:
+                size = os.path.getsize(self.log_file_path)
+            except FileNotFoundError:
+                return None
+            if size == 0:
+                return None
+
+            # El número de secuencia hace el id único aunque la retención borre segmentos
+            started = datetime.fromisoformat(self._manifest["active_started"])
+            sequence = self._manifest["next_sequence"]
+            segment_id = (f"{os.path.basename(self.log_file_path)}."
+                          f"{started.strftime('%Y%m%dT%H%M%S')}.{sequence:06d}")
+
+            sealed_path = os.path.join(self.directory, segment_id)
+            os.replace(self.log_file_path, sealed_path)
+
+            first_ts, last_ts, events = self._summarize(sealed_path)
+            segment = {
+                "segment": segment_id,
+                "file": segment_id,
+                "start": first_ts or self._manifest["active_started"],
+                "end": last_ts or now.isoformat(),
+                "size": size,
+                "events": events,
+                "compressed": False
+            }
+            self._manifest["segments"].append(segment)
+            self._manifest["next_sequence"] = sequence + 1
+            self._manifest["active_started"] = now.isoformat()
+            self._save_manifest()
+            return dict(segment)
+
+    def compress_segment(self, segment_id: str) -> None:
+        """Comprime con gzip un segmento sellado y actualiza el manifest"""
+        if not self.compress:
+            return
+        segment = next((s for s in self.get_segments() if s["segment"] == segment_id), None)
+        if segment is None or segment["compressed"]:
+            return
+
+        raw_path = os.path.join(self.directory, segment["file"])
+        gz_name = f"{segment['file']}.gz"
+        gz_path = os.path.join(self.directory, gz_name)
+        tmp_path = f"{gz_path}.tmp"
+        try:
+            with open(raw_path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp_path, gz_path)
+        except OSError as e:
+            self.logger.error(f"Failed to compress audit segment {segment_id}: {e}")
+            return
+
+        with self._lock:
+            for current in self._manifest["segments"]:
+                if current["segment"] == segment_id:
+                    current["file"] = gz_name
+                    current["compressed"] = True
+            self._save_manifest()
+        os.remove(raw_path)
+
+    def apply_retention(self, now: Optional[datetime] = None) -> List[str]:
+        """Elimina los segmentos fuera de la política de retención; devuelve sus ids"""
+        now = now or datetime.now()
+        with self._lock:
+            segments = self._manifest["segments"]
+            expired = []
+            if self.retention_days is not None:
+                cutoff = now - timedelta(days=self.retention_days)
+                expired = [s for s in segments if datetime.fromisoformat(s["end"]) < cutoff]
+            if self.max_segments is not None:
+                remaining = [s for s in segments if s not in expired]
+                excess = len(remaining) - self.max_segments
+                if excess > 0:
+                    expired.extend(remaining[:excess])
+            if not expired:
+                return []
+
+            expired_ids = {s["segment"] for s in expired}
+            self._manifest["segments"] = [s for s in segments if s["segment"] not in expired_ids]
+            self._save_manifest()
+
+        for segment in expired:
+            try:
+                os.remove(os.path.join(self.directory, segment["file"]))
+            except FileNotFoundError:
+                pass
+        return [s["segment"] for s in expired]
+
+    @staticmethod
+    def _summarize(path: str):
+        """Primer y último timestamp y número de eventos de un segmento"""
+        first_ts = None
+        last_line = b""
+        events = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if first_ts is None:
+                    first_ts = _event_timestamp(line)
+                if line.strip():
+                    last_line = line
+                    events += 1
+        return first_ts, _event_timestamp(last_line) if last_line else None, events
@@ -0,0 +1,92 @@
+# security/audit_tail.py
+
+import json
+import os
+from collections import deque
+from typing import Any, Dict, List
+
+from .audit_segments import load_manifest, open_segment
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def read_last_lines(file_path: str, limit: int, block_size: int = DEFAULT_BLOCK_SIZE) -> List[bytes]:
+    """
+    Devuelve las últimas `limit` líneas completas de un archivo, en orden
+
+    Lee bloques desde el final del archivo hacia atrás hasta reunir suficientes
+    saltos de línea, por lo que el coste depende de `limit` y no del tamaño del
+    archivo. Una última línea sin salto de línea (escritura en curso) se descarta.
+    Lanza FileNotFoundError si el archivo no existe.
+    """
+    if limit <= 0:
+        return []
+
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        if position == 0:
+            return []
+
+        chunks: List[bytes] = []
+        newline_count = 0
+        # Se necesitan limit + 1 saltos para garantizar `limit` líneas completas
+        while position > 0 and newline_count <= limit:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size)
+            chunks.append(chunk)
+            newline_count += chunk.count(b"\n")
+
+    data = b"".join(reversed(chunks))
+    lines = data.split(b"\n")
+    # split deja un elemento final: vacío si el archivo termina en salto,
+    # o la línea parcial en curso si no; en ambos casos se descarta
+    lines.pop()
+    if position > 0:
+        # La primera línea puede estar cortada por el inicio del bloque
+        lines = lines[1:]
+
+    return [line + b"\n" for line in lines[-limit:]]
+
+
+def read_recent_lines(log_file_path: str, limit: int, block_size: int = DEFAULT_BLOCK_SIZE) -> List[bytes]:
+    """
+    Últimas `limit` líneas del log de auditoría, incluyendo segmentos rotados
+
+    Lee primero el archivo activo; si no alcanza, continúa por los segmentos
+    sellados del manifest, del más reciente al más antiguo. Lanza FileNotFoundError
+    si no existen ni el archivo activo ni segmentos.
+    """
+    segments = load_manifest(log_file_path)["segments"]
+    try:
+        lines = read_last_lines(log_file_path, limit, block_size)
+    except FileNotFoundError:
+        if not segments:
+            raise
+        lines = []
+
+    for segment in reversed(segments):
+        missing = limit - len(lines)
+        if missing <= 0:
+            break
+        try:
+            # Los segmentos comprimidos no admiten seeks hacia atrás: se recorren en streaming
+            with open_segment(log_file_path, segment) as f:
+                tail = deque((line for line in f if line.endswith(b"\n")), maxlen=missing)
+        except FileNotFoundError:
+            continue
+        lines = list(tail) + lines
+    return lines
+
+
+def read_recent_events(file_path: str, limit: int, block_size: int = DEFAULT_BLOCK_SIZE) -> List[Dict[str, Any]]:
+    """Devuelve los últimos `limit` eventos JSON del log (las líneas inválidas se omiten)"""
+    events = []
+    for line in read_recent_lines(file_path, limit, block_size):
+        try:
+            events.append(json.loads(line))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+    return events
@@ -0,0 +1,261 @@
+# security/audit_writer.py
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .audit_index import AuditIndex, IndexKeys
+from .audit_integrity import AuditChain
+from .audit_segments import AuditSegmentManager
+
+# Sentinel que detiene el hilo escritor
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Sink de auditoría con escritura en segundo plano
+
+    Los eventos se encolan en una cola acotada y un hilo escritor los agrupa en una
+    sola escritura + fsync cada `batch_size` eventos o cada `flush_interval_ms`
+    milisegundos, lo que ocurra primero. Cada lote se escribe con una única llamada
+    a write(), por lo que las líneas de evaluaciones concurrentes nunca se intercalan.
+
+    Encolar nunca bloquea. Si la cola está llena el evento se entrega a los
+    error_handlers (AuditLogger lo anexa a <log>.backup, sin fsync) y se contabiliza
+    en overflow_events: la memoria queda acotada y el trail sigue completo entre el
+    log y su backup. Solo sin handlers registrados se descarta (dropped_events).
+
+    Tras cada lote se actualiza el índice de offsets (AuditIndex) del archivo y se
+    encadena la raíz Merkle del lote en el sidecar de integridad (AuditChain).
+
+    Antes de escribir un lote se comprueba la política de rotación: si el archivo
+    activo debe sellarse (tamaño o cambio de día), se sella, se comprime y se aplica
+    la retención (AuditSegmentManager).
+    """
+
+    def __init__(self, log_file_path: str, batch_size: int = 64,
+                 flush_interval_ms: int = 200, max_queue_size: int = 10000,
+                 segments: Optional[AuditSegmentManager] = None):
+        self.log_file_path = log_file_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.001, flush_interval_ms / 1000.0)
+        self.logger = logging.getLogger(__name__)
+
+        # Callbacks (log_file_path, lines, exception) para escrituras fallidas
+        self.error_handlers: List[Callable[[str, List[str], Exception], None]] = []
+
+        self.segments = segments or AuditSegmentManager(log_file_path)
+        self.index = AuditIndex(log_file_path, segments=self.segments)
+        self.chain = AuditChain(log_file_path)
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._file_lock = threading.Lock()
+        self._closed = False
+
+        self.stats = {
+            "events_written": 0,
+            "batches_written": 0,
+            "overflow_events": 0,
+            "dropped_events": 0,
+            "write_errors": 0,
+            "rotations": 0
+        }
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"audit-writer:{os.path.basename(log_file_path)}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, line: str, keys: Optional[IndexKeys] = None) -> None:
+        """
+        Encola una línea de auditoría (sin bloquear el event loop)
+
+        keys es (evaluation_id, company_id, event_type) para el índice; si no se
+        indica, se obtiene parseando la línea.
+        """
+        if not line.endswith("\n"):
+            line += "\n"
+        record = (line, keys)
+
+        if self._closed:
+            self._write_batch([record])
+            return
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats["overflow_events"] += 1
+            if not self._notify_error([line], OverflowError(f"audit queue for {self.log_file_path} is full")):
+                self.stats["dropped_events"] += 1
+                self.logger.error(f"Audit queue for {self.log_file_path} is full, dropping event")
+
+    def add_error_handler(self, handler: Callable[[str, List[str], Exception], None]) -> None:
+        """Registra un callback para los lotes que no pudieron escribirse (una vez por callback)"""
+        if handler not in self.error_handlers:
+            self.error_handlers.append(handler)
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Espera a que todo lo encolado hasta ahora esté escrito en disco"""
+        if self._closed or not self._thread.is_alive():
+            return True
+
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    async def aflush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Versión awaitable de flush() que no bloquea el event loop"""
+        return await asyncio.to_thread(self.flush, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Vacía la cola y detiene el hilo escritor"""
+        if self._closed:
+            return
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._closed = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene estadísticas del escritor"""
+        return {
+            **self.stats,
+            "queue_size": self._queue.qsize(),
+            "batch_size": self.batch_size,
+            "flush_interval_ms": int(self.flush_interval * 1000)
+        }
+
+    def _run(self):
+        """Bucle del hilo escritor: agrupa líneas por tamaño o por tiempo"""
+        pending: List[Tuple[str, Optional[IndexKeys]]] = []
+        deadline = 0.0
+
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if pending else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(item)
+                if len(pending) < self.batch_size and time.monotonic() < deadline:
+                    continue
+
+            if pending:
+                self._write_batch(pending)
+                pending = []
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                break
+
+    def _write_batch(self, records: List[Tuple[str, Optional[IndexKeys]]]) -> None:
+        """Escribe un lote con una sola escritura y un fsync, lo encadena y lo indexa"""
+        lines = [line for line, _ in records]
+        encoded = [line.encode("utf-8") for line in lines]
+        data = b"".join(encoded)
+        sealed_segment = None
+        with self._file_lock:
+            try:
+                if self.segments.should_rotate(len(data)):
+                    sealed_segment = self._seal_active()
+                with open(self.log_file_path, "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    # En modo append la posición final es el fin de nuestro lote
+                    start_offset = f.tell() - len(data)
+                self.stats["events_written"] += len(lines)
+                self.stats["batches_written"] += 1
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                self.logger.error(f"Failed to write audit batch to {self.log_file_path}: {e}")
+                self._notify_error(lines, e)
+                return
+
+            # El lote se encadena bajo el mismo lock para conservar el orden del log
+            try:
+                self.chain.append_batch(start_offset, encoded)
+            except OSError as e:
+                self.logger.error(f"Failed to chain audit batch for {self.log_file_path}: {e}")
+
+            self.index.record_batch(start_offset, encoded, [keys for _, keys in records])
+
+        if sealed_segment:
+            # Compresión y retención fuera del lock: las escrituras síncronas no esperan
+            self.segments.compress_segment(sealed_segment)
+            dropped = self.segments.apply_retention()
+            self.chain.record_drop(dropped)
+            self.index.drop_segments(dropped)
+
+    def _notify_error(self, lines: List[str], error: Exception) -> bool:
+        """Entrega líneas no escritas en el log a los error_handlers; False si no hay ninguno"""
+        handlers = list(self.error_handlers)
+        for handler in handlers:
+            try:
+                handler(self.log_file_path, lines, error)
+            except Exception:
+                pass
+        return bool(handlers)
+
+    def _seal_active(self) -> Optional[str]:
+        """Sella el archivo activo como segmento (se llama con _file_lock tomado)"""
+        try:
+            segment_id = self.index.seal_active(
+                lambda: (self.segments.rotate() or {}).get("segment")
+            )
+        except OSError as e:
+            self.logger.error(f"Failed to rotate audit log {self.log_file_path}: {e}")
+            return None
+        if segment_id:
+            self.chain.record_seal(segment_id)
+            self.stats["rotations"] += 1
+        return segment_id
+
+
+# Un único escritor por archivo, compartido por todas las instancias de AuditLogger
+_writers: Dict[str, AuditWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_audit_writer(log_file_path: str, batch_size: int = 64, flush_interval_ms: int = 200,
+                     max_queue_size: int = 10000, **segment_options: Any) -> AuditWriter:
+    """
+    Obtiene (o crea) el escritor compartido para un archivo de auditoría
+
+    segment_options son los parámetros de rotación de AuditSegmentManager. La
+    configuración la fija quien crea el escritor.
+    """
+    key = os.path.abspath(log_file_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer._closed:
+            segments = AuditSegmentManager(log_file_path, **segment_options)
+            writer = AuditWriter(log_file_path, batch_size, flush_interval_ms, max_queue_size, segments)
+            _writers[key] = writer
+        return writer
+
+
+def close_audit_writers() -> None:
+    """Vacía y cierra todos los escritores (se ejecuta también al salir del proceso)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_audit_writers)
@@ -2,12 +2,16 @@
 
 import logging
 import json
-import hashlib
 from datetime import datetime
 
+from .audit_writer import get_audit_writer
+
 class JsonFormatter(logging.Formatter):
     """
     Formateador personalizado para convertir los registros en una cadena JSON.
+
+    La integridad ya no se calcula por registro: el escritor de auditoría encadena
+    una raíz Merkle por lote (ver audit_integrity.py).
     """
     def format(self, record):
         # Creamos un diccionario base con la información estándar del log
@@ -17,17 +21,26 @@ class JsonFormatter(logging.Formatter):
             "message": record.getMessage(),
         }
 
-        # --- Mecanismo de Integridad (Hashing) ---
-        # Convertimos el objeto de log a una cadena de texto ordenada para asegurar un hash consistente
-        log_string = json.dumps(log_object, sort_keys=True)
-        # Calculamos el hash SHA-256 del registro
-        log_hash = hashlib.sha256(log_string.encode()).hexdigest()
-        
-        # Añadimos el hash al objeto de log final
-        log_object["integrity_hash"] = log_hash
-
         return json.dumps(log_object)
 
+class AuditWriterHandler(logging.Handler):
+    """
+    Manejador que envía los registros al escritor de auditoría compartido
+    (escritura por lotes, índice y cadena de integridad).
+    """
+    def __init__(self, log_file_path: str = "audit.log"):
+        super().__init__()
+        self.writer = get_audit_writer(log_file_path)
+
+    def emit(self, record):
+        try:
+            self.writer.submit(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.writer.flush()
+
 def setup_logger():
     """
     Configura y devuelve una instancia de nuestro logger de auditoría.
@@ -40,8 +53,8 @@ def setup_logger():
     if logger.hasHandlers():
         logger.handlers.clear()
 
-    # 1. Creamos un "manejador" que sabe cómo escribir a un archivo
-    file_handler = logging.FileHandler("audit.log", mode='a', encoding='utf-8')
+    # 1. Creamos un "manejador" que escribe a través del escritor de auditoría
+    file_handler = AuditWriterHandler("audit.log")
 
     # 2. Creamos una instancia de nuestro formateador JSON y se la asignamos al manejador
     formatter = JsonFormatter()
@@ -3,7 +3,9 @@
 import json
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Literal
+from typing import List, Literal, Optional
+
+from .audit_tail import read_recent_lines
 
 # Import Azure OpenAI Service
 from ...infrastructure_agents.services.azure_openai_service_enhanced import OpenAIRequest
@@ -17,16 +19,27 @@ class SupervisionReport(BaseModel):
     summary: str = Field(description="Un resumen en lenguaje natural de los hallazgos. Si no hay anomalías, indicarlo.")
     recommended_action: Literal["Ninguna", "Revisión Manual Requerida", "Alerta de Seguridad Crítica"] = Field(description="La acción recomendada a seguir.")
     critical_alert: bool = Field(description="True si se requiere bloquear operaciones inmediatamente", default=False)
+    signals: List[str] = Field(description="Señales del detector local que dispararon el análisis", default_factory=list)
+    source: Literal["llm", "local_detector"] = Field(description="Quién emitió el veredicto", default="llm")
 
-async def run_security_supervision(azure_service, log_file_path: str = "audit.log") -> SupervisionReport:
+async def run_security_supervision(azure_service, log_file_path: str = "audit.log",
+                                   local_verdict: Optional[SupervisionReport] = None) -> SupervisionReport:
     """
     Lee los últimos eventos del log de auditoría y los analiza en busca de patrones anómalos.
+
+    Si se pasa el veredicto del detector local (StreamingAnomalyDetector) y no hay
+    señales activas, se devuelve sin consultar al LLM; si las hay, se escala al LLM
+    incluyendo las señales en el prompt.
     """
+    if local_verdict is not None and not local_verdict.anomaly_detected:
+        return local_verdict
+
     # 1. Leer los registros del archivo de log
     try:
-        with open(log_file_path, 'r', encoding='utf-8') as f:
-            # Leemos las últimas N líneas para no sobrecargar el análisis
-            log_entries = f.readlines()[-100:] 
+        # Leemos las últimas N líneas (desde el final, sin cargar todo el log)
+        log_entries = [
+            line.decode('utf-8', errors='replace') for line in read_recent_lines(log_file_path, 100)
+        ]
         
         if not log_entries:
             return SupervisionReport(
@@ -47,6 +60,8 @@ async def run_security_supervision(azure_service, log_file_path: str = "audit.lo
             critical_alert=True
         )
 
+    local_signals = "\n".join(f"- {signal}" for signal in local_verdict.signals) if local_verdict else "- (no disponible)"
+
     try:
         # 2. Diseñar el prompt de auditoría
         prompt_template = """
@@ -62,6 +77,9 @@ async def run_security_supervision(azure_service, log_file_path: str = "audit.lo
         - Múltiples evaluaciones fallidas consecutivas
         - Acceso desde IPs sospechosas o patrones de acceso anómalos
 
+        [SEÑALES DEL DETECTOR ESTADÍSTICO LOCAL]:
+        {local_signals}
+
         [LOGS DE AUDITORÍA]:
         {log_data}
 
@@ -80,7 +98,7 @@ async def run_security_supervision(azure_service, log_file_path: str = "audit.lo
             request_id=f"security_supervision_{datetime.now().strftime('%H%M%S')}",
             user_id="security_system",
             agent_id="security_supervisor",
-            prompt=prompt_template.format(log_data=logs_as_string),
+            prompt=prompt_template.format(log_data=logs_as_string, local_signals=local_signals),
             max_tokens=500,
             temperature=0.0,
             timestamp=datetime.now()
@@ -105,7 +123,8 @@ async def run_security_supervision(azure_service, log_file_path: str = "audit.lo
                 confidence_score=result_data.get("confidence_score", 0.0),
                 summary=result_data.get("summary", "Error parsing supervision result"),
                 recommended_action=result_data.get("recommended_action", "Revisión Manual Requerida"),
-                critical_alert=critical_alert
+                critical_alert=critical_alert,
+                signals=local_verdict.signals if local_verdict else []
             )
         except json.JSONDecodeError:
             # Fallback if JSON parsing fails
@@ -13,7 +13,7 @@ from enum import Enum
 
 from .config.azure_config import AzureInfrastructureConfig
 from .services.azure_openai_service import AzureOpenAIService, OpenAIRequest, OpenAIResponse
-from .services.azure_sql_service import AzureSQLService, RiskEvaluation, AgentResult, ScoringDetail
+from .services.storage_backend import AsyncEvaluationStorage, RiskEvaluation, AgentResult, ScoringDetail, create_evaluation_storage
 from .services.azure_blob_service import AzureBlobService
 from .services.semantic_kernel_service import SemanticKernelService
 
@@ -90,7 +90,7 @@ class AgentConnector:
         
         # Initialize services
         self.openai_service: Optional[AzureOpenAIService] = None
-        self.sql_service: Optional[AzureSQLService] = None
+        self.sql_service: Optional[AsyncEvaluationStorage] = None
         self.blob_service: Optional[AzureBlobService] = None
         self.semantic_kernel_service: Optional[SemanticKernelService] = None
         
@@ -117,7 +117,12 @@ class AgentConnector:
             
             # Initialize SQL Service (optional)
             try:
-                self.sql_service = AzureSQLService(self.config.sql_database)
+                self.sql_service = await AsyncEvaluationStorage.create(
+                    create_evaluation_storage,
+                    self.config.storage.backend,
+                    self.config.sql_database,
+                    self.config.storage
+                )
             except Exception as e:
                 self.logger.warning(f"SQL Service not available: {e}")
             
@@ -515,7 +520,7 @@ class AgentConnector:
                     error_message=response.error_message
                 )
                 
-                self.sql_service.save_agent_result(agent_result)
+                await self.sql_service.save_agent_result(agent_result)
         except Exception as e:
             self.logger.warning(f"Failed to save agent result: {e}")
     
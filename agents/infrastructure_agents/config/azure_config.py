@@ -64,6 +64,11 @@ class AzureSQLConfig:
     port: int = 1433
     encrypt: bool = True
     trust_server_certificate: bool = False
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_idle_timeout: float = 300.0  # segundos sin uso antes de cerrar conexiones sobre el mínimo
+    pool_validate_after: float = 60.0  # segundos sin uso antes de verificar la conexión al prestarla
+    pool_acquire_timeout: float = 30.0
     
     @classmethod
     def from_env(cls) -> 'AzureSQLConfig':
@@ -72,7 +77,12 @@ class AzureSQLConfig:
             database=os.getenv("AZURE_SQL_DATABASE", "risk_evaluation_db"),
             username=os.getenv("AZURE_SQL_USERNAME", ""),
             password=os.getenv("AZURE_SQL_PASSWORD", ""),
-            driver=os.getenv("AZURE_SQL_DRIVER", "ODBC Driver 18 for SQL Server")
+            driver=os.getenv("AZURE_SQL_DRIVER", "ODBC Driver 18 for SQL Server"),
+            pool_min_size=int(os.getenv("AZURE_SQL_POOL_MIN", "1")),
+            pool_max_size=int(os.getenv("AZURE_SQL_POOL_MAX", "10")),
+            pool_idle_timeout=float(os.getenv("AZURE_SQL_POOL_IDLE_TIMEOUT", "300")),
+            pool_validate_after=float(os.getenv("AZURE_SQL_POOL_VALIDATE_AFTER", "60")),
+            pool_acquire_timeout=float(os.getenv("AZURE_SQL_POOL_ACQUIRE_TIMEOUT", "30"))
         )
     
     @property
@@ -89,6 +99,42 @@ class AzureSQLConfig:
         )
 
 
+@dataclass
+class StorageConfig:
+    """Selección del backend de persistencia de evaluaciones"""
+    backend: str = "azure_sql"  # 'azure_sql' o 'sqlite'
+    sqlite_path: str = "data/risk_evaluations.db"
+    sqlite_pool_size: int = 4
+    sqlite_synchronous: str = "NORMAL"  # PRAGMA synchronous: con WAL, NORMAL no pierde consistencia
+    cache_enabled: bool = True
+    cache_ttl_seconds: float = 10.0  # red de seguridad ante escrituras de otros procesos
+    cache_max_entries: int = 4096
+    write_behind_enabled: bool = False  # persistencia en segundo plano desde AzureOrchestrator
+    write_behind_spill_path: str = "data/evaluation_spill.jsonl"
+    write_behind_batch_size: int = 25
+    write_behind_max_queue: int = 1000
+    write_behind_flush_interval: float = 0.5
+    write_behind_max_retries: int = 3
+    
+    @classmethod
+    def from_env(cls) -> 'StorageConfig':
+        return cls(
+            backend=os.getenv("STORAGE_BACKEND", "azure_sql").lower(),
+            sqlite_path=os.getenv("SQLITE_STORAGE_PATH", "data/risk_evaluations.db"),
+            sqlite_pool_size=int(os.getenv("SQLITE_POOL_SIZE", "4")),
+            sqlite_synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper(),
+            cache_enabled=os.getenv("EVALUATION_CACHE_ENABLED", "true").lower() == "true",
+            cache_ttl_seconds=float(os.getenv("EVALUATION_CACHE_TTL", "10")),
+            cache_max_entries=int(os.getenv("EVALUATION_CACHE_MAX_ENTRIES", "4096")),
+            write_behind_enabled=os.getenv("EVALUATION_WRITE_BEHIND", "false").lower() == "true",
+            write_behind_spill_path=os.getenv("EVALUATION_SPILL_PATH", "data/evaluation_spill.jsonl"),
+            write_behind_batch_size=int(os.getenv("EVALUATION_WRITE_BEHIND_BATCH", "25")),
+            write_behind_max_queue=int(os.getenv("EVALUATION_WRITE_BEHIND_QUEUE", "1000")),
+            write_behind_flush_interval=float(os.getenv("EVALUATION_WRITE_BEHIND_INTERVAL", "0.5")),
+            write_behind_max_retries=int(os.getenv("EVALUATION_WRITE_BEHIND_RETRIES", "3"))
+        )
+
+
 @dataclass
 class AzureBlobConfig:
     """Configuración para Azure Blob Storage"""
@@ -98,6 +144,10 @@ class AzureBlobConfig:
     container_simulations: str = "scenario-simulations"
     container_configs: str = "agent-configurations"
     container_audit: str = "audit-logs"
+    manifest_cache_size: int = 1024  # manifiestos de evaluación en memoria
+    max_concurrency: int = 16  # blobs transferidos a la vez por el cliente asíncrono
+    transfer_concurrency: int = 4  # bloques en paralelo dentro de un blob grande
+    transfer_chunk_size: int = 4 * 1024 * 1024  # tamaño de bloque y umbral de transferencia por bloques
     
     @classmethod
     def from_env(cls) -> 'AzureBlobConfig':
@@ -107,7 +157,11 @@ class AzureBlobConfig:
             container_reports=os.getenv("AZURE_BLOB_REPORTS", "risk-reports"),
             container_simulations=os.getenv("AZURE_BLOB_SIMULATIONS", "scenario-simulations"),
             container_configs=os.getenv("AZURE_BLOB_CONFIGS", "agent-configurations"),
-            container_audit=os.getenv("AZURE_BLOB_AUDIT", "audit-logs")
+            container_audit=os.getenv("AZURE_BLOB_AUDIT", "audit-logs"),
+            manifest_cache_size=int(os.getenv("AZURE_BLOB_MANIFEST_CACHE", "1024")),
+            max_concurrency=int(os.getenv("AZURE_BLOB_MAX_CONCURRENCY", "16")),
+            transfer_concurrency=int(os.getenv("AZURE_BLOB_TRANSFER_CONCURRENCY", "4")),
+            transfer_chunk_size=int(os.getenv("AZURE_BLOB_CHUNK_SIZE", str(4 * 1024 * 1024)))
         )
     
     @property
@@ -159,6 +213,7 @@ class AzureInfrastructureConfig:
         self.ai_service = AzureAIServiceConfig.from_env()
         self.openai = AzureOpenAIConfig.from_env()
         self.sql_database = AzureSQLConfig.from_env()
+        self.storage = StorageConfig.from_env()
         self.blob_storage = AzureBlobConfig.from_env()
         self.semantic_kernel = SemanticKernelConfig.from_env()
         self.bing_search = BingSearchConfig.from_env()
@@ -181,14 +236,18 @@ class AzureInfrastructureConfig:
         if not self.ai_service.subscription_id:
             warnings.append("AZURE_SUBSCRIPTION_ID recommended for full functionality")
         
-        if not self.sql_database.server:
-            warnings.append("AZURE_SQL_SERVER recommended for data persistence")
-        
-        if not self.sql_database.username:
-            warnings.append("AZURE_SQL_USERNAME recommended for data persistence")
+        if self.storage.backend not in ("azure_sql", "sqlite"):
+            errors.append(f"STORAGE_BACKEND must be 'azure_sql' or 'sqlite', got '{self.storage.backend}'")
         
-        if not self.sql_database.password:
-            warnings.append("AZURE_SQL_PASSWORD recommended for data persistence")
+        if self.storage.backend == "azure_sql":
+            if not self.sql_database.server:
+                warnings.append("AZURE_SQL_SERVER recommended for data persistence")
+            
+            if not self.sql_database.username:
+                warnings.append("AZURE_SQL_USERNAME recommended for data persistence")
+            
+            if not self.sql_database.password:
+                warnings.append("AZURE_SQL_PASSWORD recommended for data persistence")
         
         if not self.blob_storage.account_name:
             warnings.append("AZURE_STORAGE_ACCOUNT recommended for file storage")
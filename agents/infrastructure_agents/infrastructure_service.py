@@ -4,6 +4,7 @@ Servicio principal que integra todos los servicios Azure para agentes de infraes
 """
 
 import asyncio
+import inspect
 import logging
 import json
 from typing import Dict, List, Optional, Any
@@ -13,8 +14,9 @@ from datetime import datetime
 from .config.azure_config import AzureInfrastructureConfig
 from .services.azure_ai_service import AzureAIAgentService
 from .services.azure_openai_service import AzureOpenAIService, SecurityProxyConfig
-from .services.azure_sql_service import AzureSQLService
+from .services.storage_backend import AsyncEvaluationStorage, EvaluationStorage, create_evaluation_storage
 from .services.azure_blob_service import AzureBlobService
+from .services.async_blob_service import AsyncAzureBlobService
 from .services.semantic_kernel_service import SemanticKernelService
 
 
@@ -50,8 +52,10 @@ class InfrastructureService:
         # Initialize services
         self.ai_service: Optional[AzureAIAgentService] = None
         self.openai_service: Optional[AzureOpenAIService] = None
-        self.sql_service: Optional[AzureSQLService] = None
+        self.sql_service: Optional[EvaluationStorage] = None
+        self.async_sql_service: Optional[AsyncEvaluationStorage] = None
         self.blob_service: Optional[AzureBlobService] = None
+        self.async_blob_service: Optional[AsyncAzureBlobService] = None
         self.semantic_kernel_service: Optional[SemanticKernelService] = None
         
         # Service initialization status
@@ -137,16 +141,23 @@ class InfrastructureService:
             raise
     
     async def _initialize_sql_service(self):
-        """Inicializa Azure SQL Database Service"""
+        """Inicializa el almacenamiento de evaluaciones (Azure SQL o SQLite según STORAGE_BACKEND)"""
         try:
-            self.sql_service = AzureSQLService(self.config.sql_database)
+            # Connections and schema are created off the event loop
+            self.async_sql_service = await AsyncEvaluationStorage.create(
+                create_evaluation_storage,
+                self.config.storage.backend,
+                self.config.sql_database,
+                self.config.storage
+            )
+            self.sql_service = self.async_sql_service.service
             
             # Test connection and schema
-            health_status = self.sql_service.health_check()
+            health_status = await self.async_sql_service.health_check()
             if health_status["status"] != "healthy":
                 raise Exception(f"SQL service unhealthy: {health_status}")
             
-            self.logger.info("Azure SQL Database Service initialized")
+            self.logger.info(f"Evaluation storage initialized ({self.config.storage.backend})")
             
         except Exception as e:
             self.logger.error(f"Failed to initialize SQL Service: {e}")
@@ -156,6 +167,8 @@ class InfrastructureService:
         """Inicializa Azure Blob Storage Service"""
         try:
             self.blob_service = AzureBlobService(self.config.blob_storage)
+            # Variante asíncrona para backups y auditoría (transferencias concurrentes)
+            self.async_blob_service = AsyncAzureBlobService(self.config.blob_storage)
             
             # Test connection
             health_status = self.blob_service.health_check()
@@ -201,18 +214,30 @@ class InfrastructureService:
             raise RuntimeError("OpenAI Service not initialized")
         return self.openai_service
     
-    def get_sql_service(self) -> AzureSQLService:
-        """Obtiene el servicio de Azure SQL Database"""
+    def get_sql_service(self) -> EvaluationStorage:
+        """Obtiene el almacenamiento de evaluaciones (Azure SQL Database o SQLite)"""
         if not self.sql_service:
             raise RuntimeError("SQL Service not initialized")
         return self.sql_service
     
+    def get_async_sql_service(self) -> AsyncEvaluationStorage:
+        """Obtiene la variante asíncrona del almacenamiento de evaluaciones"""
+        if not self.async_sql_service:
+            raise RuntimeError("SQL Service not initialized")
+        return self.async_sql_service
+    
     def get_blob_service(self) -> AzureBlobService:
         """Obtiene el servicio de Azure Blob Storage"""
         if not self.blob_service:
             raise RuntimeError("Blob Service not initialized")
         return self.blob_service
     
+    def get_async_blob_service(self) -> AsyncAzureBlobService:
+        """Obtiene la variante asíncrona de Azure Blob Storage"""
+        if not self.async_blob_service:
+            raise RuntimeError("Blob Service not initialized")
+        return self.async_blob_service
+    
     def get_semantic_kernel_service(self) -> SemanticKernelService:
         """Obtiene el servicio de Semantic Kernel"""
         if not self.semantic_kernel_service:
@@ -237,7 +262,7 @@ class InfrastructureService:
             )
             
             # Create evaluation record in SQL Database
-            from .services.azure_sql_service import RiskEvaluation
+            from .services.storage_backend import RiskEvaluation
             evaluation = RiskEvaluation(
                 evaluation_id=evaluation_id,
                 company_id=company_data.get("company_id", ""),
@@ -247,7 +272,7 @@ class InfrastructureService:
                 metadata=json.dumps({"source": "infrastructure_service"})
             )
             
-            success = self.sql_service.create_risk_evaluation(evaluation)
+            success = await self.async_sql_service.create_risk_evaluation(evaluation)
             if not success:
                 raise Exception("Failed to create evaluation record")
             
@@ -278,17 +303,17 @@ class InfrastructureService:
         """Obtiene el estado de una evaluación"""
         
         try:
-            # Get from SQL Database
-            evaluation = self.sql_service.get_risk_evaluation(evaluation_id)
+            # Get evaluation and agent results from SQL Database concurrently
+            evaluation, agent_results = await asyncio.gather(
+                self.async_sql_service.get_risk_evaluation(evaluation_id),
+                self.async_sql_service.get_agent_results_by_evaluation(evaluation_id)
+            )
             if not evaluation:
                 return {"error": "Evaluation not found"}
             
             # Get context from Semantic Kernel
             context = self.semantic_kernel_service.get_evaluation_context(evaluation_id)
             
-            # Get agent results
-            agent_results = self.sql_service.get_agent_results_by_evaluation(evaluation_id)
-            
             status = {
                 "evaluation_id": evaluation_id,
                 "company_id": evaluation.company_id,
@@ -314,17 +339,15 @@ class InfrastructureService:
         """Genera el reporte final de una evaluación"""
         
         try:
-            # Get evaluation data
-            evaluation = self.sql_service.get_risk_evaluation(evaluation_id)
+            # Get evaluation data, scoring details and agent results concurrently
+            evaluation, scoring_details, agent_results = await asyncio.gather(
+                self.async_sql_service.get_risk_evaluation(evaluation_id),
+                self.async_sql_service.get_scoring_details(evaluation_id),
+                self.async_sql_service.get_agent_results_by_evaluation(evaluation_id)
+            )
             if not evaluation:
                 raise Exception("Evaluation not found")
             
-            # Get scoring details
-            scoring_details = self.sql_service.get_scoring_details(evaluation_id)
-            
-            # Get agent results
-            agent_results = self.sql_service.get_agent_results_by_evaluation(evaluation_id)
-            
             # Prepare report data
             report_data = {
                 "evaluation": evaluation,
@@ -370,7 +393,7 @@ class InfrastructureService:
         services = [
             ("ai_service", self.ai_service),
             ("openai_service", self.openai_service),
-            ("sql_service", self.sql_service),
+            ("sql_service", self.async_sql_service),
             ("blob_service", self.blob_service),
             ("semantic_kernel_service", self.semantic_kernel_service)
         ]
@@ -379,6 +402,8 @@ class InfrastructureService:
             if service:
                 try:
                     health_status = service.health_check()
+                    if inspect.isawaitable(health_status):
+                        health_status = await health_status
                     services_status[service_name] = health_status
                     
                     if health_status.get("status") != "healthy":
@@ -424,8 +449,8 @@ class InfrastructureService:
             "initialization_errors": self.initialization_errors
         }
         
-        if self.sql_service:
-            metrics["database_stats"] = self.sql_service.get_evaluation_statistics()
+        if self.async_sql_service:
+            metrics["database_stats"] = await self.async_sql_service.get_evaluation_statistics()
         
         if self.blob_service:
             metrics["storage_stats"] = self.blob_service.get_storage_statistics()
@@ -472,9 +497,13 @@ class InfrastructureService:
         self.logger.info("Shutting down infrastructure services...")
         
         # Close database connections
-        if self.sql_service and hasattr(self.sql_service, 'connection_pool'):
-            # Close connection pool if needed
-            pass
+        if self.async_sql_service:
+            await asyncio.to_thread(self.async_sql_service.close, True)
+            self.async_sql_service = None
+        
+        if self.async_blob_service:
+            await self.async_blob_service.close()
+            self.async_blob_service = None
         
         # Clear memory contexts
         if self.semantic_kernel_service:
@@ -0,0 +1,209 @@
+"""
+Async Azure Blob Storage Service
+Variante asíncrona (azure.storage.blob.aio) para operaciones de muchos blobs
+- Transferencias concurrentes acotadas por un semáforo (max_concurrency blobs a la vez)
+- Blobs grandes por bloques en paralelo (transfer_concurrency bloques de transfer_chunk_size)
+- create_backup y get_audit_logs descargan todos los blobs a la vez en lugar de uno a uno:
+  el tiempo total queda limitado por el ancho de banda y no por el número de round-trips
+
+Mismo formato de blobs, backups y logs que AzureBlobService.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient
+
+from ..config.azure_config import AzureBlobConfig
+from .azure_blob_service import MANIFEST_BLOB, BlobMetadata
+
+
+class AsyncAzureBlobService:
+    """
+    Cliente asíncrono de Azure Blob Storage con concurrencia acotada
+
+    Debe usarse desde un event loop; close() (o "async with") libera la sesión HTTP.
+    """
+
+    def __init__(self, config: AzureBlobConfig, max_concurrency: Optional[int] = None):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.max_concurrency = max(1, max_concurrency or config.max_concurrency)
+        self.transfer_concurrency = max(1, config.transfer_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Por encima de transfer_chunk_size las subidas y descargas van por bloques en paralelo
+        self.blob_service_client = BlobServiceClient.from_connection_string(
+            config.connection_string,
+            max_single_put_size=config.transfer_chunk_size,
+            max_block_size=config.transfer_chunk_size,
+            max_single_get_size=config.transfer_chunk_size,
+            max_chunk_get_size=config.transfer_chunk_size
+        )
+
+    async def close(self):
+        await self.blob_service_client.close()
+
+    async def __aenter__(self) -> "AsyncAzureBlobService":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # Transfers
+
+    async def download_blob(self, container_name: str, blob_name: str) -> bytes:
+        """Descarga un blob completo (por bloques en paralelo si es grande)"""
+        async with self._semaphore:
+            blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+            downloader = await blob_client.download_blob(max_concurrency=self.transfer_concurrency)
+            return await downloader.readall()
+
+    async def upload_blob(self, container_name: str, blob_name: str, data: bytes,
+                          content_type: str, metadata: Dict[str, str]) -> str:
+        """Sube un blob (por bloques en paralelo si es grande) y devuelve su ruta"""
+        try:
+            async with self._semaphore:
+                blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+                await blob_client.upload_blob(
+                    data=data,
+                    content_settings=ContentSettings(content_type=content_type),
+                    metadata=metadata,
+                    overwrite=True,
+                    max_concurrency=self.transfer_concurrency
+                )
+
+            self.logger.info(f"Uploaded blob: {container_name}/{blob_name}")
+            return f"{container_name}/{blob_name}"
+
+        except Exception as e:
+            self.logger.error(f"Failed to upload blob: {e}")
+            raise
+
+    async def download_many(self, container_name: str, blob_names: List[str]) -> Dict[str, Optional[bytes]]:
+        """Descarga varios blobs a la vez; los que fallan quedan como None"""
+        async def fetch(name: str) -> Tuple[str, Optional[bytes]]:
+            try:
+                return name, await self.download_blob(container_name, name)
+            except Exception as e:
+                self.logger.warning(f"Failed to download blob {container_name}/{name}: {e}")
+                return name, None
+
+        return dict(await asyncio.gather(*(fetch(name) for name in blob_names)))
+
+    async def list_blobs(self, container_name: str, prefix: str) -> List[BlobMetadata]:
+        """Lista los blobs de un prefijo con sus metadatos"""
+        container_client = self.blob_service_client.get_container_client(container_name)
+        blobs = []
+        async with self._semaphore:
+            async for blob in container_client.list_blobs(name_starts_with=prefix, include=['metadata']):
+                blobs.append(BlobMetadata(
+                    name=blob.name,
+                    container=container_name,
+                    size=blob.size,
+                    last_modified=blob.last_modified,
+                    content_type=blob.content_settings.content_type if blob.content_settings else 'unknown',
+                    metadata=blob.metadata or {},
+                    etag=blob.etag
+                ))
+        return blobs
+
+    # Audit Logging
+
+    async def get_audit_logs(self, log_type: str, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+        """Obtiene logs de auditoría por tipo y rango de fechas (listados y descargas concurrentes)"""
+        try:
+            days = []
+            current_date = start_date
+            while current_date <= end_date:
+                days.append(f"{log_type}/{current_date.strftime('%Y/%m/%d')}/")
+                current_date += timedelta(days=1)
+
+            listings = await asyncio.gather(*(self.list_blobs(self.config.container_audit, prefix)
+                                              for prefix in days))
+            names = [blob.name for listing in listings for blob in listing]
+            contents = await self.download_many(self.config.container_audit, names)
+
+            logs = []
+            for name in names:
+                content = contents.get(name)
+                if content is None:
+                    continue
+                try:
+                    logs.append(json.loads(content.decode('utf-8')))
+                except ValueError as e:
+                    self.logger.warning(f"Failed to read audit log {name}: {e}")
+
+            return sorted(logs, key=lambda x: x.get('timestamp', ''))
+
+        except Exception as e:
+            self.logger.error(f"Failed to get audit logs: {e}")
+            return []
+
+    # Backup
+
+    async def create_backup(self, evaluation_id: str) -> str:
+        """Crea un backup completo de todos los datos de una evaluación"""
+
+        backup_name = f"backups/{evaluation_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+        backup_data = {
+            "evaluation_id": evaluation_id,
+            "backup_date": datetime.now().isoformat(),
+            "reports": [],
+            "simulations": [],
+            "metadata": {}
+        }
+
+        reports, simulations = await asyncio.gather(
+            self.list_blobs(self.config.container_reports, f"{evaluation_id}/"),
+            self.list_blobs(self.config.container_simulations, f"{evaluation_id}/")
+        )
+        reports = [report for report in reports if report.name.rsplit("/", 1)[-1] != MANIFEST_BLOB]
+        simulations = [simulation for simulation in simulations if 'scenarios/' in simulation.name]
+
+        # Cada reporte se descarga por su nombre exacto (no por tipo)
+        report_contents, simulation_contents = await asyncio.gather(
+            self.download_many(self.config.container_reports, [report.name for report in reports]),
+            self.download_many(self.config.container_simulations, [simulation.name for simulation in simulations])
+        )
+
+        for report in reports:
+            report_content = report_contents.get(report.name)
+            if report_content:
+                backup_data["reports"].append({
+                    "name": report.name,
+                    "metadata": report.metadata,
+                    "content_base64": report_content.hex()  # Mismo formato (hex) que AzureBlobService
+                })
+
+        for simulation in simulations:
+            simulation_content = simulation_contents.get(simulation.name)
+            if simulation_content:
+                try:
+                    backup_data["simulations"].append(json.loads(simulation_content.decode('utf-8')))
+                except ValueError as e:
+                    self.logger.warning(f"Failed to read simulation {simulation.name}: {e}")
+
+        json_content = json.dumps(backup_data, indent=2, ensure_ascii=False, default=str)
+        content_bytes = json_content.encode('utf-8')
+
+        metadata = {
+            "evaluation_id": evaluation_id,
+            "backup_type": "full_evaluation_backup",
+            "created_date": datetime.now().isoformat(),
+            "reports_count": str(len(backup_data["reports"])),
+            "simulations_count": str(len(backup_data["simulations"]))
+        }
+
+        return await self.upload_blob(
+            container_name=self.config.container_configs,
+            blob_name=backup_name,
+            data=content_bytes,
+            content_type="application/json",
+            metadata=metadata
+        )
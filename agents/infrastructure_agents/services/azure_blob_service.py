@@ -1,20 +1,33 @@
 """
 Azure Blob Storage Service
 Servicio de almacenamiento para reportes, simulaciones y configuraciones
+
+Cada evaluación tiene un manifiesto ({evaluation_id}/_manifest.json en el contenedor
+de reportes) que asocia tipo de reporte e id de simulación con el nombre exacto del
+blob y su etag: get_report y get_scenario_simulation hacen un GET directo en lugar de
+listar el prefijo. Sin manifiesto (evaluaciones anteriores) o con una entrada
+obsoleta se recurre al listado y se repara el manifiesto.
 """
 
 import logging
 import json
 import io
-from typing import Dict, List, Optional, Any, BinaryIO
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, BinaryIO, Tuple
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
-from azure.core.exceptions import AzureError, ResourceNotFoundError
+from azure.core import MatchConditions
+from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient, ContentSettings
+from azure.core.exceptions import AzureError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
 
 from ..config.azure_config import AzureBlobConfig
 
 
+MANIFEST_BLOB = "_manifest.json"
+MANIFEST_WRITE_ATTEMPTS = 5
+
+
 @dataclass
 class BlobMetadata:
     """Metadatos de un blob"""
@@ -49,6 +62,10 @@ class AzureBlobService:
         self.config = config
         self.logger = logging.getLogger(__name__)
         
+        # evaluation_id -> (manifiesto, etag); LRU acotada
+        self._manifests: "OrderedDict[str, Tuple[Dict[str, Any], str]]" = OrderedDict()
+        self._manifest_lock = threading.Lock()
+        
         # Initialize Blob Service Client
         self.blob_service_client = BlobServiceClient.from_connection_string(
             config.connection_string
@@ -111,7 +128,8 @@ class AzureBlobService:
             "content_type": content_type
         }
         
-        return self._upload_blob(
+        return self._upload_indexed_blob(
+            evaluation_id, "reports", "final_report",
             container_name=self.config.container_reports,
             blob_name=blob_name,
             data=report_content,
@@ -136,7 +154,8 @@ class AzureBlobService:
             "risk_level": scoring_data.get('risk_level', 'unknown')
         }
         
-        return self._upload_blob(
+        return self._upload_indexed_blob(
+            evaluation_id, "reports", "scoring_details",
             container_name=self.config.container_reports,
             blob_name=blob_name,
             data=content_bytes,
@@ -145,22 +164,32 @@ class AzureBlobService:
         )
     
     def get_report(self, evaluation_id: str, report_type: str) -> Optional[bytes]:
-        """Obtiene un reporte específico"""
+        """Obtiene el reporte más reciente de un tipo (GET directo vía manifiesto)"""
         try:
+            content = self._download_from_manifest(evaluation_id, "reports", report_type, match_substring=True)
+            if content is not None:
+                return content
+            
+            # Fallback: listar el prefijo de la evaluación
             container_client = self.blob_service_client.get_container_client(
                 self.config.container_reports
             )
-            
-            # List blobs with the evaluation_id prefix
-            blobs = container_client.list_blobs(name_starts_with=f"{evaluation_id}/")
+            blobs = container_client.list_blobs(name_starts_with=f"{evaluation_id}/", include=['metadata'])
             
             # Find the specific report type
-            for blob in blobs:
-                if report_type in blob.metadata.get('report_type', ''):
-                    blob_client = container_client.get_blob_client(blob.name)
-                    return blob_client.download_blob().readall()
+            matches = [
+                blob for blob in blobs
+                if not self._is_manifest(blob.name)
+                and report_type in (blob.metadata or {}).get('report_type', '')
+            ]
+            if not matches:
+                return None
             
-            return None
+            blob = max(matches, key=lambda b: b.last_modified)
+            content = container_client.get_blob_client(blob.name).download_blob().readall()
+            self._record_in_manifest(evaluation_id, "reports", blob.metadata['report_type'],
+                                     self.config.container_reports, blob.name, blob.etag)
+            return content
             
         except Exception as e:
             self.logger.error(f"Failed to get report: {e}")
@@ -180,6 +209,8 @@ class AzureBlobService:
             
             reports = []
             for blob in blobs:
+                if self._is_manifest(blob.name):
+                    continue
                 reports.append(BlobMetadata(
                     name=blob.name,
                     container=self.config.container_reports,
@@ -217,7 +248,8 @@ class AzureBlobService:
             "simulated_score": str(simulation_data.get('simulated_score', 0))
         }
         
-        return self._upload_blob(
+        return self._upload_indexed_blob(
+            evaluation_id, "simulations", simulation_id,
             container_name=self.config.container_simulations,
             blob_name=blob_name,
             data=content_bytes,
@@ -251,25 +283,34 @@ class AzureBlobService:
         )
     
     def get_scenario_simulation(self, evaluation_id: str, simulation_id: str) -> Optional[Dict[str, Any]]:
-        """Obtiene los datos de una simulación específica"""
+        """Obtiene los datos de una simulación específica (GET directo vía manifiesto)"""
         try:
+            content = self._download_from_manifest(evaluation_id, "simulations", simulation_id)
+            if content is not None:
+                return json.loads(content.decode('utf-8'))
+            
+            # Fallback: listar el prefijo de la simulación
             container_client = self.blob_service_client.get_container_client(
                 self.config.container_simulations
             )
-            
-            # List blobs with the evaluation_id and simulation_id
             blobs = container_client.list_blobs(
                 name_starts_with=f"{evaluation_id}/scenarios/{simulation_id}",
                 include=['metadata']
             )
             
-            for blob in blobs:
-                if simulation_id in blob.name:
-                    blob_client = container_client.get_blob_client(blob.name)
-                    content = blob_client.download_blob().readall()
-                    return json.loads(content.decode('utf-8'))
+            # El prefijo "sim1" también incluye "sim10_...": se compara el id de los metadatos
+            matches = [
+                blob for blob in blobs
+                if (blob.metadata or {}).get('simulation_id', simulation_id) == simulation_id
+            ]
+            if not matches:
+                return None
             
-            return None
+            blob = max(matches, key=lambda b: b.last_modified)
+            content = container_client.get_blob_client(blob.name).download_blob().readall()
+            self._record_in_manifest(evaluation_id, "simulations", simulation_id,
+                                     self.config.container_simulations, blob.name, blob.etag)
+            return json.loads(content.decode('utf-8'))
             
         except Exception as e:
             self.logger.error(f"Failed to get scenario simulation: {e}")
@@ -511,28 +552,166 @@ class AzureBlobService:
         
         return cleanup_stats
     
+    # Evaluation Manifest
+    
+    @staticmethod
+    def _is_manifest(blob_name: str) -> bool:
+        return blob_name.rsplit("/", 1)[-1] == MANIFEST_BLOB
+    
+    def _manifest_client(self, evaluation_id: str) -> BlobClient:
+        return self.blob_service_client.get_blob_client(
+            container=self.config.container_reports,
+            blob=f"{evaluation_id}/{MANIFEST_BLOB}"
+        )
+    
+    def _read_manifest(self, evaluation_id: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Lee el manifiesto del blob; ({}, None) si no existe"""
+        try:
+            downloader = self._manifest_client(evaluation_id).download_blob()
+            manifest = json.loads(downloader.readall().decode('utf-8'))
+            etag = downloader.properties.etag
+        except ResourceNotFoundError:
+            return {}, None
+        self._cache_manifest(evaluation_id, manifest, etag)
+        return manifest, etag
+    
+    def _cache_manifest(self, evaluation_id: str, manifest: Dict[str, Any], etag: str):
+        with self._manifest_lock:
+            self._manifests[evaluation_id] = (manifest, etag)
+            self._manifests.move_to_end(evaluation_id)
+            while len(self._manifests) > max(1, self.config.manifest_cache_size):
+                self._manifests.popitem(last=False)
+    
+    def _forget_manifest(self, evaluation_id: str):
+        with self._manifest_lock:
+            self._manifests.pop(evaluation_id, None)
+    
+    @staticmethod
+    def _find_entry(entries: Dict[str, Any], key: str, match_substring: bool) -> Optional[Dict[str, str]]:
+        """
+        Entrada exacta o, con match_substring, la única clave que contiene key
+        
+        Equivale a la coincidencia parcial del listado ('final' -> 'final_report'); si
+        varias claves coinciden no se elige ninguna y decide el listado.
+        """
+        entry = entries.get(key)
+        if entry is None and match_substring:
+            candidates = [candidate for candidate in entries if key in candidate]
+            if len(candidates) == 1:
+                entry = entries[candidates[0]]
+        return entry
+    
+    def _manifest_entry(self, evaluation_id: str, section: str, key: str,
+                        match_substring: bool = False) -> Optional[Dict[str, str]]:
+        """Entrada del manifiesto; si falta en la copia en memoria se relee el blob una vez"""
+        with self._manifest_lock:
+            cached = self._manifests.get(evaluation_id)
+            if cached is not None:
+                self._manifests.move_to_end(evaluation_id)
+        if cached is not None:
+            entry = self._find_entry(cached[0].get(section, {}), key, match_substring)
+            if entry is not None:
+                return entry
+        manifest, _ = self._read_manifest(evaluation_id)
+        return self._find_entry(manifest.get(section, {}), key, match_substring)
+    
+    def _download_from_manifest(self, evaluation_id: str, section: str, key: str,
+                                match_substring: bool = False) -> Optional[bytes]:
+        """GET directo del blob registrado; None si no hay entrada o está obsoleta"""
+        entry = self._manifest_entry(evaluation_id, section, key, match_substring)
+        if entry is None:
+            return None
+        try:
+            blob_client = self.blob_service_client.get_blob_client(container=entry["container"], blob=entry["blob"])
+            return blob_client.download_blob(etag=entry["etag"],
+                                             match_condition=MatchConditions.IfNotModified).readall()
+        except (ResourceNotFoundError, ResourceModifiedError):
+            # Borrado o sobrescrito fuera de este servicio: el fallback lista y repara
+            self.logger.info(f"Stale manifest entry {section}/{key} for {evaluation_id}")
+            self._forget_manifest(evaluation_id)
+            return None
+    
+    def _record_in_manifest(self, evaluation_id: str, section: str, key: str,
+                            container_name: str, blob_name: str, etag: str):
+        """
+        Registra un blob en el manifiesto con concurrencia optimista (etag)
+        
+        Un fallo no invalida la escritura del blob: las lecturas recurren al listado.
+        El primer intento parte de la copia en memoria (y su etag); el manifiesto solo
+        se relee si no hay copia o si otro escritor lo modificó.
+        """
+        entry = {"container": container_name, "blob": blob_name, "etag": etag}
+        manifest_client = self._manifest_client(evaluation_id)
+        with self._manifest_lock:
+            cached = self._manifests.get(evaluation_id)
+        try:
+            for _ in range(MANIFEST_WRITE_ATTEMPTS):
+                if cached is not None:
+                    # Copia: la entrada en memoria no cambia hasta que la subida se confirme
+                    manifest = {name: dict(value) if isinstance(value, dict) else value
+                                for name, value in cached[0].items()}
+                    current_etag = cached[1]
+                    cached = None
+                else:
+                    manifest, current_etag = self._read_manifest(evaluation_id)
+                manifest.setdefault("evaluation_id", evaluation_id)
+                manifest.setdefault(section, {})[key] = entry
+                manifest["updated_date"] = datetime.now().isoformat()
+                data = json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+                try:
+                    if current_etag:
+                        result = manifest_client.upload_blob(
+                            data, overwrite=True, etag=current_etag,
+                            match_condition=MatchConditions.IfNotModified,
+                            content_settings=ContentSettings(content_type="application/json")
+                        )
+                    else:
+                        result = manifest_client.upload_blob(
+                            data, overwrite=False,
+                            content_settings=ContentSettings(content_type="application/json")
+                        )
+                except (ResourceModifiedError, ResourceExistsError):
+                    continue  # otro escritor actualizó el manifiesto: releer y reintentar
+                self._cache_manifest(evaluation_id, manifest, result["etag"])
+                return
+            self.logger.warning(f"Manifest update for {evaluation_id} gave up after concurrent writes")
+        except Exception as e:
+            self.logger.warning(f"Failed to update manifest for {evaluation_id}: {e}")
+        self._forget_manifest(evaluation_id)
+    
     # Helper Methods
     
     def _upload_blob(self, container_name: str, blob_name: str, data: bytes, 
                     content_type: str, metadata: Dict[str, str]) -> str:
         """Método auxiliar para subir blobs"""
+        self._put_blob(container_name, blob_name, data, content_type, metadata)
+        return f"{container_name}/{blob_name}"
+    
+    def _upload_indexed_blob(self, evaluation_id: str, section: str, key: str, container_name: str,
+                             blob_name: str, data: bytes, content_type: str, metadata: Dict[str, str]) -> str:
+        """Sube un blob de una evaluación y lo registra en su manifiesto"""
+        etag = self._put_blob(container_name, blob_name, data, content_type, metadata)
+        self._record_in_manifest(evaluation_id, section, key, container_name, blob_name, etag)
+        return f"{container_name}/{blob_name}"
+    
+    def _put_blob(self, container_name: str, blob_name: str, data: bytes,
+                  content_type: str, metadata: Dict[str, str]) -> str:
+        """Sube un blob y devuelve su etag"""
         try:
             blob_client = self.blob_service_client.get_blob_client(
                 container=container_name,
                 blob=blob_name
             )
             
-            blob_client.upload_blob(
+            result = blob_client.upload_blob(
                 data=data,
-                content_settings={
-                    "content_type": content_type
-                },
+                content_settings=ContentSettings(content_type=content_type),
                 metadata=metadata,
                 overwrite=True
             )
             
             self.logger.info(f"Uploaded blob: {container_name}/{blob_name}")
-            return f"{container_name}/{blob_name}"
+            return result["etag"]
             
         except Exception as e:
             self.logger.error(f"Failed to upload blob: {e}")
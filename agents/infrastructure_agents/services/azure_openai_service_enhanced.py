@@ -10,7 +10,7 @@ from typing import Dict, List, Optional, Any, Union
 from dataclasses import dataclass
 from datetime import datetime
 import openai
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
 
 from ..config.azure_config import AzureOpenAIConfig
 from .rate_limit_handler import RateLimitHandler, RateLimitConfig, global_rate_limiter
@@ -58,6 +58,14 @@ class EnhancedAzureOpenAIService:
             azure_endpoint=config.endpoint
         )
         
+        # Async client: awaiting it yields to the event loop, so cancelling the
+        # calling task aborts the pending HTTP request
+        self.async_client = AsyncAzureOpenAI(
+            api_key=config.api_key,
+            api_version=config.api_version,
+            azure_endpoint=config.endpoint
+        )
+        
         # Initialize rate limit handler with optimized settings
         rate_limit_config = RateLimitConfig(
             max_retries=8,  # Más intentos para rate limits
@@ -77,6 +85,7 @@ class EnhancedAzureOpenAIService:
             "successful_requests": 0,
             "rate_limited_requests": 0,
             "retried_requests": 0,
+            "cancelled_requests": 0,
             "total_tokens_used": 0,
             "average_response_time": 0.0
         }
@@ -118,6 +127,12 @@ class EnhancedAzureOpenAIService:
             
             return result
             
+        except asyncio.CancelledError:
+            # Cancellation is not a failure: keep it out of the adaptive delay
+            self.stats["cancelled_requests"] += 1
+            self.logger.info(f"Request cancelled: {request.request_id}")
+            raise
+            
         except Exception as e:
             # Record failure
             global_rate_limiter.record_failure()
@@ -169,7 +184,7 @@ class EnhancedAzureOpenAIService:
         self.logger.debug(f"Making OpenAI request: {request.request_id} using {model_to_use}")
         
         # Make API call (this is where rate limits can occur)
-        response = self.client.chat.completions.create(**params)
+        response = await self.async_client.chat.completions.create(**params)
         
         # Extract response
         response_text = response.choices[0].message.content
@@ -406,6 +421,7 @@ Responde SOLO en JSON:
             "successful_requests": 0,
             "rate_limited_requests": 0,
             "retried_requests": 0,
+            "cancelled_requests": 0,
             "total_tokens_used": 0,
             "average_response_time": 0.0
         }
@@ -0,0 +1,332 @@
+"""
+Empaquetado de contexto por presupuesto de tokens
+- Divide los documentos en secciones (páginas, párrafos y tablas)
+- Puntúa cada sección por relevancia financiera (palabras clave y densidad de importes)
+- Selecciona con un algoritmo voraz las mejores secciones hasta el presupuesto de
+  tokens del agente, contado con el tokenizador local (tiktoken), y las devuelve en
+  el orden original del documento
+
+Sustituye al truncado ciego por caracteres: las páginas relevantes más allá del
+corte ya no se pierden y el tamaño del prompt es predecible.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("context_packer")
+
+# Presupuesto de tokens del documento en el prompt de cada agente
+# (sobrescribible con CONTEXT_BUDGET_<AGENTE>, p. ej. CONTEXT_BUDGET_FINANCIAL_AGENT=8000)
+AGENT_TOKEN_BUDGETS: Dict[str, int] = {
+    "financial_agent": 6000,
+    "reputational_agent": 3000,
+    "behavioral_agent": 1500,
+}
+DEFAULT_TOKEN_BUDGET = 3000
+
+# Tamaño objetivo de una sección de texto (los párrafos se agrupan hasta este tamaño)
+SECTION_TARGET_TOKENS = 350
+
+_PAGE_MARKER = re.compile(r"^==== PÁGINA (\d+) ====$", re.MULTILINE)
+# Importes con separadores de miles (1.234.567,89 / 1,234,567.89), negativos entre
+# paréntesis, con signo de moneda ($1500) o con decimales (1500,00). Los enteros
+# sueltos (años, RUC, números de página) no cuentan. Compartido con el pre-paso de
+# densidad de tablas de pdf_ingestion_service
+AMOUNT_PATTERN = re.compile(
+    r"\(?-?\$?\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?\)?|\$\s?\d+(?:[.,]\d{1,2})?|\b\d{4,}[.,]\d{2}\b"
+)
+_WORD = re.compile(r"\w+")
+
+# Palabras clave financieras y su peso (en minúsculas, sin tildes)
+_KEYWORD_WEIGHTS: Dict[str, float] = {
+    "activo": 2.0, "activos": 2.0, "pasivo": 2.0, "pasivos": 2.0, "patrimonio": 2.0,
+    "corriente": 1.5, "ventas": 2.0, "ingresos": 1.5, "utilidad": 2.0, "ganancia": 2.0,
+    "perdida": 2.0, "costo": 1.0, "gastos": 1.0, "efectivo": 1.5, "flujo": 1.5,
+    "deuda": 2.0, "obligaciones": 1.5, "prestamo": 1.5, "prestamos": 1.5, "financieras": 1.0,
+    "liquidez": 2.0, "solvencia": 2.0, "capital": 1.0, "inventarios": 1.0, "cuentas": 0.5,
+    "cobrar": 1.0, "pagar": 1.0, "balance": 2.0, "resultados": 1.5, "situacion": 1.0,
+    "auditor": 1.5, "auditoria": 1.5, "dictamen": 1.5, "opinion": 1.0, "salvedad": 2.0,
+    "negocio": 0.5, "empresa": 0.5, "continuidad": 2.0, "riesgo": 1.5, "garantias": 1.5,
+}
+
+
+@dataclass
+class Section:
+    """Fragmento candidato a entrar en el prompt"""
+    text: str
+    order: int
+    kind: str = "text"          # text | table | header
+    page: Optional[int] = None
+    score: float = 0.0
+    tokens: int = 0
+    required: bool = False      # cabeceras que acompañan a cualquier sección del documento
+    group: Optional[str] = None
+
+
+@dataclass
+class PackResult:
+    """Resultado del empaquetado"""
+    text: str
+    tokens: int
+    budget: int
+    included: int
+    omitted: int
+    exact: bool = True          # False si los tokens son una estimación (tiktoken no disponible)
+
+
+# ===== Tokens =====
+
+@lru_cache(maxsize=4)
+def _get_encoding(model: str):
+    """Codificación de tiktoken para el modelo, o None si no está disponible (sin red, sin paquete)"""
+    if tiktoken is None:
+        logger.warning("tiktoken no está instalado; los presupuestos de tokens son una estimación por caracteres")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken no disponible ({e}); los presupuestos de tokens son una estimación por caracteres")
+        return None
+
+
+def tokens_are_exact(model: str = "gpt-4o") -> bool:
+    """True si count_tokens usa el tokenizador real del modelo (y no la estimación)"""
+    return _get_encoding(model) is not None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Tokens de un texto con el tokenizador del modelo (estimación conservadora sin tiktoken)"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # ~3,5 caracteres por token en español con muchos números: sobreestima ligeramente
+    return math.ceil(len(text) / 3.5)
+
+
+def get_token_budget(agent_id: str) -> int:
+    """Presupuesto de tokens del documento para un agente"""
+    override = os.getenv(f"CONTEXT_BUDGET_{agent_id.upper()}")
+    if override:
+        return int(override)
+    return AGENT_TOKEN_BUDGETS.get(agent_id, DEFAULT_TOKEN_BUDGET)
+
+
+# ===== Relevancia =====
+
+def _fold(text: str) -> str:
+    return text.lower().translate(str.maketrans("áéíóúüñ", "aeiouun"))
+
+
+def score_financial_relevance(text: str, kind: str = "text") -> float:
+    """
+    Relevancia financiera de una sección, independiente de su longitud
+
+    Combina la densidad ponderada de palabras clave y la proporción de líneas con
+    importes; las tablas reciben un bonus porque suelen contener los estados.
+    """
+    words = _WORD.findall(_fold(text))
+    if not words:
+        return 0.0
+    keyword_density = sum(_KEYWORD_WEIGHTS.get(word, 0.0) for word in words) / len(words)
+    lines = [line for line in text.splitlines() if line.strip()]
+    numeric_ratio = sum(1 for line in lines if AMOUNT_PATTERN.search(line)) / len(lines) if lines else 0.0
+    score = keyword_density * 4 + numeric_ratio * 2
+    if kind == "table":
+        score += 0.5
+    return round(score, 4)
+
+
+# ===== Secciones =====
+
+def _group_units(units: Iterable[str], joiner: str, model: str) -> Iterable[str]:
+    """Agrupa unidades consecutivas (párrafos o líneas) hasta SECTION_TARGET_TOKENS"""
+    current: List[str] = []
+    current_tokens = 0
+    for unit in units:
+        tokens = count_tokens(unit, model)
+        if current and current_tokens + tokens > SECTION_TARGET_TOKENS:
+            yield joiner.join(current)
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        yield joiner.join(current)
+
+
+def _chunk_paragraphs(text: str, model: str) -> Iterable[str]:
+    """Secciones de una página: párrafos agrupados; un párrafo largo se parte por líneas"""
+    units: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph, model) > SECTION_TARGET_TOKENS:
+            units.extend(_group_units(paragraph.splitlines(), "\n", model))
+        else:
+            units.append(paragraph)
+    return _group_units(units, "\n\n", model)
+
+
+def _page_blocks(text: str) -> Iterable[tuple]:
+    """(página, texto) a partir de los separadores ==== PÁGINA n ==== (página None si no hay)"""
+    markers = list(_PAGE_MARKER.finditer(text))
+    if not markers:
+        yield None, text
+        return
+    if text[:markers[0].start()].strip():
+        yield None, text[:markers[0].start()]
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        yield int(marker.group(1)), text[marker.end():end]
+
+
+def split_text_sections(text: str, start_order: int = 0, model: str = "gpt-4o",
+                        group: Optional[str] = None) -> List[Section]:
+    """Divide un texto en secciones por página y, dentro de cada página, por párrafos"""
+    sections: List[Section] = []
+    order = start_order
+    for page, block in _page_blocks(text):
+        for i, chunk in enumerate(_chunk_paragraphs(block, model)):
+            # El separador de página acompaña a la primera sección de la página
+            body = f"==== PÁGINA {page} ====\n{chunk}" if page is not None and i == 0 else chunk
+            sections.append(Section(text=body, order=order, kind="text", page=page, group=group))
+            order += 1
+    return sections
+
+
+def pack_sections(sections: List[Section], budget: int, model: str = "gpt-4o",
+                  scorer: Optional[Callable[[str, str], float]] = score_financial_relevance,
+                  separator: str = "\n\n") -> PackResult:
+    """
+    Selecciona secciones hasta `budget` tokens y las devuelve en orden de documento
+
+    Voraz por puntuación; con scorer=None se conserva el orden del documento y se
+    corta en la primera sección que no cabe (truncado por tokens en límites de
+    sección). Las secciones `required` de un grupo solo se incluyen si entra alguna
+    sección de ese grupo. El recuento final se hace sobre el texto unido, de modo
+    que nunca se supera el presupuesto.
+    """
+    sep_tokens = count_tokens(separator, model)
+    for section in sections:
+        section.tokens = count_tokens(section.text, model) + sep_tokens
+        if scorer is not None and not section.required:
+            section.score = scorer(section.text, section.kind)
+
+    headers = {s.group: s for s in sections if s.required}
+    candidates = [s for s in sections if not s.required]
+    if scorer is not None:
+        candidates.sort(key=lambda s: (-s.score, s.order))
+
+    selected: Dict[int, Section] = {}
+    used = 0
+    for section in candidates:
+        cost = section.tokens
+        header = headers.get(section.group)
+        if header is not None and header.order not in selected:
+            cost += header.tokens
+        if used + cost > budget:
+            if scorer is None:
+                break
+            continue
+        if header is not None:
+            selected[header.order] = header
+        selected[section.order] = section
+        used += cost
+
+    def render(chosen: Dict[int, Section]) -> str:
+        return separator.join(chosen[order].text for order in sorted(chosen))
+
+    text = render(selected)
+    tokens = count_tokens(text, model)
+    # Las fronteras entre secciones pueden tokenizarse distinto: ajustar quitando las peores
+    while tokens > budget and selected:
+        worst = min((s for s in selected.values() if not s.required),
+                    key=lambda s: (s.score, -s.order), default=None)
+        if worst is None:
+            break
+        del selected[worst.order]
+        remaining_groups = {s.group for s in selected.values() if not s.required}
+        selected = {k: s for k, s in selected.items() if not s.required or s.group in remaining_groups}
+        text = render(selected)
+        tokens = count_tokens(text, model)
+
+    included = sum(1 for s in selected.values() if not s.required)
+    return PackResult(text=text, tokens=tokens, budget=budget, included=included,
+                      omitted=len(candidates) - included, exact=tokens_are_exact(model))
+
+
+def pack_text(text: str, budget: int, model: str = "gpt-4o", relevance: bool = True) -> PackResult:
+    """
+    Empaqueta un texto libre en `budget` tokens
+
+    Con relevance=False (comentarios, referencias) se conserva el orden y se corta
+    en el límite de sección que cabe en el presupuesto.
+    """
+    tokens = count_tokens(text, model)
+    if tokens <= budget:
+        return PackResult(text=text, tokens=tokens, budget=budget, included=1, omitted=0,
+                          exact=tokens_are_exact(model))
+    sections = split_text_sections(text, model=model)
+    result = pack_sections(sections, budget, model, score_financial_relevance if relevance else None)
+    if not result.included and sections:
+        # Ninguna sección cabe entera (p. ej. una sola línea enorme): cortar la primera
+        truncated = truncate_to_tokens(sections[0].text, budget, model)
+        return PackResult(text=truncated, tokens=count_tokens(truncated, model), budget=budget,
+                          included=1, omitted=len(sections) - 1, exact=tokens_are_exact(model))
+    return result
+
+
+def truncate_to_tokens(text: str, budget: int, model: str = "gpt-4o") -> str:
+    """Prefijo de text que ocupa como mucho budget tokens"""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    return text[:int(budget * 3.5)]
+
+
+def pack_parsed_documents(parsed: Dict[str, Any], budget: int, model: str = "gpt-4o",
+                          max_rows_per_table: int = 60,
+                          table_renderer: Optional[Callable[..., str]] = None) -> PackResult:
+    """
+    Empaqueta la salida de parse_financial_pdfs: texto y tablas de todos los documentos
+
+    Cada documento aporta una cabecera (requerida si entra alguna de sus secciones),
+    sus secciones de texto y una sección por tabla renderizada con table_renderer.
+    """
+    sections: List[Section] = []
+    order = 0
+    for doc_index, statement in enumerate(parsed.get("statements", [])):
+        group = f"doc{doc_index}"
+        sections.append(Section(text=f"===== DOCUMENTO: {statement.get('filename', '')} =====",
+                                order=order, kind="header", required=True, group=group))
+        order += 1
+        text_sections = split_text_sections(statement.get("text", "").strip(), order, model, group)
+        sections.extend(text_sections)
+        order += len(text_sections)
+        for table_index, table in enumerate(statement.get("tables", []), start=1):
+            rows = table.get("rows", [])
+            rendered = table_renderer(rows, max_rows=max_rows_per_table) if table_renderer else \
+                "\n".join(" | ".join((c or "").strip() for c in row) for row in rows[:max_rows_per_table])
+            if not rendered:
+                continue
+            body = f"Tabla {table_index} (página {table.get('page', '?')}):\n{rendered}"
+            sections.append(Section(text=body, order=order, kind="table", page=table.get("page"), group=group))
+            order += 1
+    return pack_sections(sections, budget, model)
@@ -0,0 +1,280 @@
+"""
+Evaluation Cache
+Caché read-through delante de cualquier EvaluationStorage
+- Lecturas por evaluation_id (evaluación, resultados de agentes, scoring, simulaciones)
+- Invalidación por las escrituras del propio servicio y TTL corto como red de seguridad
+  para escrituras de otros procesos
+- Las evaluaciones completadas son inmutables: la evaluación, los resultados de agentes
+  y el scoring no caducan (solo LRU); las simulaciones se añaden después de completarse
+  y siguen siempre el TTL
+- Ratios de acierto por método en get_cache_stats() y en health_check()
+
+Los paneles consultan get_evaluation_status de forma continua: con la caché, cada
+sondeo de una evaluación en curso cuesta como mucho una ida a la base por TTL.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .storage_backend import (
+    AgentResult,
+    EvaluationBundle,
+    EvaluationPage,
+    EvaluationStorage,
+    RiskEvaluation,
+    ScenarioSimulation,
+    ScoringDetail,
+)
+
+CacheKey = Tuple[str, str]
+
+CACHED_READS = (
+    "get_risk_evaluation",
+    "get_agent_results_by_evaluation",
+    "get_scoring_details",
+    "get_scenario_simulations",
+)
+
+# Lecturas que no cambian una vez completada la evaluación
+PINNABLE_READS = (
+    "get_risk_evaluation",
+    "get_agent_results_by_evaluation",
+    "get_scoring_details",
+)
+
+FINAL_STATUSES = ("completed",)
+
+
+class CachedEvaluationStorage(EvaluationStorage):
+    """
+    EvaluationStorage con caché de lectura en memoria (LRU + TTL)
+
+    Los valores se devuelven tal cual (dataclasses y listas compartidas), por lo que
+    los consumidores no deben modificarlos. Los resultados vacíos (None o []) se
+    cachean con el TTL normal (una evaluación en curso aún sin resultados) y nunca se
+    fijan. Una lectura fallida (excepción, o read_failures del backend incrementado
+    durante la lectura) no se guarda.
+    """
+
+    def __init__(self, backend: EvaluationStorage, ttl_seconds: float = 10.0, max_entries: int = 4096):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.logger = logging.getLogger(__name__)
+        # (método, evaluation_id) -> (valor, instante de caducidad o None si no caduca)
+        self._entries: "OrderedDict[CacheKey, Tuple[Any, Optional[float]]]" = OrderedDict()
+        # Contador de escrituras: una lectura que se cruza con cualquier invalidación no se
+        # guarda (a lo sumo se pierde un acierto, nunca se cachea un valor ya obsoleto)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {method: {"hits": 0, "misses": 0} for method in CACHED_READS}
+        self.stats.update({"invalidations": 0, "expirations": 0, "evictions": 0})
+
+    @property
+    def connection_pool(self):
+        return self.backend.connection_pool
+
+    def __getattr__(self, name: str):
+        # Atributos propios del backend (config, describe, path...)
+        if name == "backend":
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    # Cached reads
+
+    def get_risk_evaluation(self, evaluation_id: str) -> Optional[RiskEvaluation]:
+        return self._read("get_risk_evaluation", evaluation_id, self.backend.get_risk_evaluation)
+
+    def get_agent_results_by_evaluation(self, evaluation_id: str) -> List[AgentResult]:
+        return self._read("get_agent_results_by_evaluation", evaluation_id,
+                          self.backend.get_agent_results_by_evaluation)
+
+    def get_scoring_details(self, evaluation_id: str) -> Optional[ScoringDetail]:
+        return self._read("get_scoring_details", evaluation_id, self.backend.get_scoring_details)
+
+    def get_scenario_simulations(self, evaluation_id: str) -> List[ScenarioSimulation]:
+        return self._read("get_scenario_simulations", evaluation_id, self.backend.get_scenario_simulations)
+
+    # Writes (delegan e invalidan la evaluación afectada)
+
+    def create_risk_evaluation(self, evaluation: RiskEvaluation) -> bool:
+        try:
+            return self.backend.create_risk_evaluation(evaluation)
+        finally:
+            self.invalidate(evaluation.evaluation_id)
+
+    def update_risk_evaluation_status(self, evaluation_id: str, status: str,
+                                      final_score: float = None,
+                                      risk_level: str = None,
+                                      confidence_score: float = None) -> bool:
+        try:
+            return self.backend.update_risk_evaluation_status(evaluation_id, status, final_score,
+                                                              risk_level, confidence_score)
+        finally:
+            self.invalidate(evaluation_id)
+
+    def save_agent_result(self, result: AgentResult) -> bool:
+        try:
+            return self.backend.save_agent_result(result)
+        finally:
+            self.invalidate(result.evaluation_id)
+
+    def save_scoring_details(self, scoring: ScoringDetail) -> bool:
+        try:
+            return self.backend.save_scoring_details(scoring)
+        finally:
+            self.invalidate(scoring.evaluation_id)
+
+    def save_scenario_simulation(self, simulation: ScenarioSimulation) -> bool:
+        try:
+            return self.backend.save_scenario_simulation(simulation)
+        finally:
+            self.invalidate(simulation.evaluation_id)
+
+    def save_evaluation_bundle(self, evaluation: RiskEvaluation,
+                               agent_results: Optional[List[AgentResult]] = None,
+                               scoring: Optional[ScoringDetail] = None) -> bool:
+        try:
+            return self.backend.save_evaluation_bundle(evaluation, agent_results, scoring)
+        finally:
+            self.invalidate(evaluation.evaluation_id)
+
+    def save_evaluation_bundles(self, bundles: List[EvaluationBundle]) -> bool:
+        try:
+            return self.backend.save_evaluation_bundles(bundles)
+        finally:
+            for bundle in bundles:
+                self.invalidate(bundle.evaluation.evaluation_id)
+
+    # History and Portfolio (listados paginados: sin caché)
+
+    def get_company_history(self, company_id: str, limit: int = 50,
+                            cursor: Optional[str] = None) -> EvaluationPage:
+        return self.backend.get_company_history(company_id, limit, cursor)
+
+    def list_evaluations(self, risk_level: Optional[str] = None,
+                         start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         limit: int = 50, cursor: Optional[str] = None) -> EvaluationPage:
+        return self.backend.list_evaluations(risk_level, start_date, end_date, limit, cursor)
+
+    def get_score_trend(self, company_id: str, limit: int = 24) -> List[Dict[str, Any]]:
+        return self.backend.get_score_trend(company_id, limit)
+
+    # Analytics and Health
+
+    def get_evaluation_statistics(self) -> Dict[str, Any]:
+        return self.backend.get_evaluation_statistics()
+
+    def get_statistics_series(self, days: int = 30) -> Dict[str, Any]:
+        return self.backend.get_statistics_series(days)
+
+    def health_check(self) -> Dict[str, Any]:
+        status = self.backend.health_check()
+        status["cache"] = self.get_cache_stats()
+        return status
+
+    # Cache management
+
+    def invalidate(self, evaluation_id: str) -> None:
+        """Descarta todas las entradas de una evaluación"""
+        with self._lock:
+            self._generation += 1
+            for method in CACHED_READS:
+                if self._entries.pop((method, evaluation_id), None) is not None:
+                    self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {}
+            total_hits = total_misses = 0
+            for method in CACHED_READS:
+                hits, misses = self.stats[method]["hits"], self.stats[method]["misses"]
+                total_hits += hits
+                total_misses += misses
+                methods[method] = {"hits": hits, "misses": misses,
+                                   "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": total_hits,
+                "misses": total_misses,
+                "hit_ratio": round(total_hits / (total_hits + total_misses), 4) if total_hits + total_misses else 0.0,
+                "invalidations": self.stats["invalidations"],
+                "expirations": self.stats["expirations"],
+                "evictions": self.stats["evictions"],
+                "methods": methods
+            }
+
+    # Internos
+
+    def _read(self, method: str, evaluation_id: str, load: Callable[[str], Any]) -> Any:
+        key = (method, evaluation_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats[method]["hits"] += 1
+                    return value
+                del self._entries[key]
+                self.stats["expirations"] += 1
+            self.stats[method]["misses"] += 1
+            generation = self._generation
+            # Solo se fija lo leído cuando la evaluación ya constaba como completada
+            # antes de la lectura (una lectura anterior podría ser de una evaluación en curso)
+            final = method in PINNABLE_READS and self._is_final_locked(evaluation_id, None)
+
+        failures = getattr(self.backend, "read_failures", 0)
+        value = load(evaluation_id)
+        if getattr(self.backend, "read_failures", 0) != failures:
+            # Error de la base (el backend devuelve None o []): no es un dato cacheable
+            return value
+
+        with self._lock:
+            if self._generation != generation:
+                return value
+            if method == "get_risk_evaluation":
+                final = self._is_final_locked(evaluation_id, value)
+                if final:
+                    self._settle_locked(evaluation_id)
+            # Un vacío puede ser un error no contabilizado: siempre con TTL
+            final = final and value is not None and value != []
+            self._entries[key] = (value, None if final else time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        return value
+
+    def _is_final_locked(self, evaluation_id: str, evaluation: Optional[RiskEvaluation]) -> bool:
+        """True si la evaluación está completada (ya no cambia)"""
+        if evaluation is None:
+            entry = self._entries.get(("get_risk_evaluation", evaluation_id))
+            evaluation = entry[0] if entry is not None else None
+        return evaluation is not None and evaluation.status in FINAL_STATUSES
+
+    def _settle_locked(self, evaluation_id: str) -> None:
+        """
+        Al ver una evaluación completada se descartan sus demás entradas con TTL
+
+        Pudieron leerse mientras estaba en curso (p. ej. resultados aún vacíos); la
+        siguiente lectura las recarga y, ya completada, no caducan.
+        """
+        for method in PINNABLE_READS:
+            key = (method, evaluation_id)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None:
+                del self._entries[key]
@@ -0,0 +1,424 @@
+"""
+Evaluation Write-Behind
+Persistencia en segundo plano de evaluaciones completadas
+- enqueue() no bloquea: la respuesta al usuario nunca espera a la base de datos
+- Un hilo agrupa las evaluaciones en lotes (save_evaluation_bundles, una transacción)
+- Reintentos con backoff exponencial; si la base sigue sin responder el lote va a un
+  archivo de spill local (JSONL) que se reprocesa al arrancar y periódicamente
+- Si un lote falla con la base accesible se divide por mitades: una evaluación que
+  nunca puede escribirse (datos inválidos) no arrastra al resto del lote
+- Las entradas del spill que fallan demasiadas veces pasan a <spill>.failed
+
+Configuración por entorno (StorageConfig):
+- EVALUATION_WRITE_BEHIND: "true" para activarlo (por defecto desactivado)
+- EVALUATION_SPILL_PATH: archivo de spill (por defecto data/evaluation_spill.jsonl)
+- EVALUATION_WRITE_BEHIND_BATCH: evaluaciones por lote (por defecto 25)
+- EVALUATION_WRITE_BEHIND_QUEUE: capacidad de la cola en memoria (por defecto 1000)
+- EVALUATION_WRITE_BEHIND_INTERVAL: espera máxima para completar un lote, en segundos
+- EVALUATION_WRITE_BEHIND_RETRIES: reintentos de un lote antes de ir al spill
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config.azure_config import StorageConfig
+from .storage_backend import (
+    AgentResult,
+    EvaluationBundle,
+    EvaluationStorage,
+    RiskEvaluation,
+    ScoringDetail,
+    create_evaluation_storage,
+)
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FIELDS = ("created_date", "completed_date")
+
+# Intentos de reproceso de una entrada del spill antes de apartarla a <spill>.failed
+MAX_SPILL_ATTEMPTS = 10
+
+
+def bundle_to_dict(bundle: EvaluationBundle) -> Dict[str, Any]:
+    """Forma serializable (JSON) de un EvaluationBundle"""
+    def encode(record) -> Dict[str, Any]:
+        return {key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in asdict(record).items()}
+
+    return {
+        "evaluation": encode(bundle.evaluation),
+        "agent_results": [encode(result) for result in bundle.agent_results],
+        "scoring": encode(bundle.scoring) if bundle.scoring else None
+    }
+
+
+def bundle_from_dict(data: Dict[str, Any]) -> EvaluationBundle:
+    """Inversa de bundle_to_dict"""
+    def decode(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: datetime.fromisoformat(value) if key in DATETIME_FIELDS and isinstance(value, str) else value
+                for key, value in record.items()}
+
+    return EvaluationBundle(
+        evaluation=RiskEvaluation(**decode(data["evaluation"])),
+        agent_results=[AgentResult(**decode(result)) for result in data.get("agent_results", [])],
+        scoring=ScoringDetail(**decode(data["scoring"])) if data.get("scoring") else None
+    )
+
+
+class EvaluationWriteBehind:
+    """
+    Cola write-behind delante de un EvaluationStorage
+
+    El almacenamiento se crea de forma perezosa en el hilo de escritura con
+    storage_factory, así que una base caída (o un driver ausente) no afecta a quien
+    encola: el lote acaba en el spill y se reprocesa cuando la base vuelve.
+    """
+
+    def __init__(self, storage_factory: Callable[[], EvaluationStorage],
+                 spill_path: Optional[str] = None, batch_size: int = 25,
+                 max_queue: int = 1000, flush_interval: float = 0.5,
+                 max_retries: int = 3, retry_backoff: float = 1.0,
+                 replay_interval: float = 60.0):
+        self.storage_factory = storage_factory
+        self.spill_path = spill_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.replay_interval = replay_interval
+
+        self._queue: "queue.Queue[EvaluationBundle]" = queue.Queue(maxsize=max(1, max_queue))
+        self._storage: Optional[EvaluationStorage] = None
+        self._stop = threading.Event()
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._next_replay = 0.0
+        self.stats = {
+            "enqueued": 0,
+            "persisted": 0,
+            "batches": 0,
+            "retries": 0,
+            "failed_batches": 0,
+            "split_batches": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "dead_lettered": 0
+        }
+
+    def start(self) -> "EvaluationWriteBehind":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="evaluation-write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def enqueue(self, bundle: EvaluationBundle) -> bool:
+        """
+        Encola una evaluación completa sin bloquear
+
+        Con la cola llena (base lenta o caída) la evaluación va directamente al spill.
+        Devuelve False solo si no pudo encolarse ni guardarse en el spill.
+        """
+        try:
+            self._queue.put_nowait(bundle)
+        except queue.Full:
+            logger.warning(f"Write-behind queue full, spilling {bundle.evaluation.evaluation_id}")
+            return self._spill([bundle])
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Espera a que la cola se vacíe (persistida o en el spill); False si vence el tiempo"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Detiene el hilo; lo que no llegue a persistirse queda en el spill"""
+        self._stop.set()
+        stopped = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+            stopped = not self._thread.is_alive()
+        # Lo que quede en la cola (hilo detenido o bloqueado en la base) se guarda en el spill
+        remaining = self._drain(self._queue.qsize())
+        if remaining:
+            self._spill(remaining)
+            self._done(len(remaining))
+        if stopped:
+            self._thread = None
+            storage, self._storage = self._storage, None
+            pool = getattr(storage, "connection_pool", None)
+            if pool is not None:
+                pool.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update({
+            "queued": self._queue.qsize(),
+            "running": self._thread is not None and self._thread.is_alive(),
+            "spill_path": self.spill_path,
+            "spill_pending": self._spill_exists()
+        })
+        return stats
+
+    # Hilo de escritura
+
+    def _run(self) -> None:
+        self._safe_replay()
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                try:
+                    failed = self._persist(batch)
+                finally:
+                    self._done(len(batch))
+                if failed:
+                    continue
+            if time.monotonic() >= self._next_replay and self._spill_exists():
+                self._safe_replay()
+
+    def _safe_replay(self) -> None:
+        try:
+            self._replay_spill()
+        except Exception as e:
+            logger.error(f"Write-behind spill replay failed: {e}")
+
+    def _next_batch(self) -> List[EvaluationBundle]:
+        """Espera la primera evaluación hasta flush_interval y completa el lote sin esperar"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        batch.extend(self._drain(self.batch_size - 1))
+        return batch
+
+    def _drain(self, limit: int) -> List[EvaluationBundle]:
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _done(self, count: int) -> None:
+        for _ in range(count):
+            self._queue.task_done()
+
+    def _persist(self, batch: List[EvaluationBundle], spill_on_failure: bool = True) -> List[EvaluationBundle]:
+        """
+        Guarda un lote con reintentos y devuelve las evaluaciones que no pudieron guardarse
+
+        Si el lote sigue fallando pero la base responde, se divide por mitades hasta
+        aislar las evaluaciones defectuosas; solo esas van al spill.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self._save(batch):
+                return []
+            if attempt == self.max_retries or self._stop.is_set():
+                break
+            self._count("retries")
+            self._stop.wait(self.retry_backoff * (2 ** attempt))
+
+        failed = batch
+        if len(batch) > 1 and not self._stop.is_set() and self._storage_reachable():
+            self._count("split_batches")
+            middle = len(batch) // 2
+            failed = self._bisect(batch[:middle]) + self._bisect(batch[middle:])
+
+        self._count("failed_batches")
+        # Tras un fallo no se reprocesa el spill hasta pasado replay_interval
+        self._next_replay = time.monotonic() + self.replay_interval
+        if spill_on_failure:
+            self._spill(failed)
+        return failed
+
+    def _save(self, batch: List[EvaluationBundle]) -> bool:
+        """Un intento de guardar el lote en una transacción"""
+        storage = self._get_storage()
+        try:
+            saved = storage is not None and storage.save_evaluation_bundles(batch)
+        except Exception as e:
+            logger.error(f"Write-behind batch failed: {e}")
+            saved = False
+        if saved:
+            self._count("persisted", len(batch))
+            self._count("batches")
+        return saved
+
+    def _bisect(self, batch: List[EvaluationBundle]) -> List[EvaluationBundle]:
+        """Guarda un sublote o, si falla, cada mitad por separado; devuelve las que fallan"""
+        if self._save(batch):
+            return []
+        if len(batch) == 1 or self._stop.is_set():
+            return batch
+        middle = len(batch) // 2
+        return self._bisect(batch[:middle]) + self._bisect(batch[middle:])
+
+    def _storage_reachable(self) -> bool:
+        """True si la base responde (el fallo del lote es de sus datos, no de la conexión)"""
+        storage = self._get_storage()
+        try:
+            return storage is not None and storage.health_check().get("status") == "healthy"
+        except Exception:
+            return False
+
+    def _get_storage(self) -> Optional[EvaluationStorage]:
+        if self._storage is None:
+            try:
+                self._storage = self.storage_factory()
+            except Exception as e:
+                logger.error(f"Write-behind storage unavailable: {e}")
+                return None
+        return self._storage
+
+    # Spill
+
+    def _spill_exists(self) -> bool:
+        return bool(self.spill_path) and (os.path.exists(self.spill_path)
+                                          or os.path.exists(self.spill_path + ".replaying"))
+
+    def _spill(self, bundles: List[EvaluationBundle], attempts: int = 0) -> bool:
+        """Añade evaluaciones al spill (una línea JSON por evaluación)"""
+        if not self.spill_path:
+            logger.error(f"Write-behind dropped {len(bundles)} evaluations (no spill path)")
+            return False
+        lines = "".join(json.dumps({"attempts": attempts, "bundle": bundle_to_dict(bundle)},
+                                   ensure_ascii=False) + "\n" for bundle in bundles)
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Write-behind could not spill {len(bundles)} evaluations: {e}")
+            return False
+        self._count("spilled", len(bundles))
+        return True
+
+    def _replay_spill(self) -> None:
+        """
+        Reprocesa el spill en lotes
+
+        El archivo se renombra a <spill>.replaying antes de leerlo, de modo que los
+        nuevos spills van a un archivo nuevo; si el proceso muere a mitad, el
+        .replaying se retoma en el siguiente arranque (las escrituras son idempotentes).
+        """
+        self._next_replay = time.monotonic() + self.replay_interval
+        if not self.spill_path:
+            return
+        replaying = self.spill_path + ".replaying"
+        with self._spill_lock:
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replaying)
+
+        entries = []
+        with open(replaying, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    entries.append((entry.get("attempts", 0), bundle_from_dict(entry["bundle"]), line))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Unreadable write-behind spill entry: {e}")
+                    self._dead_letter([line])
+
+        if entries:
+            logger.info(f"Replaying {len(entries)} spilled evaluations")
+        for start in range(0, len(entries), self.batch_size):
+            chunk = entries[start:start + self.batch_size]
+            if self._stop.is_set():
+                self._respill(entries[start:])
+                break
+            failed = self._persist([bundle for _, bundle, _ in chunk], spill_on_failure=False)
+            self._count("replayed", len(chunk) - len(failed))
+            if failed:
+                failed_ids = {id(bundle) for bundle in failed}
+                self._respill([entry for entry in chunk if id(entry[1]) in failed_ids])
+                if len(failed) == len(chunk) and not self._storage_reachable():
+                    # Base caída: el resto espera al siguiente reproceso
+                    self._respill(entries[start + self.batch_size:])
+                    break
+        os.remove(replaying)
+
+    def _respill(self, entries) -> None:
+        """Devuelve al spill las entradas no reprocesadas, con un intento más"""
+        failed = [line for attempts, _, line in entries if attempts + 1 >= MAX_SPILL_ATTEMPTS]
+        if failed:
+            self._dead_letter(failed)
+        for attempts, bundle, _ in entries:
+            if attempts + 1 < MAX_SPILL_ATTEMPTS:
+                self._spill([bundle], attempts + 1)
+
+    def _dead_letter(self, lines: List[str]) -> None:
+        try:
+            with self._spill_lock:
+                with open(self.spill_path + ".failed", "a", encoding="utf-8") as f:
+                    f.writelines(line if line.endswith("\n") else line + "\n" for line in lines)
+        except OSError as e:
+            logger.error(f"Write-behind could not write dead letters: {e}")
+            return
+        self._count("dead_lettered", len(lines))
+        logger.error(f"{len(lines)} spilled evaluations moved to {self.spill_path}.failed")
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+
+_write_behind: Optional[EvaluationWriteBehind] = None
+_write_behind_lock = threading.Lock()
+
+
+def get_evaluation_write_behind(config: Optional[StorageConfig] = None) -> Optional[EvaluationWriteBehind]:
+    """
+    Cola write-behind compartida por el proceso (None si EVALUATION_WRITE_BEHIND no está activo)
+
+    Es única para que todas las instancias de AzureOrchestrator compartan hilo, lotes y spill.
+    """
+    global _write_behind
+    with _write_behind_lock:
+        if _write_behind is None:
+            config = config or StorageConfig.from_env()
+            if not config.write_behind_enabled:
+                return None
+            # Sin caché: el hilo solo escribe
+            _write_behind = EvaluationWriteBehind(
+                lambda: create_evaluation_storage(storage_config=config, cached=False),
+                spill_path=config.write_behind_spill_path,
+                batch_size=config.write_behind_batch_size,
+                max_queue=config.write_behind_max_queue,
+                flush_interval=config.write_behind_flush_interval,
+                max_retries=config.write_behind_max_retries
+            ).start()
+        return _write_behind
+
+
+def shutdown_evaluation_write_behind(timeout: float = 10.0) -> None:
+    """Detiene la cola compartida; lo pendiente queda en el spill"""
+    global _write_behind
+    with _write_behind_lock:
+        write_behind, _write_behind = _write_behind, None
+    if write_behind is not None:
+        write_behind.close(timeout)
+
+
+atexit.register(shutdown_evaluation_write_behind)
@@ -0,0 +1,427 @@
+"""
+Extractor estructurado de estados financieros SCVS
+- Reconoce partidas del Estado de Situación Financiera y del Estado de Resultados
+  por código de cuenta NIIF (plan de cuentas SCVS: 1, 101, 10101, 2, 201, ...) o
+  por su denominación
+- Interpreta importes en formato ecuatoriano (1.234.567,89) y anglosajón
+- Calcula localmente los indicadores financieros (liquidez, endeudamiento,
+  márgenes, crecimiento interanual) para el prompt del FinancialAgent y el
+  scoring determinista
+
+Entrada: el texto consolidado (una partida por línea, como lo producen
+pdf_ingestion_service y build_financial_text_from_parsed) o las filas de una tabla.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+# ===== Esquema =====
+
+
+class StatementLineItem(BaseModel):
+    """Partida reconocida en un estado financiero"""
+    code: Optional[str] = Field(description="Código de cuenta NIIF normalizado (solo dígitos)", default=None)
+    account: str = Field(description="Denominación de la cuenta tal como aparece en el documento")
+    field: Optional[str] = Field(description="Campo del esquema al que se asignó la partida", default=None)
+    values: Dict[str, float] = Field(description="Importe por periodo", default_factory=dict)
+
+
+class FinancialFigures(BaseModel):
+    """Cifras clave de un periodo"""
+    period: str = Field(description="Periodo (año) de las cifras")
+    activo_total: Optional[float] = None
+    activo_corriente: Optional[float] = None
+    efectivo: Optional[float] = None
+    inventarios: Optional[float] = None
+    activo_no_corriente: Optional[float] = None
+    pasivo_total: Optional[float] = None
+    pasivo_corriente: Optional[float] = None
+    pasivo_no_corriente: Optional[float] = None
+    patrimonio: Optional[float] = None
+    ventas: Optional[float] = None
+    costo_ventas: Optional[float] = None
+    gastos: Optional[float] = None
+    utilidad_bruta: Optional[float] = None
+    utilidad_neta: Optional[float] = None
+
+
+class FinancialRatios(BaseModel):
+    """Indicadores financieros de un periodo (None si faltan las cifras necesarias)"""
+    period: str = Field(description="Periodo (año) de los indicadores")
+    razon_corriente: Optional[float] = Field(description="Activo corriente / pasivo corriente", default=None)
+    prueba_acida: Optional[float] = Field(description="(Activo corriente - inventarios) / pasivo corriente", default=None)
+    deuda_patrimonio: Optional[float] = Field(description="Pasivo total / patrimonio", default=None)
+    endeudamiento_activo: Optional[float] = Field(description="Pasivo total / activo total", default=None)
+    margen_bruto: Optional[float] = Field(description="(Ventas - costo de ventas) / ventas", default=None)
+    margen_neto: Optional[float] = Field(description="Utilidad neta / ventas", default=None)
+    roe: Optional[float] = Field(description="Utilidad neta / patrimonio", default=None)
+    roa: Optional[float] = Field(description="Utilidad neta / activo total", default=None)
+    crecimiento_ventas: Optional[float] = Field(description="Variación interanual de las ventas", default=None)
+    crecimiento_utilidad: Optional[float] = Field(description="Variación interanual de la utilidad neta", default=None)
+
+
+class StructuredFinancials(BaseModel):
+    """Resultado del extractor: cifras y ratios por periodo, del más reciente al más antiguo"""
+    periods: List[FinancialFigures] = Field(default_factory=list)
+    ratios: List[FinancialRatios] = Field(default_factory=list)
+    line_items: List[StatementLineItem] = Field(default_factory=list)
+
+    def has_core_figures(self) -> bool:
+        """True si hay cifras suficientes para sustituir el texto en el prompt"""
+        if not self.periods:
+            return False
+        latest = self.periods[0]
+        core = [latest.activo_corriente, latest.pasivo_corriente, latest.patrimonio,
+                latest.ventas, latest.utilidad_neta, latest.activo_total, latest.pasivo_total]
+        return sum(value is not None for value in core) >= 3
+
+    def latest_ratios(self) -> Optional[FinancialRatios]:
+        return self.ratios[0] if self.ratios else None
+
+
+# ===== Mapeo de cuentas =====
+
+# Códigos del plan de cuentas SCVS (formulario de estados financieros NIIF)
+ACCOUNT_CODES: Dict[str, str] = {
+    "1": "activo_total",
+    "101": "activo_corriente",
+    "10101": "efectivo",
+    "10103": "inventarios",
+    "102": "activo_no_corriente",
+    "2": "pasivo_total",
+    "201": "pasivo_corriente",
+    "202": "pasivo_no_corriente",
+    "3": "patrimonio",
+    "401": "ventas",
+    "501": "costo_ventas",
+    "502": "gastos",
+    "707": "utilidad_neta",
+}
+
+# Denominaciones (sin tildes, en mayúsculas) para partidas sin código
+_ACCOUNT_LABELS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"^(TOTAL )?ACTIVOS? CORRIENTES?$"), "activo_corriente"),
+    (re.compile(r"^(TOTAL )?ACTIVOS? NO CORRIENTES?$"), "activo_no_corriente"),
+    (re.compile(r"^(TOTAL (DEL |DE )?)?ACTIVOS?$"), "activo_total"),
+    (re.compile(r"^EFECTIVO Y EQUIVALENTES"), "efectivo"),
+    (re.compile(r"^INVENTARIOS?$"), "inventarios"),
+    (re.compile(r"^(TOTAL )?PASIVOS? CORRIENTES?$"), "pasivo_corriente"),
+    (re.compile(r"^(TOTAL )?PASIVOS? NO CORRIENTES?$"), "pasivo_no_corriente"),
+    (re.compile(r"^(TOTAL (DEL |DE )?)?PASIVOS?$"), "pasivo_total"),
+    (re.compile(r"^(TOTAL (DEL )?)?PATRIMONIO( NETO)?$"), "patrimonio"),
+    (re.compile(r"^(INGRESOS DE ACTIVIDADES ORDINARIAS|VENTAS( NETAS)?|INGRESOS POR VENTAS)$"), "ventas"),
+    (re.compile(r"^COSTO (DE (LAS )?)?VENTAS"), "costo_ventas"),
+    (re.compile(r"^(GANANCIA|UTILIDAD) BRUTA$"), "utilidad_bruta"),
+    (re.compile(r"^(GANANCIA|UTILIDAD) (\(PERDIDA\) )?NETA|^RESULTADO NETO"), "utilidad_neta"),
+]
+
+# Códigos SCVS en forma punteada ('1', '1.01', '1.01.01'); sin puntos solo se aceptan
+# los códigos conocidos, para no confundir años o importes ('2023', '1500') con códigos
+_CODE_TOKEN = re.compile(r"^\d(?:\.\d{1,2})*$")
+_YEAR_TOKEN = re.compile(r"^(19|20)\d{2}$")
+_AMOUNT_TOKEN = re.compile(r"^\(?[-−]?\$?\d[\d.,]*\)?$")
+_DASH_TOKENS = {"-", "—", "–"}
+
+
+def normalize_account_code(code: str) -> Optional[str]:
+    """Normaliza un código NIIF: '1.01.01' -> '10101', '101' -> '101'; None si no es un código"""
+    code = code.strip().rstrip(".")
+    if _CODE_TOKEN.match(code):
+        return code.replace(".", "")
+    if code in ACCOUNT_CODES:
+        return code
+    return None
+
+
+def _fold(text: str) -> str:
+    """Mayúsculas sin tildes y con espacios simples, para comparar denominaciones"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.upper().replace(":", " ").split())
+
+
+def classify_account(code: Optional[str], account: str) -> Optional[str]:
+    """Campo del esquema de una partida, por código o, si no lo hay, por denominación"""
+    if code and code in ACCOUNT_CODES:
+        return ACCOUNT_CODES[code]
+    label = _fold(account)
+    for pattern, field in _ACCOUNT_LABELS:
+        if pattern.search(label):
+            return field
+    return None
+
+
+def parse_amount(token: str) -> Optional[float]:
+    """
+    Interpreta un importe en formato ecuatoriano (1.234.567,89) o anglosajón (1,234,567.89)
+
+    Los paréntesis o el signo menos indican negativo; un guion aislado es cero.
+    Con un solo separador seguido de tres dígitos se asume separador de miles.
+    """
+    token = token.strip()
+    if token in _DASH_TOKENS:
+        return 0.0
+    if not _AMOUNT_TOKEN.match(token):
+        return None
+    negative = token.startswith("(") and token.endswith(")")
+    digits = token.strip("()").replace("$", "").replace("−", "-")
+    if digits.startswith("-"):
+        negative = True
+        digits = digits[1:]
+    if not digits or not digits[0].isdigit():
+        return None
+
+    if "." in digits and "," in digits:
+        decimal = "." if digits.rfind(".") > digits.rfind(",") else ","
+    elif "." in digits or "," in digits:
+        separator = "." if "." in digits else ","
+        parts = digits.split(separator)
+        thousands = len(parts) > 2 or len(parts[-1]) == 3
+        decimal = None if thousands else separator
+    else:
+        decimal = None
+
+    if decimal is None:
+        normalized = digits.replace(".", "").replace(",", "")
+    else:
+        thousands_sep = "," if decimal == "." else "."
+        normalized = digits.replace(thousands_sep, "").replace(decimal, ".")
+    try:
+        value = float(normalized)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+# ===== Extracción =====
+
+def _split_row(cells: Sequence[str]) -> Optional[Tuple[Optional[str], str, List[float], List[str]]]:
+    """
+    Separa una fila en (código, cuenta, importes, tokens de importe)
+
+    Los importes son los tokens numéricos del final de la fila; el código, un
+    token numérico inicial seguido de texto.
+    """
+    tokens = [token for cell in cells for token in (cell or "").split()]
+    amounts: List[float] = []
+    amount_tokens: List[str] = []
+    while tokens:
+        value = parse_amount(tokens[-1])
+        if value is None:
+            break
+        amounts.insert(0, value)
+        amount_tokens.insert(0, tokens.pop())
+    if not amounts or not tokens:
+        return None
+
+    code = normalize_account_code(tokens[0]) if len(tokens) > 1 else None
+    label_tokens = tokens[1:] if code else tokens
+    account = " ".join(label_tokens)
+    if not re.search(r"[A-Za-zÁÉÍÓÚÑáéíóúñ]", account):
+        return None
+    return code, account, amounts, amount_tokens
+
+
+def _header_periods(cells: Sequence[str]) -> Optional[List[str]]:
+    """Años de una fila de encabezado ('Código Cuenta 2023 2022'), o None"""
+    tokens = [token for cell in cells for token in (cell or "").split()]
+    years = [token for token in tokens if _YEAR_TOKEN.match(token)]
+    if not years or tokens[-len(years):] != years:
+        return None
+    # Un encabezado es corto y no tiene otros números (descarta prosa y partidas)
+    others = tokens[:-len(years)]
+    if len(others) > 4 or any(parse_amount(token) is not None for token in others):
+        return None
+    return years
+
+
+def extract_line_items(rows: Iterable[Sequence[str]]) -> List[StatementLineItem]:
+    """
+    Reconoce partidas en filas (celdas de una tabla o tokens de una línea de texto)
+
+    Las filas de encabezado con años fijan los periodos de las siguientes; sin
+    encabezado los periodos se nombran periodo_1, periodo_2... en orden de columna.
+    """
+    items: List[StatementLineItem] = []
+    periods: Optional[List[str]] = None
+    for cells in rows:
+        header = _header_periods(cells)
+        if header:
+            periods = header
+            continue
+        parsed = _split_row(cells)
+        if parsed is None:
+            continue
+        code, account, amounts, _ = parsed
+        field = classify_account(code, account)
+        if periods and len(amounts) > len(periods):
+            # Columnas extra a la izquierda de los importes (p. ej. número de nota)
+            amounts = amounts[-len(periods):]
+        labels = periods or [f"periodo_{i}" for i in range(1, len(amounts) + 1)]
+        # Con más periodos que importes, las columnas vacías suelen ser las últimas
+        values = {labels[i]: amount for i, amount in enumerate(amounts)}
+        items.append(StatementLineItem(code=code, account=account, field=field, values=values))
+    return items
+
+
+def _text_rows(text: str) -> Iterable[List[str]]:
+    for line in text.splitlines():
+        # Las tablas en markdown (build_financial_text_from_parsed) usan " | " entre celdas
+        line = line.replace("|", " ").strip()
+        if line:
+            yield [line]
+
+
+def _period_sort_key(period: str) -> Tuple[int, str]:
+    return (0, period) if _YEAR_TOKEN.match(period) else (1, period)
+
+
+def build_structured_financials(items: List[StatementLineItem]) -> StructuredFinancials:
+    """Consolida las partidas en cifras por periodo (la primera aparición gana) y calcula ratios"""
+    by_period: Dict[str, Dict[str, float]] = {}
+    for item in items:
+        if not item.field:
+            continue
+        for period, value in item.values.items():
+            by_period.setdefault(period, {}).setdefault(item.field, value)
+
+    years = sorted((p for p in by_period if _YEAR_TOKEN.match(p)), reverse=True)
+    others = sorted(p for p in by_period if not _YEAR_TOKEN.match(p))
+    figures = [FinancialFigures(period=p, **by_period[p]) for p in years + others]
+    return StructuredFinancials(
+        periods=figures,
+        ratios=compute_ratios(figures),
+        line_items=[item for item in items if item.field],
+    )
+
+
+def extract_structured_financials(text: str) -> StructuredFinancials:
+    """Extrae cifras y ratios del texto de un estado financiero (una partida por línea)"""
+    return build_structured_financials(extract_line_items(_text_rows(text)))
+
+
+def extract_structured_financials_from_tables(tables: Iterable[Dict[str, Any]]) -> StructuredFinancials:
+    """Extrae cifras y ratios de las tablas de parse_financial_pdfs ({"page", "rows"})"""
+    items: List[StatementLineItem] = []
+    for table in tables:
+        items.extend(extract_line_items(table.get("rows", [])))
+    return build_structured_financials(items)
+
+
+# ===== Ratios =====
+
+def _ratio(numerator: Optional[float], denominator: Optional[float]) -> Optional[float]:
+    if numerator is None or not denominator:
+        return None
+    return round(numerator / denominator, 4)
+
+
+def _growth(current: Optional[float], previous: Optional[float]) -> Optional[float]:
+    if current is None or not previous:
+        return None
+    return round((current - previous) / abs(previous), 4)
+
+
+def compute_ratios(periods: List[FinancialFigures]) -> List[FinancialRatios]:
+    """
+    Indicadores por periodo; el crecimiento compara cada año con el año anterior
+
+    periods debe venir del más reciente al más antiguo (como build_structured_financials).
+    """
+    by_period = {figures.period: figures for figures in periods}
+    ratios = []
+    for f in periods:
+        pasivo = f.pasivo_total
+        if pasivo is None and f.pasivo_corriente is not None and f.pasivo_no_corriente is not None:
+            pasivo = f.pasivo_corriente + f.pasivo_no_corriente
+        utilidad_bruta = f.utilidad_bruta
+        if utilidad_bruta is None and f.ventas is not None and f.costo_ventas is not None:
+            utilidad_bruta = f.ventas - abs(f.costo_ventas)
+        liquidos = None
+        if f.activo_corriente is not None and f.inventarios is not None:
+            liquidos = f.activo_corriente - f.inventarios
+
+        previous = by_period.get(str(int(f.period) - 1)) if _YEAR_TOKEN.match(f.period) else None
+        ratios.append(FinancialRatios(
+            period=f.period,
+            razon_corriente=_ratio(f.activo_corriente, f.pasivo_corriente),
+            prueba_acida=_ratio(liquidos, f.pasivo_corriente),
+            deuda_patrimonio=_ratio(pasivo, f.patrimonio),
+            endeudamiento_activo=_ratio(pasivo, f.activo_total),
+            margen_bruto=_ratio(utilidad_bruta, f.ventas),
+            margen_neto=_ratio(f.utilidad_neta, f.ventas),
+            roe=_ratio(f.utilidad_neta, f.patrimonio),
+            roa=_ratio(f.utilidad_neta, f.activo_total),
+            crecimiento_ventas=_growth(f.ventas, previous.ventas) if previous else None,
+            crecimiento_utilidad=_growth(f.utilidad_neta, previous.utilidad_neta) if previous else None,
+        ))
+    return ratios
+
+
+# ===== Presentación para el prompt =====
+
+_FIGURE_LABELS = [
+    ("activo_total", "Activo total"),
+    ("activo_corriente", "Activo corriente"),
+    ("pasivo_total", "Pasivo total"),
+    ("pasivo_corriente", "Pasivo corriente"),
+    ("patrimonio", "Patrimonio"),
+    ("ventas", "Ventas"),
+    ("utilidad_neta", "Utilidad neta"),
+]
+
+_RATIO_LABELS = [
+    ("razon_corriente", "Razón corriente", "x"),
+    ("prueba_acida", "Prueba ácida", "x"),
+    ("deuda_patrimonio", "Deuda / patrimonio", "x"),
+    ("endeudamiento_activo", "Pasivo / activo", "%"),
+    ("margen_bruto", "Margen bruto", "%"),
+    ("margen_neto", "Margen neto", "%"),
+    ("roe", "ROE", "%"),
+    ("roa", "ROA", "%"),
+    ("crecimiento_ventas", "Crecimiento ventas", "%"),
+    ("crecimiento_utilidad", "Crecimiento utilidad", "%"),
+]
+
+
+def _format_amount(value: float) -> str:
+    # Formato ecuatoriano: punto como separador de miles
+    return f"{value:,.0f}".replace(",", ".")
+
+
+def _format_ratio(value: float, unit: str) -> str:
+    if unit == "%":
+        return f"{value * 100:.1f}%".replace(".", ",")
+    return f"{value:.2f}".replace(".", ",")
+
+
+def format_ratio_table(financials: StructuredFinancials, max_periods: int = 3) -> str:
+    """Tablas compactas (markdown) de cifras clave e indicadores para el prompt"""
+    periods = financials.periods[:max_periods]
+    if not periods:
+        return ""
+    ratios = {r.period: r for r in financials.ratios}
+    header = "| Concepto | " + " | ".join(p.period for p in periods) + " |"
+    separator = "|---" * (len(periods) + 1) + "|"
+
+    lines = ["CIFRAS CLAVE (USD)", header, separator]
+    for field, label in _FIGURE_LABELS:
+        values = [getattr(p, field) for p in periods]
+        if all(v is None for v in values):
+            continue
+        cells = [_format_amount(v) if v is not None else "n/d" for v in values]
+        lines.append(f"| {label} | " + " | ".join(cells) + " |")
+
+    lines.extend(["", "INDICADORES", header, separator])
+    for field, label, unit in _RATIO_LABELS:
+        values = [getattr(ratios[p.period], field) for p in periods]
+        if all(v is None for v in values):
+            continue
+        cells = [_format_ratio(v, unit) if v is not None else "n/d" for v in values]
+        lines.append(f"| {label} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
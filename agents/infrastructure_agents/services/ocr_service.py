@@ -0,0 +1,301 @@
+"""
+OCR local para PDFs sin capa de texto
+- Backends intercambiables (por defecto tesseract vía subprocess, sin servicios en la nube)
+- Renderizado de páginas con pypdfium2 (dependencia de pdfplumber)
+- Paralelismo por página en un pool de procesos acotado
+- Caché en disco por hash (SHA-256) de la imagen de la página: re-subir un PDF
+  escaneado no vuelve a ejecutar el OCR
+
+Configuración por entorno:
+- OCR_BACKEND: nombre registrado ("tesseract") o ruta "modulo:Clase" (por defecto tesseract)
+- OCR_LANG: idiomas de tesseract (por defecto "spa+eng")
+- OCR_DPI: resolución de renderizado (por defecto 300)
+- OCR_MAX_WORKERS: procesos del pool de OCR (por defecto min(4, CPUs))
+- OCR_CACHE_DIR: directorio de la caché por página (por defecto "ocr_cache"; vacío la desactiva)
+- PDF_OCR_ENABLED: "auto" (si el backend está disponible), "true" o "false"
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("ocr_service")
+
+DEFAULT_OCR_DPI = 300
+
+
+class OcrError(Exception):
+    """Fallo del motor de OCR sobre una página"""
+
+
+class OcrBackend(ABC):
+    """
+    Motor de OCR sobre la imagen (PNG) de una página
+
+    Los backends se instancian dentro de los workers a partir de su nombre
+    registrado o de su ruta "modulo:Clase", por lo que deben poder construirse solo
+    con las opciones (kwargs) serializables que se les pasan.
+    """
+
+    name = "base"
+
+    def __init__(self, lang: Optional[str] = None, **options: Any):
+        self.lang = lang or os.getenv("OCR_LANG", "spa+eng")
+        self.options = options
+
+    @property
+    def cache_tag(self) -> str:
+        """Parte de la clave de caché: el mismo PNG con otro motor o idioma es otra entrada"""
+        return f"{self.name}-{self.lang}"
+
+    @abstractmethod
+    def is_available(self) -> bool:
+        """True si el motor puede ejecutarse en esta máquina"""
+
+    @abstractmethod
+    def recognize(self, image_png: bytes) -> str:
+        """Texto reconocido en la imagen"""
+
+
+class TesseractBackend(OcrBackend):
+    """tesseract como subprocess: la imagen entra por stdin y el texto sale por stdout"""
+
+    name = "tesseract"
+
+    def __init__(self, lang: Optional[str] = None, binary: Optional[str] = None, psm: int = 6,
+                 timeout: float = 120.0, **options: Any):
+        super().__init__(lang, **options)
+        self.binary = binary or os.getenv("TESSERACT_BINARY", "tesseract")
+        # psm 6: bloque uniforme de texto, adecuado para tablas de estados financieros
+        self.psm = psm
+        self.timeout = timeout
+
+    def is_available(self) -> bool:
+        return shutil.which(self.binary) is not None
+
+    def recognize(self, image_png: bytes) -> str:
+        command = [self.binary, "stdin", "stdout", "-l", self.lang, "--psm", str(self.psm)]
+        try:
+            completed = subprocess.run(command, input=image_png, capture_output=True,
+                                       timeout=self.timeout, check=False)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise OcrError(f"tesseract failed: {e}") from e
+        if completed.returncode != 0:
+            raise OcrError(f"tesseract exited with {completed.returncode}: "
+                           f"{completed.stderr.decode('utf-8', 'replace')[:200]}")
+        return completed.stdout.decode("utf-8", "replace")
+
+
+_BACKENDS: Dict[str, Callable[..., OcrBackend]] = {
+    "tesseract": TesseractBackend,
+}
+
+
+def register_ocr_backend(name: str, factory: Callable[..., OcrBackend]) -> None:
+    """
+    Registra un backend por nombre
+
+    Con el pool spawn, el registro debe hacerse al importar un módulo que también
+    importen los workers; si no, usar la ruta "modulo:Clase" como nombre.
+    """
+    _BACKENDS[name] = factory
+
+
+def get_ocr_backend(name: Optional[str] = None, **options: Any) -> OcrBackend:
+    """Instancia un backend por nombre registrado o ruta "modulo:Clase" (por defecto OCR_BACKEND)"""
+    name = name or os.getenv("OCR_BACKEND", "tesseract")
+    factory = _BACKENDS.get(name)
+    if factory is None:
+        if ":" not in name:
+            raise ValueError(f"Unknown OCR backend: {name}")
+        module_name, class_name = name.split(":", 1)
+        factory = getattr(importlib.import_module(module_name), class_name)
+    return factory(**options)
+
+
+def is_ocr_enabled(backend_name: Optional[str] = None) -> bool:
+    """PDF_OCR_ENABLED=auto activa el OCR solo si el backend está disponible"""
+    setting = os.getenv("PDF_OCR_ENABLED", "auto").lower()
+    if setting in ("0", "false", "no", "off"):
+        return False
+    try:
+        available = get_ocr_backend(backend_name).is_available()
+    except Exception as e:
+        logger.warning(f"OCR backend unavailable: {e}")
+        return False
+    if not available and setting in ("1", "true", "yes", "on"):
+        logger.warning("PDF_OCR_ENABLED is set but the OCR backend is not available")
+    return available
+
+
+# ===== Caché por imagen de página =====
+
+def _cache_dir() -> Optional[str]:
+    directory = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+    return directory or None
+
+
+def _cache_path(directory: str, image_hash: str, tag: str) -> str:
+    safe_tag = "".join(c if c.isalnum() or c in "-_" else "_" for c in tag)
+    return os.path.join(directory, image_hash[:2], f"{image_hash}.{safe_tag}.txt")
+
+
+def _read_cached(directory: Optional[str], image_hash: str, tag: str) -> Optional[str]:
+    if not directory:
+        return None
+    try:
+        with open(_cache_path(directory, image_hash, tag), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Unreadable OCR cache entry {image_hash}: {e}")
+        return None
+
+
+def _write_cached(directory: Optional[str], image_hash: str, tag: str, text: str) -> None:
+    if not directory:
+        return
+    path = _cache_path(directory, image_hash, tag)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write OCR cache entry {path}: {e}")
+
+
+# ===== Workers =====
+
+def render_page_png(path: str, page_number: int, dpi: int = DEFAULT_OCR_DPI) -> bytes:
+    """Renderiza una página (desde 1) a PNG en escala de grises"""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page = pdf[page_number - 1]
+        try:
+            bitmap = page.render(scale=dpi / 72, grayscale=True)
+            buffer = io.BytesIO()
+            bitmap.to_pil().save(buffer, format="PNG")
+            return buffer.getvalue()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+
+def _count_pdf_pages(path: str) -> int:
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _ocr_page(path: str, page_number: int, dpi: int, backend_name: Optional[str],
+              backend_options: Dict[str, Any], cache_dir: Optional[str]) -> Dict[str, Any]:
+    """Renderiza y reconoce una página (se ejecuta en un worker del pool de OCR)"""
+    backend = get_ocr_backend(backend_name, **backend_options)
+    image = render_page_png(path, page_number, dpi)
+    image_hash = hashlib.sha256(image).hexdigest()
+    tag = f"{backend.cache_tag}-{dpi}"
+
+    text = _read_cached(cache_dir, image_hash, tag)
+    cached = text is not None
+    if text is None:
+        try:
+            text = backend.recognize(image)
+        except OcrError as e:
+            logger.warning(f"OCR failed on page {page_number} of {path}: {e}")
+            text = ""
+        else:
+            _write_cached(cache_dir, image_hash, tag, text)
+    return {"page": page_number, "text": text, "image_hash": image_hash, "cached": cached}
+
+
+# ===== Pool =====
+
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _get_ocr_pool() -> ProcessPoolExecutor:
+    """Pool de OCR acotado, separado del de extracción para no bloquearlo con páginas lentas"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            workers = int(os.getenv("OCR_MAX_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+            _ocr_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _ocr_pool
+
+
+def shutdown_ocr_pool() -> None:
+    """Detiene el pool de OCR"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        pool, _ocr_pool = _ocr_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run_in_ocr_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_ocr_pool(), func, *args)
+    except BrokenProcessPool:
+        shutdown_ocr_pool()
+        return await loop.run_in_executor(_get_ocr_pool(), func, *args)
+
+
+def _page_entry(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"page": result["page"], "text": result["text"].strip(), "tables": [], "table_score": None,
+            "tables_skipped": True, "ocr": True, "image_hash": result["image_hash"],
+            "cached": result["cached"]}
+
+
+async def ocr_pdf_pages(path: str, backend_name: Optional[str] = None, dpi: Optional[int] = None,
+                        **backend_options: Any) -> List[Dict[str, Any]]:
+    """
+    OCR de todas las páginas de un PDF, una tarea del pool por página
+
+    Devuelve las páginas en orden con la forma de pdf_ingestion_service.iter_pdf_pages
+    más "ocr": True, "image_hash" y "cached".
+    """
+    dpi = dpi or int(os.getenv("OCR_DPI", str(DEFAULT_OCR_DPI)))
+    cache_dir = _cache_dir()
+    page_count = await _run_in_ocr_pool(_count_pdf_pages, path)
+    results = await asyncio.gather(*(
+        _run_in_ocr_pool(_ocr_page, path, number, dpi, backend_name, backend_options, cache_dir)
+        for number in range(1, page_count + 1)
+    ))
+    return [_page_entry(result) for result in results]
+
+
+def ocr_pdf_pages_sync(path: str, backend_name: Optional[str] = None, dpi: Optional[int] = None,
+                       **backend_options: Any) -> List[Dict[str, Any]]:
+    """Versión síncrona de ocr_pdf_pages (interfaz de Streamlit), con el mismo pool"""
+    dpi = dpi or int(os.getenv("OCR_DPI", str(DEFAULT_OCR_DPI)))
+    cache_dir = _cache_dir()
+    pool = _get_ocr_pool()
+    page_count = pool.submit(_count_pdf_pages, path).result()
+    futures = [pool.submit(_ocr_page, path, number, dpi, backend_name, backend_options, cache_dir)
+               for number in range(1, page_count + 1)]
+    return [_page_entry(future.result()) for future in futures]
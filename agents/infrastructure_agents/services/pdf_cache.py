@@ -0,0 +1,207 @@
+"""
+Caché de ingestión de PDFs por contenido
+- Clave: SHA-256 de los bytes del archivo + variante de extracción (motor/normalización)
+- Nivel en memoria con expulsión LRU y nivel opcional en disco (JSON)
+
+Streamlit vuelve a ejecutar el script en cada interacción: con esta caché la vista
+previa, la evaluación y el orquestador comparten una única extracción por archivo.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("pdf_cache")
+
+CacheKey = Tuple[str, str]
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 (hex) de los bytes de un archivo"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PdfIngestionCache:
+    """
+    Caché LRU de documentos ingeridos (texto normalizado, tablas y metadatos de página)
+
+    Los valores son los dicts que producen los extractores; se devuelven tal cual,
+    por lo que los consumidores no deben modificarlos. Los fallos de extracción no
+    se cachean.
+    """
+
+    def __init__(self, max_entries: int = 64, disk_dir: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Una sola extracción por clave aunque lleguen varias peticiones a la vez
+        self._inflight: Dict[CacheKey, threading.Event] = {}
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    # Acceso directo
+
+    def get(self, digest: str, variant: str) -> Optional[Dict[str, Any]]:
+        """Busca en memoria y después en disco; None si no está"""
+        key = (digest, variant)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+
+        value = self._read_disk(key)
+        if value is not None:
+            with self._lock:
+                self.stats["disk_hits"] += 1
+            self._store_memory(key, value)
+        return value
+
+    def put(self, digest: str, variant: str, value: Dict[str, Any]) -> None:
+        """Guarda un documento en memoria y, si está configurado, en disco"""
+        key = (digest, variant)
+        self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def get_or_compute(self, data: bytes, variant: str,
+                       compute: Callable[[bytes], Dict[str, Any]]) -> Dict[str, Any]:
+        """Devuelve el documento cacheado o lo calcula con compute(data) (síncrono)"""
+        digest = content_hash(data)
+        while True:
+            value = self.get(digest, variant)
+            if value is not None:
+                return value
+            event, owner = self._claim((digest, variant))
+            if owner:
+                break
+            event.wait()
+
+        try:
+            with self._lock:
+                self.stats["misses"] += 1
+            value = compute(data)
+            self.put(digest, variant, value)
+            return value
+        finally:
+            self._release((digest, variant))
+
+    async def aget_or_compute(self, data: bytes, variant: str,
+                              compute: Callable[[bytes], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Versión asíncrona de get_or_compute (el hash y el disco van a un hilo)"""
+        digest = await asyncio.to_thread(content_hash, data)
+        while True:
+            value = await asyncio.to_thread(self.get, digest, variant)
+            if value is not None:
+                return value
+            event, owner = self._claim((digest, variant))
+            if owner:
+                break
+            await asyncio.to_thread(event.wait)
+
+        try:
+            with self._lock:
+                self.stats["misses"] += 1
+            value = await compute(data)
+            await asyncio.to_thread(self.put, digest, variant, value)
+            return value
+        finally:
+            self._release((digest, variant))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "max_entries": self.max_entries,
+                    "disk_dir": self.disk_dir}
+
+    # Internos
+
+    def _claim(self, key: CacheKey) -> Tuple[threading.Event, bool]:
+        with self._lock:
+            event = self._inflight.get(key)
+            if event is not None:
+                return event, False
+            event = threading.Event()
+            self._inflight[key] = event
+            return event, True
+
+    def _release(self, key: CacheKey) -> None:
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _store_memory(self, key: CacheKey, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _disk_path(self, key: CacheKey) -> str:
+        digest, variant = key
+        safe_variant = "".join(c if c.isalnum() or c in "-_" else "_" for c in variant)
+        return os.path.join(self.disk_dir, f"{digest}.{safe_variant}.json")
+
+    def _read_disk(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Entrada de caché en disco ilegible {key}: {e}")
+            return None
+
+    def _write_disk(self, key: CacheKey, value: Dict[str, Any]) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"No se pudo escribir la caché en disco {path}: {e}")
+
+
+_default_cache: Optional[PdfIngestionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> PdfIngestionCache:
+    """
+    Caché compartida del proceso
+
+    Configuración por entorno: PDF_CACHE_MAX_ENTRIES (por defecto 64) y
+    PDF_CACHE_DIR (nivel en disco; desactivado si no se define).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PdfIngestionCache(
+                max_entries=int(os.getenv("PDF_CACHE_MAX_ENTRIES", "64")),
+                disk_dir=os.getenv("PDF_CACHE_DIR") or None,
+            )
+        return _default_cache
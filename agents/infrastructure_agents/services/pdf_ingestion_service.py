@@ -3,41 +3,282 @@ Servicio de ingestión de PDFs financieros
 - Extrae texto y tablas de PDFs de la Superintendencia de Compañías
 - Devuelve un JSON normalizado y un helper para construir texto consolidado
 
+La extracción (CPU intensiva) se ejecuta en un pool de procesos con unidades de
+trabajo por grupos de páginas, de modo que el event loop nunca se bloquea y varios
+documentos se procesan en paralelo.
+
 Requisitos: pdfplumber (ya incluido en requirements.txt)
 """
 
 from __future__ import annotations
 
+import asyncio
+import io
+import multiprocessing
 import os
-from typing import List, Dict, Any
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Union
 import pdfplumber
 import logging
 
+from .context_packer import AMOUNT_PATTERN, get_token_budget, pack_parsed_documents
+from .ocr_service import is_ocr_enabled, ocr_pdf_pages, ocr_pdf_pages_sync
+from .pdf_cache import PdfIngestionCache, get_pdf_cache
+
 # Configurar logger global
 logger = logging.getLogger("pdf_ingestion_service")
 logger.setLevel(logging.WARNING)
 
+# Páginas por unidad de trabajo: cada tarea abre el PDF una vez para su grupo
+DEFAULT_PAGES_PER_TASK = 4
+
+# Puntuación mínima (0-1) para ejecutar extract_tables en una página; 0 la ejecuta siempre
+DEFAULT_TABLE_THRESHOLD = float(os.getenv("PDF_TABLE_DENSITY_THRESHOLD", "0.25"))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Pool de procesos compartido (spawn: seguro con hilos en el proceso padre)"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Detiene el pool de extracción (concurrent.futures ya lo cierra al salir del proceso)"""
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-async def parse_financial_pdfs(pdf_paths: List[str]) -> Dict[str, Any]:
+
+
+# ===== Normalización de texto =====
+# Las reglas de espaciado insertan un espacio entre dos caracteres contiguos, así que
+# se expresan como fronteras de ancho cero y se aplican junto con la limpieza de
+# espacios en una sola pasada con un patrón precompilado.
+_LETTER = "a-zA-ZáéíóúñÁÉÍÓÚÑ"
+_LOWER = "a-záéíóúñ"
+_UPPER = "A-ZÁÉÍÓÚÑ"
+_SPACING_BOUNDARIES = "|".join([
+    rf"(?<=[{_LETTER}])(?=\d)",              # letra seguida de número
+    rf"(?<=\d)(?=[{_LETTER}])",              # número seguido de letra
+    rf"(?<=[{_LETTER}\d])(?=\()",            # antes de paréntesis
+    rf"(?<=\))(?=[{_LETTER}\d])",            # después de paréntesis
+    rf"(?<=[{_LETTER}])(?=\$)",              # letra seguida de $
+    rf"(?<=\$)(?=[{_LETTER}])",              # $ seguido de letra
+    rf"(?<=[{_LOWER}])(?=[{_UPPER}])",        # palabras pegadas (minúscula + mayúscula)
+    rf"(?<=\.)(?=[{_UPPER}])",               # punto seguido de mayúscula
+    rf"(?<=,)(?=[{_LETTER}])",                # coma seguida de letra
+])
+_SPACING_PATTERN = re.compile(rf"\s+|{_SPACING_BOUNDARIES}")
+_SPACING_PATTERN_KEEP_LINES = re.compile(rf"(\s*\n\s*)|[^\S\n]+|{_SPACING_BOUNDARIES}")
+
+
+def _keep_lines_replacement(match: re.Match) -> str:
+    return "\n" if match.group(1) else " "
+
+
+def normalize_text(text: str, keep_lines: bool = True) -> str:
     """
-    Extrae texto y tablas de una lista de PDFs y devuelve un JSON normalizado.
+    Normalizador de una sola pasada para texto extraído de PDFs
 
-    Estructura de salida:
-    {
-        "sources": [{"file": str, "status": "parsed|no_text_layer|error_opening_pdf:...", "pages": int}],
-        "statements": [
-            {
-                "filename": str,
-                "text": str,
-                "tables": [
-                    {"page": int, "rows": List[List[str]]}
-                ]
-            }
-        ],
-        "needs_ocr": [str],
-        "summary": {"detected_documents": int, "pending_ocr": int, "notes": str}
+    Aplica las reglas de espaciado de improve_text_spacing y colapsa espacios. Con
+    keep_lines=True conserva los saltos de línea (útil para tablas y partidas en el
+    texto); con keep_lines=False el resultado es idéntico a improve_text_spacing.
+    """
+    if not text:
+        return text
+    if keep_lines:
+        return _SPACING_PATTERN_KEEP_LINES.sub(_keep_lines_replacement, text).strip()
+    return _SPACING_PATTERN.sub(" ", text).strip()
+
+
+def improve_text_spacing(text):
+    """Mejora el espaciado del texto extraído de PDFs (todo en una línea)"""
+    return normalize_text(text, keep_lines=False)
+
+
+# ===== Motor de extracción =====
+
+_STATEMENT_HEADINGS = re.compile(
+    r"ESTADO\s+DE\s+SITUACI[OÓ]N|BALANCE\s+GENERAL|ESTADO\s+DE\s+RESULTADOS|"
+    r"ESTADO\s+DE\s+FLUJOS?\s+DE\s+EFECTIVO|ESTADO\s+DE\s+CAMBIOS\s+EN\s+EL\s+PATRIMONIO",
+    re.IGNORECASE,
+)
+# Segmentos de línea/rectángulo a partir de los cuales la página se considera tabulada
+_RULINGS_FOR_TABLE = 8
+
+
+def score_table_likelihood(page, text: str) -> float:
+    """
+    Pre-pasada barata: probabilidad (0-1) de que la página contenga una tabla financiera
+
+    Usa señales ya disponibles tras extract_text: proporción de líneas con importes,
+    líneas y rectángulos de la página (reglado de la tabla) y títulos de estados
+    financieros, que fuerzan la extracción.
+    """
+    if _STATEMENT_HEADINGS.search(text):
+        return 1.0
+    lines = [line for line in text.splitlines() if line.strip()]
+    numeric_ratio = sum(1 for line in lines if AMOUNT_PATTERN.search(line)) / len(lines) if lines else 0.0
+    rulings = len(page.lines) + len(page.rects)
+    ruling_score = min(1.0, rulings / _RULINGS_FOR_TABLE)
+    return max(numeric_ratio, ruling_score)
+
+
+def _extract_page(page, normalize: bool = True, extract_tables: bool = True,
+                  table_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Extrae texto y tablas de una página de pdfplumber (común a todos los caminos)
+
+    extract_tables, la operación más costosa, solo se ejecuta si la puntuación de
+    score_table_likelihood alcanza table_threshold (DEFAULT_TABLE_THRESHOLD si es None).
+    """
+    if table_threshold is None:
+        table_threshold = DEFAULT_TABLE_THRESHOLD
+    txt = page.extract_text() or ""
+    entry: Dict[str, Any] = {
+        "page": page.page_number,
+        "text": normalize_text(txt) if normalize else txt.strip(),
+        "tables": [],
+        "table_score": None,
+        "tables_skipped": not extract_tables,
     }
+    if extract_tables:
+        score = score_table_likelihood(page, txt) if table_threshold > 0 else 1.0
+        entry["table_score"] = round(score, 3)
+        if score >= table_threshold:
+            # Tablas (intento múltiple)
+            tables = page.extract_tables() or []
+            entry["tables"] = [t for t in tables if t and isinstance(t, list) and len(t) > 0]
+        else:
+            entry["tables_skipped"] = True
+    return entry
+
+
+def _empty_page(idx: int) -> Dict[str, Any]:
+    return {"page": idx, "text": "", "tables": [], "table_score": None, "tables_skipped": False}
+
+
+def iter_pdf_pages(source: Union[str, bytes, BinaryIO], normalize: bool = True,
+                   extract_tables: bool = True,
+                   table_threshold: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Motor de ingestión en streaming: produce las páginas de un PDF de una en una
+
+    source puede ser una ruta, los bytes del archivo o un objeto binario. Cada página
+    se libera tras producirse, así que la memoria no crece con el número de páginas.
+    Produce {"page": int, "text": str, "tables": List[List[List[str]]],
+             "table_score": float | None, "tables_skipped": bool}.
     """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with pdfplumber.open(source) as pdf:
+        for page in pdf.pages:
+            try:
+                yield _extract_page(page, normalize, extract_tables, table_threshold)
+            except Exception as page_error:
+                logger.warning(f"Error procesando página {page.page_number}: {page_error}")
+                yield _empty_page(page.page_number)
+            finally:
+                page.close()
+
+
+def _count_pages(path: str) -> int:
+    """Número de páginas de un PDF (se ejecuta en un worker)"""
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_pages(path: str, page_numbers: List[int], normalize: bool = False,
+                   table_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Extrae texto y tablas de un grupo de páginas (se ejecuta en un worker)
+
+    page_numbers empieza en 1. Devuelve una entrada por página, en orden (ver iter_pdf_pages).
+    """
+    pages: List[Dict[str, Any]] = []
+    with pdfplumber.open(path) as pdf:
+        for idx in page_numbers:
+            page = pdf.pages[idx - 1]
+            try:
+                pages.append(_extract_page(page, normalize, table_threshold=table_threshold))
+            except Exception as page_error:
+                logger.warning(f"Error procesando página {idx} del PDF {path}: {page_error}")
+                pages.append(_empty_page(idx))
+            finally:
+                page.close()
+    return pages
+
+
+async def _run_in_pool(func, *args):
+    """Ejecuta func en el pool de procesos; si el pool se rompe, lo recrea una vez"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_process_pool(), func, *args)
+    except BrokenProcessPool:
+        shutdown_process_pool()
+        return await loop.run_in_executor(_get_process_pool(), func, *args)
+
+
+async def _parse_single_pdf(path: str, pages_per_task: int, normalize: bool,
+                            table_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Reparte las páginas de un PDF en tareas del pool y las reúne en orden"""
+    page_count = await _run_in_pool(_count_pages, path)
+    chunks = [
+        list(range(start, min(start + pages_per_task, page_count + 1)))
+        for start in range(1, page_count + 1, pages_per_task)
+    ]
+    results = await asyncio.gather(*(_run_in_pool(_extract_pages, path, chunk, normalize, table_threshold) for chunk in chunks))
+    return [page for chunk_pages in results for page in chunk_pages]
+
+
+def _document_from_pages(filename: str, pages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Construye el documento ingerido a partir de sus páginas extraídas
+
+    pages puede ser una lista o el generador de iter_pdf_pages (se consume una vez).
+    {"filename", "text", "tables": [{"page", "rows"}], "has_text", "page_count",
+     "pages": [{"page", "chars", "tables", "table_score", "tables_skipped"}]}
+    """
+    doc: Dict[str, Any] = {"filename": filename, "text": "", "tables": [], "pages": []}
+    text_parts: List[str] = []
+    has_text = False
+    for page in pages:
+        idx = page["page"]
+        txt = page["text"]
+        if txt.strip():
+            has_text = True
+            # Normalizar líneas y agregar separadores de página
+            text_parts.append(f"\n\n==== PÁGINA {idx} ====\n" + txt.strip() + "\n")
+        for t in page["tables"]:
+            doc["tables"].append({"page": idx, "rows": t})
+        doc["pages"].append({"page": idx, "chars": len(txt), "tables": len(page["tables"]),
+                             "table_score": page.get("table_score"),
+                             "tables_skipped": page.get("tables_skipped", False),
+                             "ocr": page.get("ocr", False)})
+    doc["text"] = "".join(text_parts)
+    doc["has_text"] = has_text
+    doc["ocr"] = any(page["ocr"] for page in doc["pages"])
+    doc["page_count"] = len(doc["pages"])
+    return doc
+
+
+def _assemble_result(entries: List[Any]) -> Dict[str, Any]:
+    """Reúne (path, documento | excepción) en la estructura de parse_financial_pdfs"""
     result: Dict[str, Any] = {
         "sources": [],
         "statements": [],
@@ -45,50 +286,179 @@ async def parse_financial_pdfs(pdf_paths: List[str]) -> Dict[str, Any]:
         "summary": {},
     }
 
-    for path in pdf_paths:
-        doc = {"filename": os.path.basename(path), "text": "", "tables": []}
-        has_text = False
-        page_count = 0
-        try:
-            with pdfplumber.open(path) as pdf:
-                page_count = len(pdf.pages)
-                for idx, page in enumerate(pdf.pages, start=1):
-                    try:
-                        # Texto
-                        txt = page.extract_text() or ""
-                        if txt.strip():
-                            has_text = True
-                            # Normalizar líneas y agregar separadores de página
-                            doc["text"] += f"\n\n==== PÁGINA {idx} ====\n" + txt.strip() + "\n"
-                        # Tablas (intento múltiple)
-                        tables = page.extract_tables() or []
-                        for t in tables:
-                            if t and isinstance(t, list) and len(t) > 0:
-                                doc["tables"].append({"page": idx, "rows": t})
-                    except Exception as page_error:
-                        logger.warning(f"Error procesando página {idx} del PDF {path}: {page_error}")
-        except Exception as e:
-            result["sources"].append({"file": path, "status": f"error_opening_pdf: {e}", "pages": 0})
+    for path, doc in entries:
+        if isinstance(doc, BaseException):
+            if isinstance(doc, asyncio.CancelledError):
+                raise doc
+            result["sources"].append({"file": path, "status": f"error_opening_pdf: {doc}", "pages": 0})
             continue
 
-        result["sources"].append({"file": path, "status": "parsed" if has_text else "no_text_layer", "pages": page_count})
-        if has_text:
+        status = ("ocr" if doc.get("ocr") else "parsed") if doc["has_text"] else "no_text_layer"
+        result["sources"].append({"file": path, "status": status, "pages": doc["page_count"]})
+        if doc["has_text"]:
             result["statements"].append(doc)
         else:
             result["needs_ocr"].append(path)
 
+    pages = [page for _, doc in entries if isinstance(doc, dict) for page in doc.get("pages", [])]
+    skipped = sum(1 for page in pages if page.get("tables_skipped"))
     result["summary"] = {
         "detected_documents": len(result["statements"]),
         "pending_ocr": len(result["needs_ocr"]),
-        "notes": "Parser básico. Para PDFs escaneados o tablas complejas, integrar Azure Document Intelligence.",
+        "table_pages_scanned": len(pages) - skipped,
+        "table_pages_skipped": skipped,
+        "ocr_documents": sum(1 for source in result["sources"] if source["status"] == "ocr"),
+        "notes": "Parser pdfplumber con OCR local (tesseract) para PDFs escaneados; los pendientes de OCR no tenían motor disponible.",
     }
     return result
 
 
-def _truncate_text(text: str, max_chars: int) -> str:
-    if len(text) <= max_chars:
-        return text
-    return text[: max_chars - 3] + "..."
+async def _parse_document(path: str, pages_per_task: int, normalize: bool,
+                          table_threshold: Optional[float] = None) -> Dict[str, Any]:
+    pages = await _parse_single_pdf(path, max(1, pages_per_task), normalize, table_threshold)
+    doc = _document_from_pages(os.path.basename(path), pages)
+    if not doc["has_text"] and is_ocr_enabled():
+        # PDF escaneado: OCR local por página en el pool de OCR
+        ocr_pages = await ocr_pdf_pages(path)
+        doc = _document_from_pages(os.path.basename(path), _normalize_ocr_pages(ocr_pages, normalize))
+    return doc
+
+
+def _normalize_ocr_pages(pages: List[Dict[str, Any]], normalize: bool) -> List[Dict[str, Any]]:
+    if not normalize:
+        return pages
+    return [{**page, "text": normalize_text(page["text"])} for page in pages]
+
+
+async def parse_financial_pdfs(pdf_paths: List[str], pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+                               normalize: bool = False,
+                               table_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Extrae texto y tablas de una lista de PDFs y devuelve un JSON normalizado.
+
+    Todas las páginas de todos los documentos se reparten en el pool de procesos en
+    grupos de `pages_per_task`; el resultado conserva el orden de documentos y
+    páginas. Con normalize=True se aplica normalize_text en los workers.
+
+    Las tablas solo se extraen de las páginas cuya pre-pasada de densidad
+    (score_table_likelihood) alcanza table_threshold; por defecto
+    DEFAULT_TABLE_THRESHOLD (env PDF_TABLE_DENSITY_THRESHOLD), 0 desactiva el filtro.
+
+    Los PDFs sin capa de texto pasan por el OCR local (ocr_service) si está
+    disponible; si no, quedan en needs_ocr.
+
+    Estructura de salida:
+    {
+        "sources": [{"file": str, "status": "parsed|ocr|no_text_layer|error_opening_pdf:...", "pages": int}],
+        "statements": [
+            {
+                "filename": str,
+                "text": str,
+                "tables": [
+                    {"page": int, "rows": List[List[str]]}
+                ],
+                "pages": [{"page": int, "chars": int, "tables": int,
+                           "table_score": float | None, "tables_skipped": bool}]
+            }
+        ],
+        "needs_ocr": [str],
+        "summary": {"detected_documents": int, "pending_ocr": int, "table_pages_scanned": int,
+                    "table_pages_skipped": int, "ocr_documents": int, "notes": str}
+    }
+    """
+    # Todos los documentos en paralelo; gather conserva el orden de entrada
+    docs = await asyncio.gather(
+        *(_parse_document(path, pages_per_task, normalize, table_threshold) for path in pdf_paths),
+        return_exceptions=True,
+    )
+    return _assemble_result(list(zip(pdf_paths, docs)))
+
+
+def _extraction_variant(normalize: bool, table_threshold: Optional[float] = None) -> str:
+    # "lines": normalizador de una pasada que conserva los saltos de línea; el umbral
+    # de tablas cambia qué tablas se extraen, así que forma parte de la clave
+    if table_threshold is None:
+        table_threshold = DEFAULT_TABLE_THRESHOLD
+    # Con OCR disponible, un PDF escaneado produce otro documento que sin él
+    ocr = "+ocr" if is_ocr_enabled() else ""
+    return f"pdfplumber:{'lines' if normalize else 'raw'}:t{table_threshold:g}{ocr}"
+
+
+def extract_pdf_document(data: bytes, filename: str = "document.pdf", normalize: bool = True,
+                         cache: Optional[PdfIngestionCache] = None,
+                         table_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Ingiere un PDF en el hilo actual con el motor en streaming, pasando por la caché
+
+    Pensado para llamadores síncronos (la interfaz de Streamlit). Comparte la
+    variante de caché con parse_pdf_bytes, así que la vista previa y el orquestador
+    reutilizan la misma extracción y ven el mismo texto.
+    """
+    cache = cache or get_pdf_cache()
+
+    def compute(content: bytes) -> Dict[str, Any]:
+        doc = _document_from_pages(filename, iter_pdf_pages(content, normalize,
+                                                            table_threshold=table_threshold))
+        if not doc["has_text"] and is_ocr_enabled():
+            tmp_path = _write_temp_pdf(content)
+            try:
+                doc = _document_from_pages(filename, _normalize_ocr_pages(ocr_pdf_pages_sync(tmp_path), normalize))
+            finally:
+                os.remove(tmp_path)
+        return doc
+
+    doc = cache.get_or_compute(data, _extraction_variant(normalize, table_threshold), compute)
+    return {**doc, "filename": filename}
+
+
+async def parse_pdf_bytes(data: bytes, filename: str, normalize: bool = False,
+                          pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+                          cache: Optional[PdfIngestionCache] = None,
+                          table_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Ingiere un PDF a partir de sus bytes pasando por la caché por contenido
+
+    Devuelve el documento (ver _document_from_pages); en un fallo de caché el PDF se
+    escribe en un archivo temporal para que los workers lo abran por ruta.
+    """
+    cache = cache or get_pdf_cache()
+
+    async def compute(content: bytes) -> Dict[str, Any]:
+        tmp_path = await asyncio.to_thread(_write_temp_pdf, content)
+        try:
+            return await _parse_document(tmp_path, pages_per_task, normalize, table_threshold)
+        finally:
+            os.remove(tmp_path)
+
+    doc = await cache.aget_or_compute(data, _extraction_variant(normalize, table_threshold), compute)
+    # El mismo contenido puede llegar con otro nombre
+    return {**doc, "filename": filename}
+
+
+async def parse_financial_pdfs_cached(pdf_paths: List[str], normalize: bool = False,
+                                      pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+                                      cache: Optional[PdfIngestionCache] = None,
+                                      table_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """parse_financial_pdfs pasando cada documento por la caché por contenido (SHA-256)"""
+    async def parse_one(path: str) -> Dict[str, Any]:
+        data = await asyncio.to_thread(_read_file_bytes, path)
+        return await parse_pdf_bytes(data, os.path.basename(path), normalize, pages_per_task, cache,
+                                     table_threshold)
+
+    docs = await asyncio.gather(*(parse_one(path) for path in pdf_paths), return_exceptions=True)
+    return _assemble_result(list(zip(pdf_paths, docs)))
+
+
+def _read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_temp_pdf(data: bytes) -> str:
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
 
 
 def _table_to_markdown(rows: List[List[str]], max_rows: int = 15, max_cols: int = 8) -> str:
@@ -109,23 +479,22 @@ def _table_to_markdown(rows: List[List[str]], max_rows: int = 15, max_cols: int
     return "\n".join(lines)
 
 
-def build_financial_text_from_parsed(parsed: Dict[str, Any], max_rows_per_table: int = 12) -> str:
+def build_financial_text_from_parsed(parsed: Dict[str, Any], max_rows_per_table: int = 60,
+                                     token_budget: Optional[int] = None) -> str:
     """
     Construye un texto consolidado amigable para LLM a partir del JSON parseado.
-    Incluye extractos de texto y un resumen de tablas.
-    """
-    parts: List[str] = []
-    for st in parsed.get("statements", []):
-        parts.append(f"\n\n===== DOCUMENTO: {st.get('filename','')} =====\n")
-        # Agregar texto con límite para no explotar tokens
-        parts.append(_truncate_text(st.get("text", "").strip(), 10000))
-        # Resumen de tablas
-        tables = st.get("tables", [])
-        if tables:
-            parts.append("\n-- Resumen de Tablas --\n")
-            for i, t in enumerate(tables, start=1):
-                parts.append(f"Tabla {i} (página {t.get('page', '?')}):\n")
-                parts.append(_table_to_markdown(t.get("rows", []), max_rows=max_rows_per_table))
+
+    Texto y tablas de todos los documentos se dividen en secciones y se empaquetan
+    por relevancia financiera hasta token_budget tokens (por defecto, el presupuesto
+    del financial_agent), en lugar de truncar cada documento por caracteres.
+    """
+    budget = token_budget if token_budget is not None else get_token_budget("financial_agent")
+    packed = pack_parsed_documents(parsed, budget, max_rows_per_table=max_rows_per_table,
+                                   table_renderer=_table_to_markdown)
+    parts: List[str] = [packed.text]
+    if packed.omitted:
+        parts.append(f"\n[Nota] {packed.omitted} sección(es) de menor relevancia omitidas "
+                     f"por el presupuesto de contexto ({budget} tokens).")
     # Notas de OCR
     needs_ocr = parsed.get("needs_ocr", [])
     if needs_ocr:
@@ -32,6 +32,9 @@ class RateLimitHandler:
         self.logger = logging.getLogger(__name__)
         self.request_history = []
         self.last_rate_limit_time = None
+        # Requests admitted by _wait_if_needed that have not finished yet
+        self.in_flight_requests = 0
+        self.cancelled_requests = 0
         
     async def execute_with_retry(self, 
                                 func: Callable,
@@ -47,8 +50,13 @@ class RateLimitHandler:
                 # Check if we should wait before making the request
                 await self._wait_if_needed()
                 
-                # Execute the function
-                result = await func(*args, **kwargs)
+                # Execute the function holding an in-flight slot; the slot is
+                # released on any exit, including cancellation of the caller
+                self.in_flight_requests += 1
+                try:
+                    result = await func(*args, **kwargs)
+                finally:
+                    self.in_flight_requests -= 1
                 
                 # Record successful request
                 self._record_request(success=True)
@@ -58,6 +66,13 @@ class RateLimitHandler:
                 
                 return result
                 
+            except asyncio.CancelledError:
+                # Cancelled evaluations must not count as failures nor keep
+                # consuming the request budget of live evaluations
+                self.cancelled_requests += 1
+                self.logger.info(f"Request cancelled on attempt {attempt + 1}")
+                raise
+                
             except Exception as e:
                 last_exception = e
                 error_str = str(e).lower()
@@ -185,8 +200,9 @@ class RateLimitHandler:
             if req_time > cutoff_time
         ]
         
-        # Check if we're approaching the rate limit
-        if len(self.request_history) >= self.config.max_requests_per_window * 0.8:  # 80% of limit
+        # Check if we're approaching the rate limit (in-flight requests count as used)
+        pending_requests = len(self.request_history) + self.in_flight_requests
+        if self.request_history and pending_requests >= self.config.max_requests_per_window * 0.8:  # 80% of limit
             # Calculate time to wait
             oldest_request = min(self.request_history)
             wait_time = (oldest_request + timedelta(seconds=self.config.rate_limit_window) - current_time).total_seconds()
@@ -226,6 +242,8 @@ class RateLimitHandler:
         
         return {
             "requests_in_current_window": len(recent_requests),
+            "in_flight_requests": self.in_flight_requests,
+            "cancelled_requests": self.cancelled_requests,
             "max_requests_per_window": self.config.max_requests_per_window,
             "utilization_percentage": (len(recent_requests) / self.config.max_requests_per_window) * 100,
             "last_rate_limit_time": self.last_rate_limit_time.isoformat() if self.last_rate_limit_time else None,
@@ -0,0 +1,166 @@
+"""
+SQLite Storage Service
+Backend embebido de persistencia de evaluaciones (STORAGE_BACKEND=sqlite)
+- Mismo esquema, índices y SQL que AzureSQLService (SQLEvaluationStorage)
+- Modo WAL: lectores concurrentes con un escritor, commits sin reescribir la base
+- Sin servidor ni driver ODBC: despliegues de un solo nodo, desarrollo y benchmarks
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from ..config.azure_config import StorageConfig
+from .storage_backend import ConnectionPool, SQLEvaluationStorage
+
+# Fechas como texto ISO y de vuelta a datetime/date en columnas DATETIME/DATE
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode("utf-8")))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode("utf-8")))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS RiskEvaluations (
+    evaluation_id TEXT PRIMARY KEY,
+    company_id TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    final_score REAL NULL,
+    risk_level TEXT NULL,
+    confidence_score REAL NULL,
+    created_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    completed_date DATETIME NULL,
+    metadata TEXT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_RiskEvaluations_CompanyId ON RiskEvaluations(company_id);
+CREATE INDEX IF NOT EXISTS IX_RiskEvaluations_Status ON RiskEvaluations(status);
+CREATE INDEX IF NOT EXISTS IX_RiskEvaluations_CreatedDate ON RiskEvaluations(created_date);
+CREATE INDEX IF NOT EXISTS IX_RiskEvaluations_RiskLevel ON RiskEvaluations(risk_level) WHERE risk_level IS NOT NULL;
+-- Índices de cobertura para la paginación keyset (SQLite no tiene INCLUDE: columnas en la clave)
+CREATE INDEX IF NOT EXISTS IX_RiskEvaluations_Company_Created ON RiskEvaluations(
+    company_id, created_date DESC, evaluation_id DESC,
+    company_name, status, final_score, risk_level, confidence_score, completed_date);
+CREATE INDEX IF NOT EXISTS IX_RiskEvaluations_RiskLevel_Created ON RiskEvaluations(
+    risk_level, created_date DESC, evaluation_id DESC,
+    company_id, company_name, status, final_score, confidence_score, completed_date);
+CREATE INDEX IF NOT EXISTS IX_RiskEvaluations_Created_Id ON RiskEvaluations(
+    created_date DESC, evaluation_id DESC,
+    company_id, company_name, status, final_score, risk_level, confidence_score, completed_date);
+
+CREATE TABLE IF NOT EXISTS AgentResults (
+    result_id TEXT PRIMARY KEY,
+    evaluation_id TEXT NOT NULL REFERENCES RiskEvaluations(evaluation_id),
+    agent_name TEXT NOT NULL,
+    agent_type TEXT NOT NULL,
+    result_data TEXT NOT NULL,
+    confidence_score REAL NOT NULL,
+    processing_time_ms INTEGER NOT NULL,
+    created_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    error_message TEXT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_AgentResults_EvaluationId ON AgentResults(evaluation_id);
+CREATE INDEX IF NOT EXISTS IX_AgentResults_AgentName ON AgentResults(agent_name);
+CREATE INDEX IF NOT EXISTS IX_AgentResults_AgentType ON AgentResults(agent_type);
+CREATE INDEX IF NOT EXISTS IX_AgentResults_ProcessingTime ON AgentResults(processing_time_ms);
+
+CREATE TABLE IF NOT EXISTS ScenarioSimulations (
+    simulation_id TEXT PRIMARY KEY,
+    evaluation_id TEXT NOT NULL REFERENCES RiskEvaluations(evaluation_id),
+    scenario_name TEXT NOT NULL,
+    variable_changes TEXT NOT NULL,
+    original_score REAL NOT NULL,
+    simulated_score REAL NOT NULL,
+    impact_analysis TEXT NOT NULL,
+    viability_score REAL NOT NULL,
+    created_date DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS IX_ScenarioSimulations_EvaluationId ON ScenarioSimulations(evaluation_id);
+CREATE INDEX IF NOT EXISTS IX_ScenarioSimulations_CreatedDate ON ScenarioSimulations(created_date);
+CREATE INDEX IF NOT EXISTS IX_ScenarioSimulations_SimulatedScore ON ScenarioSimulations(simulated_score);
+
+CREATE TABLE IF NOT EXISTS ScoringDetails (
+    scoring_id TEXT PRIMARY KEY,
+    evaluation_id TEXT NOT NULL REFERENCES RiskEvaluations(evaluation_id),
+    financial_score REAL NOT NULL,
+    reputational_score REAL NOT NULL,
+    behavioral_score REAL NOT NULL,
+    final_score REAL NOT NULL,
+    explanation TEXT NOT NULL,
+    contributing_factors TEXT NOT NULL,
+    credit_recommendation TEXT NULL,
+    created_date DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS IX_ScoringDetails_EvaluationId ON ScoringDetails(evaluation_id);
+CREATE INDEX IF NOT EXISTS IX_ScoringDetails_FinalScore ON ScoringDetails(final_score);
+
+CREATE TABLE IF NOT EXISTS EvaluationDailyStats (
+    stat_date DATE NOT NULL,
+    status TEXT NOT NULL,
+    risk_level TEXT NOT NULL DEFAULT '',
+    evaluation_count INTEGER NOT NULL DEFAULT 0,
+    timed_count INTEGER NOT NULL DEFAULT 0,
+    processing_minutes REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, status, risk_level)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStorageService(SQLEvaluationStorage):
+    """
+    Persistencia de evaluaciones, scoring y simulaciones en un archivo SQLite
+    Implementa la misma interfaz que AzureSQLService
+    """
+
+    def __init__(self, config: Optional[StorageConfig] = None, path: Optional[str] = None):
+        self.config = config or StorageConfig.from_env()
+        self.path = path or self.config.sqlite_path
+        self.logger = logging.getLogger(__name__)
+
+        if self.config.sqlite_synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {self.config.sqlite_synchronous}")
+
+        in_memory = self.path == ":memory:"
+        if not in_memory:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+
+        # Una base en memoria solo existe dentro de su conexión: pool de una, sin reaping
+        self.connection_pool = ConnectionPool(
+            self._connect,
+            pool_size=1 if in_memory else self.config.sqlite_pool_size,
+            min_size=1,
+            idle_timeout=float("inf") if in_memory else 600.0,
+            validate_after=float("inf"),
+            acquire_timeout=30.0
+        )
+
+        # Initialize database schema
+        self._initialize_schema()
+        self._ensure_statistics_rollup()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.config.sqlite_synchronous}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _initialize_schema(self):
+        """Inicializa el esquema de base de datos"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                conn.executescript(SCHEMA)
+                conn.commit()
+                self.logger.info(f"SQLite schema initialized at {self.path}")
+
+        except Exception as e:
+            self.logger.error(f"Failed to initialize SQLite schema: {e}")
+            raise
+
+    def describe(self) -> Dict[str, Any]:
+        return {"server": "sqlite", "database": self.path}
+
@@ -0,0 +1,1454 @@
+"""
+Storage Backend
+Interfaz de persistencia de evaluaciones y piezas comunes a sus implementaciones
+- Modelos de datos (RiskEvaluation, AgentResult, ScenarioSimulation, ScoringDetail)
+- Pool elástico de conexiones DB-API
+- EvaluationStorage (interfaz) y SQLEvaluationStorage (SQL común a Azure SQL y SQLite)
+- Estadísticas agregadas en EvaluationDailyStats, mantenidas en cada escritura
+- save_evaluation_bundles: lotes de evaluaciones completas en una transacción (write-behind)
+- Historial por empresa y cartera con paginación keyset sobre índices de cobertura
+- AsyncEvaluationStorage: variante asíncrona para el event loop
+- create_evaluation_storage: selección del backend con STORAGE_BACKEND
+
+Backends: "azure_sql" (AzureSQLService, pyodbc) y "sqlite" (SQLiteStorageService,
+embebido y sin servidor; WAL). Por defecto azure_sql.
+"""
+
+import asyncio
+import base64
+import functools
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class RiskEvaluation:
+    """Modelo de datos para evaluaciones de riesgo"""
+    evaluation_id: str
+    company_id: str
+    company_name: str
+    status: str  # 'pending', 'in_progress', 'completed', 'failed'
+    final_score: Optional[float] = None
+    risk_level: Optional[str] = None  # 'alto', 'medio', 'bajo'
+    confidence_score: Optional[float] = None
+    created_date: Optional[datetime] = None
+    completed_date: Optional[datetime] = None
+    metadata: Optional[str] = None  # JSON string
+
+
+@dataclass
+class AgentResult:
+    """Modelo de datos para resultados de agentes"""
+    result_id: str
+    evaluation_id: str
+    agent_name: str
+    agent_type: str  # 'security', 'business', 'infrastructure'
+    result_data: str  # JSON string
+    confidence_score: float
+    processing_time_ms: int
+    created_date: Optional[datetime] = None
+    error_message: Optional[str] = None
+
+
+@dataclass
+class ScenarioSimulation:
+    """Modelo de datos para simulaciones de escenarios"""
+    simulation_id: str
+    evaluation_id: str
+    scenario_name: str
+    variable_changes: str  # JSON string
+    original_score: float
+    simulated_score: float
+    impact_analysis: str  # JSON string
+    viability_score: float
+    created_date: Optional[datetime] = None
+
+
+@dataclass
+class ScoringDetail:
+    """Modelo de datos para detalles de scoring"""
+    scoring_id: str
+    evaluation_id: str
+    financial_score: float
+    reputational_score: float
+    behavioral_score: float
+    final_score: float
+    explanation: str
+    contributing_factors: str  # JSON string
+    credit_recommendation: Optional[str] = None  # JSON string
+    created_date: Optional[datetime] = None
+
+
+@dataclass
+class EvaluationBundle:
+    """Evaluación completa (fila, resultados de agentes y scoring) como unidad de escritura"""
+    evaluation: RiskEvaluation
+    agent_results: List[AgentResult] = field(default_factory=list)
+    scoring: Optional[ScoringDetail] = None
+
+
+@dataclass
+class EvaluationSummary:
+    """Proyección de RiskEvaluations para listados (sin la columna metadata)"""
+    evaluation_id: str
+    company_id: str
+    company_name: str
+    status: str
+    final_score: Optional[float] = None
+    risk_level: Optional[str] = None
+    confidence_score: Optional[float] = None
+    created_date: Optional[datetime] = None
+    completed_date: Optional[datetime] = None
+
+
+@dataclass
+class EvaluationPage:
+    """Página de un listado; next_cursor es None en la última página"""
+    items: List[EvaluationSummary]
+    next_cursor: Optional[str] = None
+
+
+class ConnectionPoolTimeout(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera del pool"""
+
+
+class ConnectionPool:
+    """
+    Pool elástico de conexiones DB-API (pyodbc para Azure SQL, sqlite3 en local)
+    
+    - Creación perezosa: las conexiones se abren al pedirlas, hasta pool_size (máximo)
+    - Conexiones libres en pila LIFO: las de uso frecuente se mantienen calientes y
+      las del fondo que superan idle_timeout se cierran, sin bajar de min_size
+    - Verificación con SELECT 1 solo al prestar una conexión inactiva más de
+      validate_after segundos o al devolverla tras un error
+    - Métricas de espera, utilización y rotación en get_stats()
+    """
+    
+    def __init__(self, connect: Callable[[], Any], pool_size: int = 10, min_size: int = 1,
+                 idle_timeout: float = 300.0, validate_after: float = 60.0,
+                 acquire_timeout: float = 30.0):
+        self.pool_size = max(1, pool_size)
+        self.min_size = max(0, min(min_size, self.pool_size))
+        self.idle_timeout = idle_timeout
+        self.validate_after = validate_after
+        self.acquire_timeout = acquire_timeout
+        self._connect = connect
+        self.lock = threading.Lock()
+        self._available = threading.Condition(self.lock)
+        self.logger = logging.getLogger(__name__)
+        
+        # (conexión, instante del último uso); el final de la lista es la más reciente
+        self._idle: List[Tuple[Any, float]] = []
+        # Conexiones abiertas o en creación (libres + prestadas)
+        self._size = 0
+        self._in_use = 0
+        self.stats = {
+            "acquisitions": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "timeouts": 0,
+            "peak_in_use": 0,
+            "created": 0,
+            "closed": 0,
+            "reaped": 0,
+            "validations": 0,
+            "validation_failures": 0
+        }
+    
+    @contextmanager
+    def get_connection(self):
+        """Context manager para obtener conexión del pool"""
+        conn = self._acquire()
+        failed = False
+        try:
+            yield conn
+        except Exception as e:
+            failed = True
+            self.logger.error(f"Connection pool error: {e}")
+            raise
+        finally:
+            self._release(conn, failed)
+    
+    def _acquire(self):
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        while True:
+            create = False
+            conn, last_used = None, 0.0
+            with self._available:
+                stale = self._reap_locked(time.monotonic())
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.pool_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        raise ConnectionPoolTimeout(
+                            f"No connection available after {self.acquire_timeout:g}s "
+                            f"({self._in_use}/{self.pool_size} in use)"
+                        )
+                    self._available.wait(remaining)
+            self._close_all(stale)
+            
+            if conn is None and not create:
+                continue
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._available:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+                with self.lock:
+                    self.stats["created"] += 1
+            elif time.monotonic() - last_used > self.validate_after and not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            
+            self._checked_out(time.monotonic() - started)
+            return conn
+    
+    def _release(self, conn, failed: bool):
+        alive = True
+        if failed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            alive = self._is_alive(conn)
+        
+        with self._available:
+            self._in_use -= 1
+            if alive:
+                self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+        if not alive:
+            self._discard(conn)
+    
+    def _checked_out(self, waited: float):
+        with self.lock:
+            self._in_use += 1
+            self.stats["acquisitions"] += 1
+            self.stats["total_wait_seconds"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+            self.stats["peak_in_use"] = max(self.stats["peak_in_use"], self._in_use)
+    
+    def _is_alive(self, conn) -> bool:
+        with self.lock:
+            self.stats["validations"] += 1
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except Exception:
+            with self.lock:
+                self.stats["validation_failures"] += 1
+            return False
+    
+    def _discard(self, conn):
+        """Cierra una conexión rota y libera su hueco"""
+        with self._available:
+            self._size -= 1
+            self._available.notify()
+        self._close_all([conn])
+    
+    def _reap_locked(self, now: float) -> List[Any]:
+        """Saca del fondo de la pila las conexiones inactivas sobre min_size (con el lock tomado)"""
+        stale = []
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            self.stats["reaped"] += 1
+            stale.append(conn)
+        return stale
+    
+    def _close_all(self, connections: List[Any]):
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if connections:
+            with self.lock:
+                self.stats["closed"] += len(connections)
+    
+    def reap_idle(self) -> int:
+        """Cierra ya las conexiones inactivas que superan idle_timeout; devuelve cuántas"""
+        with self.lock:
+            stale = self._reap_locked(time.monotonic())
+        self._close_all(stale)
+        return len(stale)
+    
+    def close(self):
+        """Cierra las conexiones libres (las prestadas se cierran al devolverse rotas)"""
+        with self._available:
+            stale = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(stale)
+        self._close_all(stale)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Tamaño, utilización, tiempos de espera y rotación de conexiones"""
+        with self.lock:
+            stats = dict(self.stats)
+            acquisitions = stats["acquisitions"]
+            return {
+                "min_size": self.min_size,
+                "max_size": self.pool_size,
+                "open_connections": self._size,
+                "idle_connections": len(self._idle),
+                "in_use": self._in_use,
+                "utilization": round(self._in_use / self.pool_size, 3),
+                "peak_utilization": round(stats["peak_in_use"] / self.pool_size, 3),
+                "acquisitions": acquisitions,
+                "avg_wait_ms": round(stats["total_wait_seconds"] * 1000 / acquisitions, 3) if acquisitions else 0.0,
+                "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 3),
+                "timeouts": stats["timeouts"],
+                "connections_created": stats["created"],
+                "connections_closed": stats["closed"],
+                "connections_reaped": stats["reaped"],
+                "churn_ratio": round((stats["created"] + stats["closed"]) / acquisitions, 4) if acquisitions else 0.0,
+                "validations": stats["validations"],
+                "validation_failures": stats["validation_failures"]
+            }
+
+
+class EvaluationStorage(ABC):
+    """
+    Interfaz de persistencia de evaluaciones, resultados de agentes, scoring y simulaciones
+    
+    Los métodos no lanzan excepciones por fallos de la base de datos: registran el
+    error y devuelven False, None, [] o {} según el caso. Las lecturas por evaluación
+    fallidas se cuentan en read_failures, para distinguir un error de un resultado vacío.
+    """
+    
+    connection_pool: ConnectionPool
+    read_failures: int = 0
+    
+    # Risk Evaluations
+    
+    @abstractmethod
+    def create_risk_evaluation(self, evaluation: RiskEvaluation) -> bool:
+        """Crea una nueva evaluación de riesgo"""
+    
+    @abstractmethod
+    def get_risk_evaluation(self, evaluation_id: str) -> Optional[RiskEvaluation]:
+        """Obtiene una evaluación de riesgo por ID"""
+    
+    @abstractmethod
+    def update_risk_evaluation_status(self, evaluation_id: str, status: str,
+                                      final_score: float = None,
+                                      risk_level: str = None,
+                                      confidence_score: float = None) -> bool:
+        """Actualiza el estado de una evaluación de riesgo"""
+    
+    # Agent Results
+    
+    @abstractmethod
+    def save_agent_result(self, result: AgentResult) -> bool:
+        """Guarda el resultado de un agente"""
+    
+    @abstractmethod
+    def get_agent_results_by_evaluation(self, evaluation_id: str) -> List[AgentResult]:
+        """Obtiene todos los resultados de agentes para una evaluación"""
+    
+    # Scoring Details
+    
+    @abstractmethod
+    def save_scoring_details(self, scoring: ScoringDetail) -> bool:
+        """Guarda los detalles de scoring"""
+    
+    @abstractmethod
+    def get_scoring_details(self, evaluation_id: str) -> Optional[ScoringDetail]:
+        """Obtiene los detalles de scoring para una evaluación"""
+    
+    # Scenario Simulations
+    
+    @abstractmethod
+    def save_scenario_simulation(self, simulation: ScenarioSimulation) -> bool:
+        """Guarda una simulación de escenario"""
+    
+    @abstractmethod
+    def get_scenario_simulations(self, evaluation_id: str) -> List[ScenarioSimulation]:
+        """Obtiene todas las simulaciones para una evaluación"""
+    
+    # Unit of Work
+    
+    @abstractmethod
+    def save_evaluation_bundle(self, evaluation: RiskEvaluation,
+                               agent_results: Optional[List[AgentResult]] = None,
+                               scoring: Optional[ScoringDetail] = None) -> bool:
+        """Persiste evaluación, resultados de agentes y scoring en una sola transacción"""
+    
+    def save_evaluation_bundles(self, bundles: List[EvaluationBundle]) -> bool:
+        """
+        Persiste un lote de evaluaciones completas; True solo si se guardaron todas
+        
+        Las implementaciones deben ser idempotentes (el write-behind reintenta lotes).
+        Por defecto guarda evaluación a evaluación; SQLEvaluationStorage usa una sola
+        transacción y reemplaza los AgentResult y el ScoringDetail existentes.
+        """
+        return all([self.save_evaluation_bundle(bundle.evaluation, bundle.agent_results, bundle.scoring)
+                    for bundle in bundles])
+    
+    # History and Portfolio
+    
+    @abstractmethod
+    def get_company_history(self, company_id: str, limit: int = 50,
+                            cursor: Optional[str] = None) -> EvaluationPage:
+        """Evaluaciones de una empresa, de la más reciente a la más antigua"""
+    
+    @abstractmethod
+    def list_evaluations(self, risk_level: Optional[str] = None,
+                         start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         limit: int = 50, cursor: Optional[str] = None) -> EvaluationPage:
+        """Cartera filtrada por nivel de riesgo y rango de fechas [start_date, end_date)"""
+    
+    @abstractmethod
+    def get_score_trend(self, company_id: str, limit: int = 24) -> List[Dict[str, Any]]:
+        """Últimos scores completados de una empresa, en orden cronológico"""
+    
+    # Analytics and Health
+    
+    @abstractmethod
+    def get_evaluation_statistics(self) -> Dict[str, Any]:
+        """Obtiene estadísticas de evaluaciones"""
+    
+    @abstractmethod
+    def get_statistics_series(self, days: int = 30) -> Dict[str, Any]:
+        """Series diarias de evaluaciones por estado y nivel de riesgo"""
+    
+    @abstractmethod
+    def health_check(self) -> Dict[str, Any]:
+        """Verifica el estado de salud del almacenamiento"""
+
+
+class SQLEvaluationStorage(EvaluationStorage):
+    """
+    Implementación común sobre DB-API con parámetros "?" (pyodbc y sqlite3)
+    
+    Las subclases crean self.connection_pool y el esquema (incluida EvaluationDailyStats),
+    llaman a _ensure_statistics_rollup() tras crearlo y definen el dialecto:
+    rollup_lock_hint (bloqueo del UPDATE de la agregación), top_template/limit_template
+    (límite de filas) y describe().
+    
+    EvaluationDailyStats guarda, por día de creación, estado y nivel de riesgo, el
+    número de evaluaciones y el tiempo de procesamiento acumulado. Cada escritura de
+    RiskEvaluations aplica en su misma transacción la diferencia entre la fila
+    anterior y la nueva, así que las estadísticas no recorren RiskEvaluations.
+    """
+    
+    rollup_lock_hint = ""
+    top_template = ""
+    limit_template = " LIMIT {n}"
+    
+    # Columnas de EvaluationSummary: todas cubiertas por los índices de listado
+    SUMMARY_COLUMNS = """evaluation_id, company_id, company_name, status, final_score,
+                       risk_level, confidence_score, created_date, completed_date"""
+    MAX_PAGE_SIZE = 500
+    
+    def describe(self) -> Dict[str, Any]:
+        """Identificación del backend para health_check"""
+        return {}
+    
+    def _read_failed(self, message: str) -> None:
+        """Registra una lectura fallida (su resultado vacío no es un dato)"""
+        self.read_failures += 1
+        self.logger.error(message)
+    
+    # Risk Evaluations CRUD Operations
+    
+    def create_risk_evaluation(self, evaluation: RiskEvaluation) -> bool:
+        """Crea una nueva evaluación de riesgo"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                INSERT INTO RiskEvaluations 
+                (evaluation_id, company_id, company_name, status, final_score, 
+                 risk_level, confidence_score, created_date, completed_date, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+                
+                cursor.execute(sql, (
+                    evaluation.evaluation_id,
+                    evaluation.company_id,
+                    evaluation.company_name,
+                    evaluation.status,
+                    evaluation.final_score,
+                    evaluation.risk_level,
+                    evaluation.confidence_score,
+                    evaluation.created_date or datetime.now(),
+                    evaluation.completed_date,
+                    evaluation.metadata
+                ))
+                self._apply_rollup_delta(cursor, None, (
+                    evaluation.created_date or datetime.now(),
+                    evaluation.status,
+                    evaluation.risk_level,
+                    evaluation.completed_date
+                ))
+                
+                conn.commit()
+                self.logger.info(f"Risk evaluation created: {evaluation.evaluation_id}")
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to create risk evaluation: {e}")
+            return False
+    
+    def get_risk_evaluation(self, evaluation_id: str) -> Optional[RiskEvaluation]:
+        """Obtiene una evaluación de riesgo por ID"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                SELECT evaluation_id, company_id, company_name, status, final_score,
+                       risk_level, confidence_score, created_date, completed_date, metadata
+                FROM RiskEvaluations 
+                WHERE evaluation_id = ?
+                """
+                
+                cursor.execute(sql, (evaluation_id,))
+                row = cursor.fetchone()
+                
+                if row:
+                    return RiskEvaluation(
+                        evaluation_id=row[0],
+                        company_id=row[1],
+                        company_name=row[2],
+                        status=row[3],
+                        final_score=row[4],
+                        risk_level=row[5],
+                        confidence_score=row[6],
+                        created_date=row[7],
+                        completed_date=row[8],
+                        metadata=row[9]
+                    )
+                
+                return None
+                
+        except Exception as e:
+            self._read_failed(f"Failed to get risk evaluation: {e}")
+            return None
+    
+    def update_risk_evaluation_status(self, evaluation_id: str, status: str, 
+                                    final_score: float = None, 
+                                    risk_level: str = None,
+                                    confidence_score: float = None) -> bool:
+        """Actualiza el estado de una evaluación de riesgo"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                previous = self._select_rollup_row(cursor, evaluation_id)
+                now = datetime.now()
+                
+                sql = """
+                UPDATE RiskEvaluations 
+                SET status = ?, final_score = ?, risk_level = ?, confidence_score = ?,
+                    completed_date = CASE WHEN ? = 'completed' THEN ? ELSE completed_date END
+                WHERE evaluation_id = ?
+                """
+                
+                cursor.execute(sql, (status, final_score, risk_level, confidence_score, status,
+                                     now, evaluation_id))
+                updated = cursor.rowcount > 0
+                if updated and previous:
+                    self._apply_rollup_delta(cursor, previous, (
+                        previous[0],
+                        status,
+                        risk_level,
+                        now if status == "completed" else previous[3]
+                    ))
+                conn.commit()
+                
+                return updated
+                
+        except Exception as e:
+            self.logger.error(f"Failed to update risk evaluation status: {e}")
+            return False
+    
+    # Agent Results CRUD Operations
+    
+    def save_agent_result(self, result: AgentResult) -> bool:
+        """Guarda el resultado de un agente"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                INSERT INTO AgentResults 
+                (result_id, evaluation_id, agent_name, agent_type, result_data,
+                 confidence_score, processing_time_ms, created_date, error_message)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+                
+                cursor.execute(sql, (
+                    result.result_id,
+                    result.evaluation_id,
+                    result.agent_name,
+                    result.agent_type,
+                    result.result_data,
+                    result.confidence_score,
+                    result.processing_time_ms,
+                    result.created_date or datetime.now(),
+                    result.error_message
+                ))
+                
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to save agent result: {e}")
+            return False
+    
+    def get_agent_results_by_evaluation(self, evaluation_id: str) -> List[AgentResult]:
+        """Obtiene todos los resultados de agentes para una evaluación"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                SELECT result_id, evaluation_id, agent_name, agent_type, result_data,
+                       confidence_score, processing_time_ms, created_date, error_message
+                FROM AgentResults 
+                WHERE evaluation_id = ?
+                ORDER BY created_date
+                """
+                
+                cursor.execute(sql, (evaluation_id,))
+                rows = cursor.fetchall()
+                
+                results = []
+                for row in rows:
+                    results.append(AgentResult(
+                        result_id=row[0],
+                        evaluation_id=row[1],
+                        agent_name=row[2],
+                        agent_type=row[3],
+                        result_data=row[4],
+                        confidence_score=row[5],
+                        processing_time_ms=row[6],
+                        created_date=row[7],
+                        error_message=row[8]
+                    ))
+                
+                return results
+                
+        except Exception as e:
+            self._read_failed(f"Failed to get agent results: {e}")
+            return []
+    
+    # Scoring Details CRUD Operations
+    
+    def save_scoring_details(self, scoring: ScoringDetail) -> bool:
+        """Guarda los detalles de scoring"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                INSERT INTO ScoringDetails 
+                (scoring_id, evaluation_id, financial_score, reputational_score,
+                 behavioral_score, final_score, explanation, contributing_factors,
+                 credit_recommendation, created_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+                
+                cursor.execute(sql, (
+                    scoring.scoring_id,
+                    scoring.evaluation_id,
+                    scoring.financial_score,
+                    scoring.reputational_score,
+                    scoring.behavioral_score,
+                    scoring.final_score,
+                    scoring.explanation,
+                    scoring.contributing_factors,
+                    scoring.credit_recommendation,
+                    scoring.created_date or datetime.now()
+                ))
+                
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to save scoring details: {e}")
+            return False
+    
+    def get_scoring_details(self, evaluation_id: str) -> Optional[ScoringDetail]:
+        """Obtiene los detalles de scoring para una evaluación"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                SELECT scoring_id, evaluation_id, financial_score, reputational_score,
+                       behavioral_score, final_score, explanation, contributing_factors,
+                       credit_recommendation, created_date
+                FROM ScoringDetails 
+                WHERE evaluation_id = ?
+                """
+                
+                cursor.execute(sql, (evaluation_id,))
+                row = cursor.fetchone()
+                
+                if row:
+                    return ScoringDetail(
+                        scoring_id=row[0],
+                        evaluation_id=row[1],
+                        financial_score=row[2],
+                        reputational_score=row[3],
+                        behavioral_score=row[4],
+                        final_score=row[5],
+                        explanation=row[6],
+                        contributing_factors=row[7],
+                        credit_recommendation=row[8],
+                        created_date=row[9]
+                    )
+                
+                return None
+                
+        except Exception as e:
+            self._read_failed(f"Failed to get scoring details: {e}")
+            return None
+    
+    # Scenario Simulations CRUD Operations
+    
+    def save_scenario_simulation(self, simulation: ScenarioSimulation) -> bool:
+        """Guarda una simulación de escenario"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                INSERT INTO ScenarioSimulations 
+                (simulation_id, evaluation_id, scenario_name, variable_changes,
+                 original_score, simulated_score, impact_analysis, viability_score, created_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+                
+                cursor.execute(sql, (
+                    simulation.simulation_id,
+                    simulation.evaluation_id,
+                    simulation.scenario_name,
+                    simulation.variable_changes,
+                    simulation.original_score,
+                    simulation.simulated_score,
+                    simulation.impact_analysis,
+                    simulation.viability_score,
+                    simulation.created_date or datetime.now()
+                ))
+                
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to save scenario simulation: {e}")
+            return False
+    
+    def get_scenario_simulations(self, evaluation_id: str) -> List[ScenarioSimulation]:
+        """Obtiene todas las simulaciones para una evaluación"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = """
+                SELECT simulation_id, evaluation_id, scenario_name, variable_changes,
+                       original_score, simulated_score, impact_analysis, viability_score, created_date
+                FROM ScenarioSimulations 
+                WHERE evaluation_id = ?
+                ORDER BY created_date DESC
+                """
+                
+                cursor.execute(sql, (evaluation_id,))
+                rows = cursor.fetchall()
+                
+                simulations = []
+                for row in rows:
+                    simulations.append(ScenarioSimulation(
+                        simulation_id=row[0],
+                        evaluation_id=row[1],
+                        scenario_name=row[2],
+                        variable_changes=row[3],
+                        original_score=row[4],
+                        simulated_score=row[5],
+                        impact_analysis=row[6],
+                        viability_score=row[7],
+                        created_date=row[8]
+                    ))
+                
+                return simulations
+                
+        except Exception as e:
+            self._read_failed(f"Failed to get scenario simulations: {e}")
+            return []
+    
+    # Unit of Work
+    
+    def save_evaluation_bundle(self, evaluation: RiskEvaluation,
+                               agent_results: Optional[List[AgentResult]] = None,
+                               scoring: Optional[ScoringDetail] = None) -> bool:
+        """
+        Persiste una evaluación completa en una sola transacción
+        
+        Actualiza (o inserta si no existe) la fila de RiskEvaluations, inserta todos
+        los AgentResult con un único executemany (fast_executemany en pyodbc) y el
+        ScoringDetail. Un solo préstamo de conexión y un solo commit: si algo falla
+        se hace rollback y no queda ninguna fila parcial.
+        """
+        agent_results = agent_results or []
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    self._write_bundle(cursor, evaluation, agent_results, scoring)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                
+                self.logger.info(f"Evaluation bundle saved: {evaluation.evaluation_id} "
+                                 f"({len(agent_results)} agent results)")
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to save evaluation bundle: {e}")
+            return False
+    
+    def save_evaluation_bundles(self, bundles: List[EvaluationBundle]) -> bool:
+        """
+        Persiste un lote de evaluaciones completas en una sola transacción
+        
+        Idempotente: borra antes los AgentResult y el ScoringDetail de cada evaluación
+        del lote, así que reintentar un lote (o reprocesar el spill del write-behind)
+        tras un commit dudoso no duplica filas. Si algo falla no se guarda nada del lote.
+        """
+        if not bundles:
+            return True
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    for bundle in bundles:
+                        self._write_bundle(cursor, bundle.evaluation, bundle.agent_results,
+                                           bundle.scoring, replace=True)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                
+                self.logger.info(f"Evaluation batch saved: {len(bundles)} evaluations")
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to save evaluation batch: {e}")
+            return False
+    
+    def _write_bundle(self, cursor, evaluation: RiskEvaluation, agent_results: List[AgentResult],
+                      scoring: Optional[ScoringDetail], replace: bool = False):
+        """Escribe una evaluación completa en la transacción en curso"""
+        self._upsert_evaluation_row(cursor, evaluation)
+        
+        if replace:
+            cursor.execute("DELETE FROM AgentResults WHERE evaluation_id = ?", (evaluation.evaluation_id,))
+            cursor.execute("DELETE FROM ScoringDetails WHERE evaluation_id = ?", (evaluation.evaluation_id,))
+        
+        if agent_results:
+            if hasattr(cursor, "fast_executemany"):
+                cursor.fast_executemany = True
+            cursor.executemany("""
+            INSERT INTO AgentResults 
+            (result_id, evaluation_id, agent_name, agent_type, result_data,
+             confidence_score, processing_time_ms, created_date, error_message)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [self._agent_result_params(result) for result in agent_results])
+        
+        if scoring:
+            cursor.execute("""
+            INSERT INTO ScoringDetails 
+            (scoring_id, evaluation_id, financial_score, reputational_score,
+             behavioral_score, final_score, explanation, contributing_factors,
+             credit_recommendation, created_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, self._scoring_params(scoring))
+    
+    def _upsert_evaluation_row(self, cursor, evaluation: RiskEvaluation):
+        """UPDATE de la evaluación y INSERT si aún no existe (misma transacción)"""
+        completed_date = evaluation.completed_date
+        if completed_date is None and evaluation.status == "completed":
+            completed_date = datetime.now()
+        previous = self._select_rollup_row(cursor, evaluation.evaluation_id)
+        
+        cursor.execute("""
+        UPDATE RiskEvaluations 
+        SET company_id = ?, company_name = ?, status = ?, final_score = ?, risk_level = ?,
+            confidence_score = ?, completed_date = ?, metadata = COALESCE(?, metadata)
+        WHERE evaluation_id = ?
+        """, (
+            evaluation.company_id,
+            evaluation.company_name,
+            evaluation.status,
+            evaluation.final_score,
+            evaluation.risk_level,
+            evaluation.confidence_score,
+            completed_date,
+            evaluation.metadata,
+            evaluation.evaluation_id
+        ))
+        
+        if cursor.rowcount > 0:
+            created_date = previous[0] if previous else evaluation.created_date
+        else:
+            previous = None
+            created_date = evaluation.created_date or datetime.now()
+            cursor.execute("""
+            INSERT INTO RiskEvaluations 
+            (evaluation_id, company_id, company_name, status, final_score, 
+             risk_level, confidence_score, created_date, completed_date, metadata)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                evaluation.evaluation_id,
+                evaluation.company_id,
+                evaluation.company_name,
+                evaluation.status,
+                evaluation.final_score,
+                evaluation.risk_level,
+                evaluation.confidence_score,
+                created_date,
+                completed_date,
+                evaluation.metadata
+            ))
+        
+        self._apply_rollup_delta(cursor, previous, (
+            created_date, evaluation.status, evaluation.risk_level, completed_date
+        ))
+    
+    @staticmethod
+    def _agent_result_params(result: AgentResult) -> Tuple:
+        return (
+            result.result_id,
+            result.evaluation_id,
+            result.agent_name,
+            result.agent_type,
+            result.result_data,
+            result.confidence_score,
+            result.processing_time_ms,
+            result.created_date or datetime.now(),
+            result.error_message
+        )
+    
+    @staticmethod
+    def _scoring_params(scoring: ScoringDetail) -> Tuple:
+        return (
+            scoring.scoring_id,
+            scoring.evaluation_id,
+            scoring.financial_score,
+            scoring.reputational_score,
+            scoring.behavioral_score,
+            scoring.final_score,
+            scoring.explanation,
+            scoring.contributing_factors,
+            scoring.credit_recommendation,
+            scoring.created_date or datetime.now()
+        )
+    
+    # History and Portfolio
+    
+    def get_company_history(self, company_id: str, limit: int = 50,
+                            cursor: Optional[str] = None) -> EvaluationPage:
+        """
+        Evaluaciones de una empresa, de la más reciente a la más antigua
+        
+        Paginación keyset sobre (created_date, evaluation_id): cada página es una
+        búsqueda en IX_RiskEvaluations_Company_Created, sin OFFSET ni leer metadata.
+        """
+        return self._page_evaluations("company_id = ?", [company_id], limit, cursor)
+    
+    def list_evaluations(self, risk_level: Optional[str] = None,
+                         start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         limit: int = 50, cursor: Optional[str] = None) -> EvaluationPage:
+        """Cartera filtrada por nivel de riesgo y rango de fechas [start_date, end_date)"""
+        conditions, params = [], []
+        if risk_level:
+            conditions.append("risk_level = ?")
+            params.append(risk_level)
+        if start_date:
+            conditions.append("created_date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("created_date < ?")
+            params.append(end_date)
+        return self._page_evaluations(" AND ".join(conditions), params, limit, cursor)
+    
+    def get_score_trend(self, company_id: str, limit: int = 24) -> List[Dict[str, Any]]:
+        """Últimos scores completados de una empresa, en orden cronológico"""
+        limit = max(1, min(int(limit), self.MAX_PAGE_SIZE))
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                sql = f"""
+                SELECT {self.top_template.format(n=limit)}evaluation_id, created_date, completed_date,
+                       final_score, risk_level, confidence_score
+                FROM RiskEvaluations 
+                WHERE company_id = ? AND status = 'completed' AND final_score IS NOT NULL
+                ORDER BY created_date DESC, evaluation_id DESC{self.limit_template.format(n=limit)}
+                """
+                
+                cursor.execute(sql, (company_id,))
+                rows = cursor.fetchall()
+                
+                return [
+                    {
+                        "evaluation_id": row[0],
+                        "created_date": row[1].isoformat() if row[1] else None,
+                        "completed_date": row[2].isoformat() if row[2] else None,
+                        "final_score": row[3],
+                        "risk_level": row[4],
+                        "confidence_score": row[5]
+                    }
+                    for row in reversed(rows)
+                ]
+                
+        except Exception as e:
+            self.logger.error(f"Failed to get score trend: {e}")
+            return []
+    
+    def _page_evaluations(self, where: str, params: List[Any], limit: int,
+                          cursor: Optional[str]) -> EvaluationPage:
+        limit = max(1, min(int(limit), self.MAX_PAGE_SIZE))
+        conditions = [where] if where else []
+        params = list(params)
+        if cursor:
+            after_date, after_id = self._decode_cursor(cursor)
+            # Forma apta para búsqueda en índice también en SQL Server (sin comparación de tuplas)
+            conditions.append("created_date <= ? AND (created_date < ? OR evaluation_id < ?)")
+            params.extend([after_date, after_date, after_id])
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        try:
+            with self.connection_pool.get_connection() as conn:
+                db_cursor = conn.cursor()
+                
+                # Una fila de más indica si hay página siguiente
+                fetch = limit + 1
+                sql = f"""
+                SELECT {self.top_template.format(n=fetch)}{self.SUMMARY_COLUMNS}
+                FROM RiskEvaluations 
+                {where_sql}
+                ORDER BY created_date DESC, evaluation_id DESC{self.limit_template.format(n=fetch)}
+                """
+                
+                db_cursor.execute(sql, params)
+                rows = db_cursor.fetchall()
+                
+                items = [EvaluationSummary(*row) for row in rows[:limit]]
+                next_cursor = None
+                if len(rows) > limit:
+                    last = items[-1]
+                    next_cursor = self._encode_cursor(last.created_date, last.evaluation_id)
+                return EvaluationPage(items=items, next_cursor=next_cursor)
+                
+        except Exception as e:
+            self.logger.error(f"Failed to list evaluations: {e}")
+            return EvaluationPage(items=[])
+    
+    @staticmethod
+    def _encode_cursor(created_date: datetime, evaluation_id: str) -> str:
+        raw = f"{created_date.isoformat()}|{evaluation_id}"
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+            created_date, evaluation_id = raw.split("|", 1)
+            return datetime.fromisoformat(created_date), evaluation_id
+        except (ValueError, UnicodeError) as e:
+            raise ValueError(f"Invalid pagination cursor: {cursor}") from e
+    
+    # Analytics and Reporting
+    
+    def get_evaluation_statistics(self) -> Dict[str, Any]:
+        """Obtiene estadísticas de evaluaciones (desde la agregación, sin recorrer RiskEvaluations)"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT status, risk_level, SUM(evaluation_count),
+                           SUM(timed_count), SUM(processing_minutes)
+                    FROM EvaluationDailyStats 
+                    GROUP BY status, risk_level
+                """)
+                
+                total_evaluations = 0
+                status_counts: Dict[str, int] = {}
+                risk_level_counts: Dict[str, int] = {}
+                timed_count = 0
+                processing_minutes = 0.0
+                for status, risk_level, count, timed, minutes in cursor.fetchall():
+                    count = int(count or 0)
+                    if not count:
+                        continue
+                    total_evaluations += count
+                    status_counts[status] = status_counts.get(status, 0) + count
+                    if risk_level:
+                        risk_level_counts[risk_level] = risk_level_counts.get(risk_level, 0) + count
+                    timed_count += int(timed or 0)
+                    processing_minutes += float(minutes or 0)
+                
+                return {
+                    "total_evaluations": total_evaluations,
+                    "status_distribution": status_counts,
+                    "risk_level_distribution": risk_level_counts,
+                    "average_processing_time_minutes": processing_minutes / timed_count if timed_count else 0,
+                    "last_updated": datetime.now().isoformat()
+                }
+                
+        except Exception as e:
+            self.logger.error(f"Failed to get evaluation statistics: {e}")
+            return {}
+    
+    def get_statistics_series(self, days: int = 30) -> Dict[str, Any]:
+        """Series diarias (por fecha de creación) de evaluaciones por estado y nivel de riesgo"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                since = date.fromordinal(date.today().toordinal() - max(1, days) + 1)
+                
+                cursor.execute("""
+                    SELECT stat_date, status, risk_level, evaluation_count,
+                           timed_count, processing_minutes
+                    FROM EvaluationDailyStats 
+                    WHERE stat_date >= ?
+                    ORDER BY stat_date
+                """, (since,))
+                
+                series: Dict[str, Dict[str, Any]] = {}
+                for stat_date, status, risk_level, count, timed, minutes in cursor.fetchall():
+                    if not count:
+                        continue
+                    key = stat_date.isoformat() if hasattr(stat_date, "isoformat") else str(stat_date)
+                    day = series.setdefault(key, {
+                        "date": key, "total": 0, "by_status": {}, "by_risk_level": {},
+                        "timed_count": 0, "processing_minutes": 0.0
+                    })
+                    day["total"] += count
+                    day["by_status"][status] = day["by_status"].get(status, 0) + count
+                    if risk_level:
+                        day["by_risk_level"][risk_level] = day["by_risk_level"].get(risk_level, 0) + count
+                    day["timed_count"] += timed or 0
+                    day["processing_minutes"] += minutes or 0.0
+                
+                for day in series.values():
+                    timed = day.pop("timed_count")
+                    minutes = day.pop("processing_minutes")
+                    day["average_processing_time_minutes"] = minutes / timed if timed else 0
+                
+                return {
+                    "since": since.isoformat(),
+                    "days": list(series.values()),
+                    "last_updated": datetime.now().isoformat()
+                }
+                
+        except Exception as e:
+            self.logger.error(f"Failed to get statistics series: {e}")
+            return {}
+    
+    def rebuild_statistics(self) -> bool:
+        """
+        Recalcula EvaluationDailyStats desde RiskEvaluations (backfill)
+        
+        Necesario una vez al migrar una base existente, o para corregir la agregación
+        tras escrituras hechas fuera del servicio. Recorre la tabla en streaming.
+        """
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                buckets: Dict[Tuple[date, str, str], List[float]] = {}
+                
+                cursor.execute("SELECT created_date, status, risk_level, completed_date FROM RiskEvaluations")
+                while True:
+                    rows = cursor.fetchmany(5000)
+                    if not rows:
+                        break
+                    for row in rows:
+                        key, timed, minutes = self._rollup_contribution(tuple(row))
+                        bucket = buckets.setdefault(key, [0, 0, 0.0])
+                        bucket[0] += 1
+                        bucket[1] += timed
+                        bucket[2] += minutes
+                
+                try:
+                    cursor.execute("DELETE FROM EvaluationDailyStats")
+                    if buckets:
+                        cursor.executemany("""
+                        INSERT INTO EvaluationDailyStats 
+                        (stat_date, status, risk_level, evaluation_count, timed_count, processing_minutes)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """, [(*key, values[0], values[1], values[2]) for key, values in buckets.items()])
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                
+                self.logger.info(f"Evaluation statistics rebuilt: {len(buckets)} buckets")
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to rebuild evaluation statistics: {e}")
+            return False
+    
+    def _ensure_statistics_rollup(self):
+        """Backfill automático si la agregación está vacía y ya hay evaluaciones"""
+        with self.connection_pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM EvaluationDailyStats")
+            has_rollup = cursor.fetchone()[0] > 0
+            # MIN sobre la clave primaria: búsqueda en el índice, portable entre dialectos
+            cursor.execute("SELECT MIN(evaluation_id) FROM RiskEvaluations")
+            has_evaluations = cursor.fetchone()[0] is not None
+        if has_evaluations and not has_rollup:
+            self.rebuild_statistics()
+    
+    # Rollup maintenance
+    
+    @staticmethod
+    def _select_rollup_row(cursor, evaluation_id: str) -> Optional[Tuple]:
+        """(created_date, status, risk_level, completed_date) actuales de una evaluación"""
+        cursor.execute("""
+        SELECT created_date, status, risk_level, completed_date
+        FROM RiskEvaluations 
+        WHERE evaluation_id = ?
+        """, (evaluation_id,))
+        row = cursor.fetchone()
+        return tuple(row) if row else None
+    
+    @staticmethod
+    def _rollup_contribution(row: Tuple) -> Tuple[Tuple[date, str, str], int, float]:
+        """Clave (día, estado, nivel de riesgo) y tiempo de procesamiento de una fila"""
+        created_date, status, risk_level, completed_date = row
+        created_date = created_date or datetime.now()
+        day = created_date.date() if isinstance(created_date, datetime) else created_date
+        if completed_date is not None:
+            minutes = max(0.0, (completed_date - created_date).total_seconds() / 60)
+            return (day, status, risk_level or ""), 1, minutes
+        return (day, status, risk_level or ""), 0, 0.0
+    
+    def _apply_rollup_delta(self, cursor, previous: Optional[Tuple], current: Optional[Tuple]):
+        """Resta la contribución anterior de una fila y suma la nueva (misma transacción)"""
+        changes = []
+        if previous is not None:
+            key, timed, minutes = self._rollup_contribution(previous)
+            changes.append((key, -1, -timed, -minutes))
+        if current is not None:
+            key, timed, minutes = self._rollup_contribution(current)
+            if changes and changes[0][0] == key:
+                _, _, old_timed, old_minutes = changes.pop()
+                if timed + old_timed == 0 and abs(minutes + old_minutes) < 1e-9:
+                    return
+                changes.append((key, 0, timed + old_timed, minutes + old_minutes))
+            else:
+                changes.append((key, 1, timed, minutes))
+        
+        for (day, status, risk_level), count, timed, minutes in changes:
+            cursor.execute(f"""
+            UPDATE EvaluationDailyStats{self.rollup_lock_hint} 
+            SET evaluation_count = evaluation_count + ?, timed_count = timed_count + ?,
+                processing_minutes = processing_minutes + ?
+            WHERE stat_date = ? AND status = ? AND risk_level = ?
+            """, (count, timed, minutes, day, status, risk_level))
+            if cursor.rowcount == 0:
+                cursor.execute("""
+                INSERT INTO EvaluationDailyStats 
+                (stat_date, status, risk_level, evaluation_count, timed_count, processing_minutes)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, (day, status, risk_level, count, timed, minutes))
+    
+    def health_check(self) -> Dict[str, Any]:
+        """Verifica el estado de salud de la base de datos"""
+        try:
+            with self.connection_pool.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                
+                return {
+                    "status": "healthy",
+                    **self.describe(),
+                    "connection_pool_size": self.connection_pool.pool_size,
+                    "connection_pool": self.connection_pool.get_stats(),
+                    "last_check": datetime.now().isoformat()
+                }
+                
+        except Exception as e:
+            return {
+                "status": "unhealthy",
+                "error": str(e),
+                **self.describe(),
+                "last_check": datetime.now().isoformat()
+            }
+
+
+class AsyncEvaluationStorage:
+    """
+    Variante asíncrona de un EvaluationStorage para código que corre en el event loop
+
+    Los drivers (pyodbc, sqlite3) son bloqueantes: cada método delega en el backend
+    síncrono dentro de un ThreadPoolExecutor propio y acotado, con los mismos
+    nombres y resultados. El número de hilos no supera el tamaño del pool de
+    conexiones, así que la espera de ConnectionPool.get_connection ocurre en un
+    hilo y nunca bloquea el event loop. Configurable con STORAGE_ASYNC_WORKERS.
+    """
+
+    def __init__(self, service: EvaluationStorage, max_workers: Optional[int] = None):
+        self.service = service
+        self.logger = logging.getLogger(__name__)
+        pool_size = service.connection_pool.pool_size
+        workers = max_workers or int(os.getenv("STORAGE_ASYNC_WORKERS", "0")) or pool_size
+        self.max_workers = max(1, min(workers, pool_size))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="storage")
+
+    @classmethod
+    async def create(cls, factory: Callable[..., EvaluationStorage], *args: Any,
+                     max_workers: Optional[int] = None) -> 'AsyncEvaluationStorage':
+        """Crea el backend síncrono (conexiones y esquema) fuera del event loop y lo envuelve"""
+        service = await asyncio.to_thread(factory, *args)
+        return cls(service, max_workers)
+
+    @property
+    def connection_pool(self) -> ConnectionPool:
+        return self.service.connection_pool
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self, wait: bool = True) -> None:
+        """Detiene el pool de hilos (las consultas en curso terminan si wait=True) y cierra las conexiones libres"""
+        self._executor.shutdown(wait=wait)
+        self.service.connection_pool.close()
+
+    # Risk Evaluations
+
+    async def create_risk_evaluation(self, evaluation: RiskEvaluation) -> bool:
+        return await self._run(self.service.create_risk_evaluation, evaluation)
+
+    async def get_risk_evaluation(self, evaluation_id: str) -> Optional[RiskEvaluation]:
+        return await self._run(self.service.get_risk_evaluation, evaluation_id)
+
+    async def update_risk_evaluation_status(self, evaluation_id: str, status: str,
+                                            final_score: float = None,
+                                            risk_level: str = None,
+                                            confidence_score: float = None) -> bool:
+        return await self._run(self.service.update_risk_evaluation_status, evaluation_id, status,
+                               final_score, risk_level, confidence_score)
+
+    # Agent Results
+
+    async def save_agent_result(self, result: AgentResult) -> bool:
+        return await self._run(self.service.save_agent_result, result)
+
+    async def get_agent_results_by_evaluation(self, evaluation_id: str) -> List[AgentResult]:
+        return await self._run(self.service.get_agent_results_by_evaluation, evaluation_id)
+
+    # Scoring Details
+
+    async def save_scoring_details(self, scoring: ScoringDetail) -> bool:
+        return await self._run(self.service.save_scoring_details, scoring)
+
+    async def get_scoring_details(self, evaluation_id: str) -> Optional[ScoringDetail]:
+        return await self._run(self.service.get_scoring_details, evaluation_id)
+
+    # Scenario Simulations
+
+    async def save_scenario_simulation(self, simulation: ScenarioSimulation) -> bool:
+        return await self._run(self.service.save_scenario_simulation, simulation)
+
+    async def get_scenario_simulations(self, evaluation_id: str) -> List[ScenarioSimulation]:
+        return await self._run(self.service.get_scenario_simulations, evaluation_id)
+
+    # Unit of Work
+
+    async def save_evaluation_bundle(self, evaluation: RiskEvaluation,
+                                     agent_results: Optional[List[AgentResult]] = None,
+                                     scoring: Optional[ScoringDetail] = None) -> bool:
+        return await self._run(self.service.save_evaluation_bundle, evaluation, agent_results, scoring)
+    
+    async def save_evaluation_bundles(self, bundles: List[EvaluationBundle]) -> bool:
+        return await self._run(self.service.save_evaluation_bundles, bundles)
+
+    # History and Portfolio
+
+    async def get_company_history(self, company_id: str, limit: int = 50,
+                                  cursor: Optional[str] = None) -> EvaluationPage:
+        return await self._run(self.service.get_company_history, company_id, limit, cursor)
+
+    async def list_evaluations(self, risk_level: Optional[str] = None,
+                               start_date: Optional[datetime] = None,
+                               end_date: Optional[datetime] = None,
+                               limit: int = 50, cursor: Optional[str] = None) -> EvaluationPage:
+        return await self._run(self.service.list_evaluations, risk_level, start_date, end_date, limit, cursor)
+
+    async def get_score_trend(self, company_id: str, limit: int = 24) -> List[Dict[str, Any]]:
+        return await self._run(self.service.get_score_trend, company_id, limit)
+
+    # Analytics and Health
+
+    async def get_evaluation_statistics(self) -> Dict[str, Any]:
+        return await self._run(self.service.get_evaluation_statistics)
+
+    async def get_statistics_series(self, days: int = 30) -> Dict[str, Any]:
+        return await self._run(self.service.get_statistics_series, days)
+
+    async def health_check(self) -> Dict[str, Any]:
+        status = await self._run(self.service.health_check)
+        status["async_workers"] = self.max_workers
+        return status
+
+
+def create_evaluation_storage(backend: Optional[str] = None, sql_config=None,
+                              storage_config=None, cached: Optional[bool] = None) -> EvaluationStorage:
+    """
+    Instancia el backend de persistencia (por defecto STORAGE_BACKEND)
+    
+    - "azure_sql": AzureSQLService con sql_config (o AzureSQLConfig.from_env())
+    - "sqlite": SQLiteStorageService con storage_config (o StorageConfig.from_env())
+    
+    Con cached (por defecto EVALUATION_CACHE_ENABLED) se envuelve en CachedEvaluationStorage.
+    """
+    from ..config.azure_config import AzureSQLConfig, StorageConfig
+    
+    storage_config = storage_config or StorageConfig.from_env()
+    backend = (backend or storage_config.backend).lower()
+    
+    if backend == "azure_sql":
+        from .azure_sql_service import AzureSQLService
+        storage = AzureSQLService(sql_config or AzureSQLConfig.from_env())
+    elif backend == "sqlite":
+        from .sqlite_storage_service import SQLiteStorageService
+        storage = SQLiteStorageService(storage_config)
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    
+    if storage_config.cache_enabled if cached is None else cached:
+        from .evaluation_cache import CachedEvaluationStorage
+        storage = CachedEvaluationStorage(storage, storage_config.cache_ttl_seconds,
+                                          storage_config.cache_max_entries)
+    return storage
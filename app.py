@@ -8,10 +8,10 @@ import asyncio
 import time
 import os
 from datetime import datetime
-import PyPDF2
-import io
 import traceback
 
+from agents.infrastructure_agents.services.pdf_ingestion_service import extract_pdf_document
+
 # Configuración de la página
 st.set_page_config(
     page_title="PymeRisk - Evaluación de Riesgo Financiero",
@@ -354,62 +354,14 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def extract_text_from_pdf(pdf_file):
-    """Extrae texto de un archivo PDF con mejor manejo de espacios"""
+    """Extrae texto de un archivo PDF (motor de ingestión compartido con el orquestador, con caché por SHA-256)"""
     try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            # Mejorar el espaciado del texto extraído
-            page_text = improve_text_spacing(page_text)
-            text += page_text + "\n"
-        return text.strip()
+        document = extract_pdf_document(pdf_file.getvalue(), pdf_file.name)
+        return document["text"]
     except Exception as e:
         st.error(f"Error al extraer texto del PDF: {str(e)}")
         return None
 
-def improve_text_spacing(text):
-    """Mejora el espaciado del texto extraído de PDFs"""
-    import re
-    
-    if not text:
-        return text
-    
-    # Agregar espacios antes de números que siguen a letras
-    text = re.sub(r'([a-záéíóúñ])(\d)', r'\1 \2', text, flags=re.IGNORECASE)
-    
-    # Agregar espacios después de números que preceden a letras
-    text = re.sub(r'(\d)([a-záéíóúñ])', r'\1 \2', text, flags=re.IGNORECASE)
-    
-    # Agregar espacios antes de paréntesis que siguen a letras/números
-    text = re.sub(r'([a-záéíóúñ\d])\(', r'\1 (', text, flags=re.IGNORECASE)
-    
-    # Agregar espacios después de paréntesis que preceden a letras/números
-    text = re.sub(r'\)([a-záéíóúñ\d])', r') \1', text, flags=re.IGNORECASE)
-    
-    # Agregar espacios antes de signos de dólar que siguen a letras
-    text = re.sub(r'([a-záéíóúñ])\$', r'\1 $', text, flags=re.IGNORECASE)
-    
-    # Agregar espacios después de signos de dólar que preceden a letras (pero no números)
-    text = re.sub(r'\$([a-záéíóúñ])', r'$ \1', text, flags=re.IGNORECASE)
-    
-    # Agregar espacios antes de mayúsculas que siguen a minúsculas (para separar palabras pegadas)
-    text = re.sub(r'([a-záéíóúñ])([A-ZÁÉÍÓÚÑ])', r'\1 \2', text)
-    
-    # Agregar espacios después de puntos que preceden a letras mayúsculas
-    text = re.sub(r'\.([A-ZÁÉÍÓÚÑ])', r'. \1', text)
-    
-    # Agregar espacios después de comas que preceden a letras
-    text = re.sub(r',([a-záéíóúñA-ZÁÉÍÓÚÑ])', r', \1', text, flags=re.IGNORECASE)
-    
-    # Limpiar espacios múltiples
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Limpiar espacios al inicio y final
-    text = text.strip()
-    
-    return text
-
 def generate_simulated_social_comments(company_name):
     """Genera comentarios simulados de redes sociales para demostrar el análisis reputacional"""
     import random
@@ -547,8 +499,9 @@ async def evaluate_company_risk(company_data):
             metadata={"source": "streamlit_frontend", "timestamp": datetime.now().isoformat()}
         )
         
-        # Evaluar riesgo
-        result = await orchestrator.evaluate_company_risk(company_data_obj)
+        # Evaluar riesgo (cancelable: se cancela si Streamlit interrumpe el script)
+        handle = orchestrator.start_evaluation(company_data_obj)
+        result = await handle.result()
         
         return result, None
         
@@ -895,7 +848,13 @@ def main():
                 if i < len(progress_steps) - 1:
                     await asyncio.sleep(8.5)  # ~60 segundos / 7 pasos
             
-            # Esperar a que termine la evaluación real
+            # Esperar a que termine la evaluación real. Streamlit solo interrumpe el script
+            # (reenvío o navegación) dentro de llamadas st.*: refrescar el estado cada segundo
+            # hace que la interrupción llegue a tiempo, y asyncio.run cancela entonces la
+            # evaluación pendiente para que no siga consumiendo rate limit
+            while not eval_task.done():
+                await asyncio.wait({eval_task}, timeout=1.0)
+                status_text.text(f"📊 Generando reporte final... ({int(time.time() - start_time)} s)")
             result, error = await eval_task
             
             # Completar progreso
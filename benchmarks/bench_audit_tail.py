@@ -0,0 +1,107 @@
+# benchmarks/bench_audit_tail.py
+"""
+Benchmark: últimos N eventos del log de auditoría
+
+Compara la lectura completa con readlines() (comportamiento anterior de
+get_recent_events y run_security_supervision) contra el lector inverso por
+bloques de security/audit_tail.py sobre un log sintético de varios GB.
+
+Uso:
+    python -m benchmarks.bench_audit_tail --size-gb 2 --limit 100
+    python -m benchmarks.bench_audit_tail --path /tmp/audit_bench.log --skip-readlines
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.infrastructure.security.audit_logger import AuditEvent  # noqa: E402
+from agents.infrastructure.security.audit_tail import read_last_lines  # noqa: E402
+
+AGENT_TYPES = ["financial", "reputational", "behavioral"]
+
+
+def generate_log(path: str, size_bytes: int) -> None:
+    """Genera un log JSONL sintético serializado igual que AuditLogger (AuditEvent)"""
+    start = datetime(2025, 1, 1)
+    written = 0
+    i = 0
+    with open(path, "wb") as f:
+        while written < size_bytes:
+            chunk = []
+            for _ in range(10000):
+                agent_type = AGENT_TYPES[i % len(AGENT_TYPES)]
+                tokens_used = i % 2000
+                # Misma forma que AuditLogger.log_business_analysis
+                event = AuditEvent(
+                    timestamp=(start + timedelta(seconds=i)).isoformat(),
+                    evaluation_id=f"eval_{i // 8}",
+                    event_type="BUSINESS_ANALYSIS",
+                    agent_id=f"{agent_type}_agent",
+                    company_id=f"company_{i % 500}",
+                    details={
+                        "agent_type": agent_type,
+                        "analysis_successful": True,
+                        "tokens_used": tokens_used,
+                        "has_error": False
+                    },
+                    success=True,
+                    processing_time=round(1.5 + (i % 100) / 10, 3),
+                    tokens_used=tokens_used
+                )
+                chunk.append(event.model_dump_json().encode("utf-8") + b"\n")
+                i += 1
+            data = b"".join(chunk)
+            f.write(data)
+            written += len(data)
+    print(f"Generated {path}: {written / 1024 ** 3:.2f} GiB, {i:,} events")
+
+
+def tail_with_readlines(path: str, limit: int):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.readlines()[-limit:]
+
+
+def timed(label: str, func, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<28} {best * 1000:>12.2f} ms  ({len(result)} lines)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="audit_bench.log", help="Archivo de log sintético")
+    parser.add_argument("--size-gb", type=float, default=2.0, help="Tamaño del log a generar")
+    parser.add_argument("--limit", type=int, default=100, help="Número de eventos a leer")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones del lector inverso")
+    parser.add_argument("--skip-readlines", action="store_true",
+                        help="No ejecutar la línea base readlines() (usa memoria proporcional al log)")
+    parser.add_argument("--keep", action="store_true", help="No borrar el log al terminar")
+    args = parser.parse_args()
+
+    target = int(args.size_gb * 1024 ** 3)
+    if not os.path.exists(args.path) or os.path.getsize(args.path) < target:
+        generate_log(args.path, target)
+
+    try:
+        tail = timed("reverse block reader", lambda: read_last_lines(args.path, args.limit), args.repeat)
+        if not args.skip_readlines:
+            baseline = timed("readlines()[-N:]", lambda: tail_with_readlines(args.path, args.limit), 1)
+            assert [line.decode("utf-8") for line in tail] == baseline, "Results differ"
+            print("Results match")
+    finally:
+        if not args.keep:
+            os.remove(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# benchmarks/bench_pdf_ingestion.py
+"""
+Benchmark: ingestión de PDFs
+
+Compara los dos caminos anteriores contra el motor en streaming de
+pdf_ingestion_service (iter_pdf_pages + normalize_text):
+- interfaz: PyPDF2 + improve_text_spacing de 10 pasadas de regex
+- orquestador: pdfplumber secuencial sin liberar páginas ni normalizar
+- motor: pdfplumber página a página, normalizador de una pasada, sin caché
+- motor sin filtro: igual, pero ejecutando extract_tables en todas las páginas
+
+Además mide el normalizador de una pasada contra las 10 pasadas sobre el texto
+extraído y comprueba que improve_text_spacing produce el mismo resultado.
+
+Uso:
+    python -m benchmarks.bench_pdf_ingestion estados_financieros.pdf info_general.pdf
+    python -m benchmarks.bench_pdf_ingestion --repeat 5 --normalizer-repeat 200 doc.pdf
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdfplumber  # noqa: E402
+
+from agents.infrastructure_agents.services.pdf_ingestion_service import (  # noqa: E402
+    _document_from_pages,
+    improve_text_spacing,
+    iter_pdf_pages,
+)
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+
+def legacy_improve_text_spacing(text):
+    """Normalizador anterior (10 pasadas de regex), copiado para comparar"""
+    if not text:
+        return text
+    text = re.sub(r'([a-záéíóúñ])(\d)', r'\1 \2', text, flags=re.IGNORECASE)
+    text = re.sub(r'(\d)([a-záéíóúñ])', r'\1 \2', text, flags=re.IGNORECASE)
+    text = re.sub(r'([a-záéíóúñ\d])\(', r'\1 (', text, flags=re.IGNORECASE)
+    text = re.sub(r'\)([a-záéíóúñ\d])', r') \1', text, flags=re.IGNORECASE)
+    text = re.sub(r'([a-záéíóúñ])\$', r'\1 $', text, flags=re.IGNORECASE)
+    text = re.sub(r'\$([a-záéíóúñ])', r'$ \1', text, flags=re.IGNORECASE)
+    text = re.sub(r'([a-záéíóúñ])([A-ZÁÉÍÓÚÑ])', r'\1 \2', text)
+    text = re.sub(r'\.([A-ZÁÉÍÓÚÑ])', r'. \1', text)
+    text = re.sub(r',([a-záéíóúñA-ZÁÉÍÓÚÑ])', r', \1', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_ui_path(data: bytes) -> str:
+    """Camino anterior de app.py: PyPDF2 + 10 pasadas por página"""
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    text = ""
+    for page in reader.pages:
+        text += legacy_improve_text_spacing(page.extract_text()) + "\n"
+    return text.strip()
+
+
+def legacy_orchestrator_path(data: bytes) -> str:
+    """Camino anterior de parse_financial_pdfs: pdfplumber secuencial, páginas retenidas"""
+    text = ""
+    tables = []
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for idx, page in enumerate(pdf.pages, start=1):
+            txt = page.extract_text() or ""
+            if txt.strip():
+                text += f"\n\n==== PÁGINA {idx} ====\n" + txt.strip() + "\n"
+            for t in page.extract_tables() or []:
+                if t:
+                    tables.append({"page": idx, "rows": t})
+    return text
+
+
+def engine_path(data: bytes) -> str:
+    """Motor en streaming (lo que ejecutan la interfaz y el orquestador en un fallo de caché)"""
+    return _document_from_pages("bench.pdf", iter_pdf_pages(data, normalize=True))["text"]
+
+
+def ungated_engine_path(data: bytes) -> str:
+    """Motor en streaming sin la pre-pasada de densidad de tablas"""
+    return _document_from_pages("bench.pdf", iter_pdf_pages(data, normalize=True, table_threshold=0))["text"]
+
+
+def report_table_gate(data: bytes) -> None:
+    """Páginas con tabla que el filtro de densidad descartaría (deberían ser 0)"""
+    gated = list(iter_pdf_pages(data, normalize=False))
+    ungated = list(iter_pdf_pages(data, normalize=False, table_threshold=0))
+    skipped = sum(1 for page in gated if page["tables_skipped"])
+    lost = [page["page"] for page, full in zip(gated, ungated) if full["tables"] and not page["tables"]]
+    print(f"  table gate: {skipped}/{len(gated)} pages skipped, pages with lost tables: {lost or 'none'}")
+
+
+def measure(label: str, func, data: bytes, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    result = func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<26} {best * 1000:>10.1f} ms  peak {peak / 1024 ** 2:>7.1f} MiB  ({len(result):,} chars)")
+
+
+def bench_normalizer(texts, repeat: int) -> None:
+    for text in texts:
+        assert improve_text_spacing(text) == legacy_improve_text_spacing(text), "Normalizers differ"
+    print("Normalizer results match")
+
+    for label, func in (("10-pass regex", legacy_improve_text_spacing), ("single pass", improve_text_spacing)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                func(text)
+        elapsed = time.perf_counter() - started
+        chars = sum(len(t) for t in texts) * repeat
+        print(f"  {label:<26} {elapsed * 1000:>10.1f} ms  ({chars / elapsed / 1024 ** 2:.1f} MiB/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+", help="PDFs a ingerir")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por camino (se toma la mejor)")
+    parser.add_argument("--normalizer-repeat", type=int, default=50, help="Repeticiones del micro-benchmark")
+    args = parser.parse_args()
+
+    page_texts = []
+    for path in args.pdfs:
+        with open(path, "rb") as f:
+            data = f.read()
+        print(f"{os.path.basename(path)} ({len(data) / 1024:.0f} KiB)")
+        if PyPDF2 is not None:
+            measure("PyPDF2 + 10-pass (UI)", legacy_ui_path, data, args.repeat)
+        else:
+            print("  PyPDF2 not installed: skipping the previous UI path")
+        measure("pdfplumber (orchestrator)", legacy_orchestrator_path, data, args.repeat)
+        measure("streaming engine", engine_path, data, args.repeat)
+        measure("engine, all pages tables", ungated_engine_path, data, args.repeat)
+        report_table_gate(data)
+        page_texts.extend(page["text"] for page in iter_pdf_pages(data, normalize=False, extract_tables=False))
+
+    print("Normalizer")
+    bench_normalizer(page_texts, args.normalizer_repeat)
+
+
+if __name__ == "__main__":
+    main()
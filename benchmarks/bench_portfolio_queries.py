@@ -0,0 +1,153 @@
+# benchmarks/bench_portfolio_queries.py
+"""
+Benchmark: historial por empresa y listado de cartera
+
+Carga N evaluaciones sintéticas (con metadata de varios KB, como las reales) en el
+backend SQLite y compara, a distintas profundidades de página:
+- OFFSET: SELECT * ... ORDER BY ... LIMIT/OFFSET (lee y descarta las filas previas
+  y arrastra la columna metadata)
+- keyset: get_company_history / list_evaluations (búsqueda en el índice de
+  cobertura, proyección sin metadata)
+
+También muestra el plan de consulta de cada listado para comprobar que usa un
+índice de cobertura.
+
+Uso:
+    python -m benchmarks.bench_portfolio_queries --rows 1000000
+    python -m benchmarks.bench_portfolio_queries --rows 200000 --db /tmp/portfolio.db --keep
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.infrastructure_agents.config.azure_config import StorageConfig  # noqa: E402
+from agents.infrastructure_agents.services.sqlite_storage_service import SQLiteStorageService  # noqa: E402
+
+RISK_LEVELS = ["alto", "medio", "bajo"]
+
+
+def seed(service: SQLiteStorageService, rows: int, companies: int) -> None:
+    """Inserta filas directamente (sin agregación) y reconstruye las estadísticas al final"""
+    rng = random.Random(7)
+    start = datetime(2022, 1, 1)
+    metadata = json.dumps({"source": "bench", "notes": "x" * 3000})
+    batch = []
+    with service.connection_pool.get_connection() as conn:
+        for i in range(rows):
+            created = start + timedelta(seconds=i * 60 + rng.randint(0, 59))
+            batch.append((
+                f"eval_{i:09d}", f"company_{rng.randrange(companies)}", "Empresa S.A.", "completed",
+                rng.uniform(300, 900), rng.choice(RISK_LEVELS), rng.random(), created,
+                created + timedelta(minutes=1), metadata
+            ))
+            if len(batch) == 10000:
+                conn.executemany("INSERT INTO RiskEvaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                batch.clear()
+        if batch:
+            conn.executemany("INSERT INTO RiskEvaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.commit()
+        conn.execute("ANALYZE")
+    service.rebuild_statistics()
+
+
+def offset_page(service: SQLiteStorageService, where: str, params, page: int, size: int):
+    with service.connection_pool.get_connection() as conn:
+        return conn.execute(
+            f"SELECT * FROM RiskEvaluations WHERE {where} "
+            f"ORDER BY created_date DESC, evaluation_id DESC LIMIT ? OFFSET ?",
+            (*params, size, page * size)
+        ).fetchall()
+
+
+def keyset_walk(fetch_page, pages: int):
+    """Recorre pages páginas con el cursor y devuelve el tiempo de la última"""
+    cursor = None
+    elapsed = 0.0
+    for _ in range(pages + 1):
+        started = time.perf_counter()
+        page = fetch_page(cursor)
+        elapsed = time.perf_counter() - started
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    return elapsed
+
+
+def show_plan(service: SQLiteStorageService, label: str, sql: str, params) -> None:
+    with service.connection_pool.get_connection() as conn:
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+    print(f"  plan {label:<20} {'; '.join(plan)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Archivo SQLite (por defecto uno temporal)")
+    parser.add_argument("--rows", type=int, default=200000, help="Evaluaciones a generar")
+    parser.add_argument("--companies", type=int, default=200, help="Empresas distintas")
+    parser.add_argument("--page-size", type=int, default=50, help="Filas por página")
+    parser.add_argument("--pages", type=int, nargs="+", default=[0, 10, 100, 1000],
+                        help="Profundidades de página a medir")
+    parser.add_argument("--keep", action="store_true", help="No borrar la base al terminar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    tmp = tempfile.mkdtemp()
+    path = args.db or os.path.join(tmp, "bench_portfolio.db")
+    service = SQLiteStorageService(StorageConfig(backend="sqlite", sqlite_path=path, sqlite_pool_size=1))
+
+    with service.connection_pool.get_connection() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM RiskEvaluations").fetchone()[0]
+    if existing < args.rows:
+        started = time.perf_counter()
+        seed(service, args.rows - existing, args.companies)
+        print(f"Seeded {args.rows - existing:,} rows in {time.perf_counter() - started:.1f} s")
+
+    company = "company_1"
+    size = args.page_size
+    print(f"{args.rows:,} evaluations, page size {size}")
+    for page in args.pages:
+        started = time.perf_counter()
+        offset_page(service, "company_id = ?", (company,), page, size)
+        offset_company = time.perf_counter() - started
+        keyset_company = keyset_walk(lambda c: service.get_company_history(company, size, c), page)
+
+        started = time.perf_counter()
+        offset_page(service, "risk_level = ?", ("alto",), page, size)
+        offset_portfolio = time.perf_counter() - started
+        keyset_portfolio = keyset_walk(lambda c: service.list_evaluations("alto", limit=size, cursor=c), page)
+
+        print(f"  page {page:>5}  company: OFFSET {offset_company * 1000:>8.2f} ms  keyset {keyset_company * 1000:>6.2f} ms"
+              f"   portfolio: OFFSET {offset_portfolio * 1000:>8.2f} ms  keyset {keyset_portfolio * 1000:>6.2f} ms")
+
+    columns = service.SUMMARY_COLUMNS
+    cursor_filter = "AND created_date <= ? AND (created_date < ? OR evaluation_id < ?)"
+    after = (datetime(2023, 1, 1), datetime(2023, 1, 1), "eval_999999999")
+    show_plan(service, "company history",
+              f"SELECT {columns} FROM RiskEvaluations WHERE company_id = ? {cursor_filter} "
+              f"ORDER BY created_date DESC, evaluation_id DESC LIMIT 51", (company, *after))
+    show_plan(service, "portfolio by risk",
+              f"SELECT {columns} FROM RiskEvaluations WHERE risk_level = ? {cursor_filter} "
+              f"ORDER BY created_date DESC, evaluation_id DESC LIMIT 51", ("alto", *after))
+    started = time.perf_counter()
+    trend = service.get_score_trend(company, 24)
+    print(f"  score trend: {len(trend)} points in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    service.connection_pool.close()
+    if not args.keep and not args.db:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_sql_bulk.py
+"""
+Benchmark: persistencia de una evaluación completa
+
+Compara el camino registro a registro de AzureSQLService (create_risk_evaluation,
+save_agent_result por agente, save_scoring_details y update_risk_evaluation_status,
+cada uno con su conexión y su commit) contra save_evaluation_bundle (una
+transacción, executemany para los AgentResult) y reporta filas por segundo.
+
+Se ejecuta contra el backend SQLite (SQLiteStorageService, WAL), que comparte el
+SQL de AzureSQLService; con Azure SQL la diferencia es mayor porque cada commit
+es además un round-trip de red.
+
+Uso:
+    python -m benchmarks.bench_sql_bulk --evaluations 500 --agents 12
+    python -m benchmarks.bench_sql_bulk --db /tmp/bench.db --synchronous NORMAL
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.infrastructure_agents.config.azure_config import StorageConfig  # noqa: E402
+from agents.infrastructure_agents.services.sqlite_storage_service import SQLiteStorageService  # noqa: E402
+from agents.infrastructure_agents.services.storage_backend import (  # noqa: E402
+    AgentResult,
+    EvaluationStorage,
+    RiskEvaluation,
+    ScoringDetail,
+)
+
+
+def make_service(path: str, synchronous: str) -> SQLiteStorageService:
+    """Backend SQLite (WAL) con una conexión y el PRAGMA synchronous pedido"""
+    return SQLiteStorageService(StorageConfig(backend="sqlite", sqlite_path=path, sqlite_pool_size=1,
+                                              sqlite_synchronous=synchronous))
+
+
+def make_records(prefix: str, index: int, agents: int):
+    evaluation_id = f"{prefix}_eval_{index}"
+    payload = json.dumps({"score": 0.71, "flags": ["liquidez", "endeudamiento"], "summary": "x" * 400})
+    evaluation = RiskEvaluation(
+        evaluation_id=evaluation_id, company_id=f"company_{index % 97}", company_name="Empresa S.A.",
+        status="completed", final_score=712.0, risk_level="medio", confidence_score=0.82,
+        created_date=datetime.now(), metadata=json.dumps({"source": "bench"})
+    )
+    results = [
+        AgentResult(
+            result_id=f"{evaluation_id}_agent_{a}", evaluation_id=evaluation_id, agent_name=f"agent_{a}",
+            agent_type="business", result_data=payload, confidence_score=0.8, processing_time_ms=1200 + a
+        )
+        for a in range(agents)
+    ]
+    scoring = ScoringDetail(
+        scoring_id=f"{evaluation_id}_scoring", evaluation_id=evaluation_id, financial_score=700.0,
+        reputational_score=680.0, behavioral_score=750.0, final_score=712.0,
+        explanation="Riesgo medio", contributing_factors=json.dumps({"liquidez": 0.4})
+    )
+    return evaluation, results, scoring
+
+
+def per_record(service: EvaluationStorage, evaluation, results, scoring) -> None:
+    """Camino anterior: un préstamo de conexión y un commit por fila"""
+    pending = RiskEvaluation(**{**evaluation.__dict__, "status": "pending", "final_score": None,
+                                "risk_level": None, "confidence_score": None})
+    assert service.create_risk_evaluation(pending)
+    for result in results:
+        assert service.save_agent_result(result)
+    assert service.save_scoring_details(scoring)
+    assert service.update_risk_evaluation_status(evaluation.evaluation_id, evaluation.status,
+                                                 evaluation.final_score, evaluation.risk_level,
+                                                 evaluation.confidence_score)
+
+
+def bundled(service: EvaluationStorage, evaluation, results, scoring) -> None:
+    """Unidad de trabajo: una transacción por evaluación"""
+    assert service.save_evaluation_bundle(evaluation, results, scoring)
+
+
+def run(label: str, func, service: EvaluationStorage, evaluations: int, agents: int) -> None:
+    records = [make_records(label, i, agents) for i in range(evaluations)]
+    started = time.perf_counter()
+    for evaluation, results, scoring in records:
+        func(service, evaluation, results, scoring)
+    elapsed = time.perf_counter() - started
+    rows = evaluations * (agents + 2)
+    print(f"  {label:<14} {elapsed * 1000:>10.1f} ms  {rows / elapsed:>12,.0f} rows/s  "
+          f"{evaluations / elapsed:>9,.1f} evaluations/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Archivo SQLite (por defecto uno temporal)")
+    parser.add_argument("--evaluations", type=int, default=300, help="Evaluaciones a persistir por camino")
+    parser.add_argument("--agents", type=int, default=12, help="AgentResult por evaluación")
+    parser.add_argument("--synchronous", default="FULL", choices=["OFF", "NORMAL", "FULL"],
+                        help="PRAGMA synchronous (coste de cada commit)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "bench_sql_bulk.db")
+        service = make_service(path, args.synchronous)
+        print(f"{args.evaluations} evaluations x ({args.agents} agent results + evaluation + scoring), "
+              f"synchronous={args.synchronous}")
+        run("per-record", per_record, service, args.evaluations, args.agents)
+        run("bundle", bundled, service, args.evaluations, args.agents)
+        service.connection_pool.close()
+
+
+if __name__ == "__main__":
+    main()